@@ -4,18 +4,199 @@ with the Innomaker USB2CAN-Converter via python-can and its documentation.
 """
 # imports
 from ctypes import *
-import sys
 import os
 import time
 import struct
-import clr
+import threading
+import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from can import BusABC, Message
+from .ringbuffer import RingBuffer
+from .filters import AcceptanceFilter, CAN_EFF_MASK
+from .scheduler import CyclicScheduler, CyclicSendTask
+from .errors import decode_error_frame
+from .statistics import BusStatistics
+from .timestamps import HostClock, DeviceClock
+from .manager import DeviceManager
+from .aio import AsyncReceiver
+from .transport import Transport
+from .capture import CaptureWriter
+
+# layout of the 20 byte frame of the InnoMaker device (little endian):
+# echo_id (4), can_id with flags (4), dlc (1), channel (1), flags (1), reserved (1), data (8)
+FRAME = struct.Struct('<IIBBBB8s')
+FRAME_FIELDS = struct.Struct('<4xIB3x8s')  # only can_id, dlc and data, as buildMessage needs them
+FRAME_SIZE = 20
+DEVICE_TIMESTAMP = struct.Struct('<I')  # microsecond counter behind the frame, if hardware timestamps are enabled
+CAN_EFF_ID_FLAG = 0x80000000  # extended frame format
+CAN_RTR_ID_FLAG = 0x40000000  # remote transmission request
+CAN_ERR_ID_FLAG = 0x20000000  # error frame
+
+log = logging.getLogger('can.InnoMaker')
+
+# the CLR and the dll are loaded by load_library on the first use of a device, not on import
+clr = None
+UsbCan = None
+InnoMakerDevice = None
+_manager = None
+_managers = {}  # transport -> DeviceManager of the transports that were given to a bus
+_library_lock = threading.RLock()
+
+
+def load_library():
+    """Loads the CLR and the InnoMakerUsb2CanLib.dll, further calls return immediately."""
+    global clr, UsbCan, InnoMakerDevice
+    with _library_lock:
+        if UsbCan is None:
+            import clr as _clr
+            # Finding the Path of the DLL
+            str1 = os.path.realpath(__file__)
+            str1 = str1.replace("InnoMaker.py", "InnoMakerUsb2CanLib.dll")
+            _clr.AddReference(str1)
+            import InnoMakerUsb2CanLib
+            clr = _clr
+            InnoMakerDevice = InnoMakerUsb2CanLib.InnoMakerDevice
+            UsbCan = InnoMakerUsb2CanLib.UsbCan
+
+
+def get_device_manager(transport=None):
+    """Returns the DeviceManager that is shared by all InnoMakerBus instances of the process.
+        The dll is loaded with the first call, the devices are enumerated with the first request of a device.
+        :param transport: Returns the DeviceManager of this :class:`transport.Transport` instead of the dll,
+            'simulated' selects the shared transport of :func:`simulation.shared_transport`.
+    """
+    global _manager
+    if transport is not None:
+        if transport == 'simulated':
+            from .simulation import shared_transport
+            transport = shared_transport()
+        with _library_lock:
+            if transport not in _managers:
+                _managers[transport] = DeviceManager(transport)
+            return _managers[transport]
+    if _manager is None:
+        with _library_lock:
+            if _manager is None:
+                _manager = DeviceManager(DllTransport())
+    return _manager
+
+
+class DllTransport(Transport):
+    """The DllTransport performs the USB calls with the UsbCan object of the InnoMakerUsb2CanLib.dll.
+        The dll is loaded when the transport is created.
+        """
+
+    def __init__(self):
+        load_library()
+        self.usbcan = UsbCan()
+
+    def scan(self):
+        self.usbcan.scanInnoMakerDevices()
+        return [self.usbcan.getInnoMakerDevice(i) for i in range(self.usbcan.getInnoMakerDeviceCount())]
+
+    def handle(self, device):
+        handle = InnoMakerDevice()
+        handle.deviceId = device.deviceId
+        handle.InnoMakerDev = device.InnoMakerDev
+        handle.usbReg = device.usbReg
+        return handle
+
+    def setup(self, device, mode, bitrate):
+        switchbus = {
+            "normal": self.usbcan.UsbCanMode.UsbCanModeNormal,
+            "loopback": self.usbcan.UsbCanMode.UsbCanModeLoopback,
+            "ListenOnly": self.usbcan.UsbCanMode.UsbCanModeListenOnly
+        }
+        if mode not in switchbus:
+            raise ValueError("usbCanMode {} invalid".format(mode))
+        if bitrate not in BITTIMINGS:
+            raise ValueError("bitrate {} invalid".format(bitrate))
+        self.usbcan.UrbSetupDevice(device, switchbus[mode], BITTIMINGS[bitrate]())
+
+    def open(self, device):
+        self.usbcan.openInnoMakerDevice(device)
+
+    def close(self, device):
+        self.usbcan.UrbResetDevice(device)
+        self.usbcan.closeInnoMakerDevice(device)
+
+    def receive_engine(self, device, frame_size):
+        return ReceiveEngine(self.usbcan, device, frame_size)
 
-# Finding the Path of the DLL
-str1 = os.path.realpath(__file__)
-str1 = str1.replace("InnoMaker.py", "InnoMakerUsb2CanLib.dll")
-clr.AddReference(str1)
-from InnoMakerUsb2CanLib import *
+    def send_engine(self, device):
+        return SendEngine(self.usbcan, device)
+
+
+class RateLimitedLog:
+    """Writes a log message at most once per interval and key.
+        Every key has its own interval, so alternating messages (e.g. two different error frames) are limited
+        as well. The repetitions of a key are counted and summarized with its next written message, at the latest
+        with the next call after its interval is over or with :meth:`flush`, so a flood that stops is reported too.
+        This keeps a flood of identical errors from stalling the process with console output.
+        """
+
+    def __init__(self, logger, level, interval=1.0):
+        """
+            :param logger: The logger the messages are written to.
+            :param level: The level of the messages.
+            :param interval: Seconds in which a repeated key is suppressed.
+        """
+        self.logger = logger
+        self.level = level
+        self.interval = interval
+        self.keys = {}  # key -> [time of the last written message, suppressed count, last suppressed msg, args]
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()  # the reader thread, the sender and the application may log at once
+
+    def allow(self, key=None, msg=None, args=()):
+        """Checks whether a message with the given key may be written now.
+            If it may, the number of suppressed messages of the key before it is reported.
+            :param msg: The message, it is named in the summary of the suppressed messages.
+            :param args: The arguments of the message.
+        """
+        now = time.monotonic()
+        state = self.keys.get(key)
+        if state is not None and now - state[0] < self.interval:
+            state[1] += 1  # the suppressed path takes no lock, a repetition may be miscounted in a race
+            state[2] = msg
+            state[3] = args
+            return False
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now, self.interval)
+            state = self.keys.get(key)
+            if state is not None and state[1]:
+                self._summarize(state)
+            self.keys[key] = [now, 0, None, ()]
+            return True
+
+    def flush(self):
+        """Reports the suppressed messages of all keys, e.g. when the bus is shut down."""
+        with self._lock:
+            self._sweep(time.monotonic(), 0.0)
+
+    def _sweep(self, now, interval):
+        """Reports the suppressed messages of the keys whose interval is over and forgets these keys."""
+        self._next_sweep = now + self.interval
+        for key, state in list(self.keys.items()):
+            if now - state[0] >= interval:
+                if state[1]:
+                    self._summarize(state)
+                del self.keys[key]
+
+    def _summarize(self, state):
+        count, msg, args = state[1], state[2], state[3]
+        if msg is None:
+            self.logger.log(self.level, "%d identical messages suppressed", count)
+        else:
+            self.logger.log(self.level, "%d similar messages suppressed, the last one: " + msg, count, *args)
+        state[1] = 0
+
+    def log(self, msg, *args, key=None, **kwargs):
+        """Writes the message with lazy formatting if allow(key) permits it."""
+        if self.allow(key, msg, args):
+            self.logger.log(self.level, msg, *args, **kwargs)
 
 
 class InnoMakerBus(BusABC):
@@ -23,61 +204,111 @@ class InnoMakerBus(BusABC):
         It contains all the necessary functions to enable a communication with the device via USB.
 
         It is build after the CAN bus abstract class provided by python-can.
+        Every instance opens its own device, so one bus can be opened per connected device.
         """
-    Device = InnoMakerDevice()
-    bus = UsbCan()
 
     # bus.removeDeviceDelegate = bus.RemoveDeviceNotifyDelegate()
     # bus.addDeviceDelegate = bus.AddDeviceNotifyDelegate()
 
-    def __init__(self, channel, can_filters=None, poll_interval=0.01,
+    def __init__(self, channel, can_filters=None, poll_interval=0.002,
                  receive_own_messages=False,
                  bitrate=None, rx_queue_size=1, app_name="InnoMaker",
                  serial=None, fd=False, data_bitrate=None, sjwAbr=0, tseg1Abr=0,
-                 tseg2Abr=0, sjwDbr=0, tseg1Dbr=0, tseg2Dbr=0, **kwargs):
+                 tseg2Abr=0, sjwDbr=0, tseg1Dbr=0, tseg2Dbr=0, reader_thread=False, ring_size=4096,
+                 hardware_timestamps=False, transport=None, **kwargs):
         """Constructs and opens a CAN bus instance of InnoMakerBus with the given parameter.
 
                 This method should only be called with all below listed parameters to avoid unexpected behaviour:
 
                 :param channel:
                     The can interface identifier. If only one device is connected the channel should always be set to 0.
+                    With several devices the channel is the index of the device in the enumeration
+                    or its deviceId, see :class:`manager.DeviceManager`.
+
+                :param serial:
+                    The deviceId of the device, it takes precedence over the channel.
 
                 :param bitrate:
                     The bitrate for the CAN module.
                     A valid bitrate needs to be selected or otherwise the device cannot start CAN-communication.
                     For a list of valid bitrates see :meth:`InnoMakerBus.InnoMakerBus.connect` for details.
+
+                :param reader_thread:
+                    If True a background thread continuously drains the device into a ring buffer
+                    and the receive routine only takes the frames out of that buffer.
+                    Frames that do not fit into the full ring buffer are counted in :attr:`rx_overflows`.
+
+                :param ring_size:
+                    The number of frames the ring buffer of the reader thread can hold.
+
+                :param poll_interval:
+                    Seconds the reader thread sleeps after a transfer without frames. For a device that answers
+                    a read at once, this bounds the wake-up latency of recv; a bulk read that waits for the
+                    next frame itself makes the sleep rare. Shorter intervals cost CPU time while the bus is idle.
+
+                :param hardware_timestamps:
+                    If True the frames of the device are 24 bytes long and end with the 32 bit microsecond counter
+                    of the device, which is correlated with the host clock (see :class:`timestamps.DeviceClock`).
+                    Otherwise every frame is stamped with time.perf_counter_ns() directly after the USB transfer.
+
+                :param transport:
+                    The :class:`transport.Transport` that performs the USB calls, by default the InnoMakerUsb2CanLib.dll.
+                    With 'simulated' the bus opens a :class:`simulation.SimulatedDevice` in loopback instead.
+
+                The traffic of the bus is always counted, see :meth:`get_statistics`.
+                In an asyncio application the bus is read with ``async for msg in bus`` or :meth:`recv_async`.
         """
         canmode = "normal"
-        self.bus.scanInnoMakerDevices()  # search for devices connected to USB
-        self.buffer = bytearray(20)
-        if self.bus.getInnoMakerDeviceCount() > 0:
-            self.channel_info = 'InnoMaker'
-            for i in range(0,
-                           self.bus.getInnoMakerDeviceCount()):  # todo: should work for more than one device but not tested yet
-                self.Device.deviceId = self.bus.getInnoMakerDevice(i).deviceId
-                self.Device.InnoMakerDev = self.bus.getInnoMakerDevice(i).InnoMakerDev
-                self.Device.usbReg = self.bus.getInnoMakerDevice(i).usbReg
-                print("Device Number " + str(i) + " has the deviceID " + self.bus.getInnoMakerDevice(i).deviceId)
-                self.connect(bitrate, canmode)
-            super(InnoMakerBus, self).__init__(channel=channel, **kwargs)
+        self.poll_interval = poll_interval
+        self._recv_engine = None
+        self._send_engine = None
+        self._scheduler = None
+        self._reader = None
+        self._reader_running = threading.Event()
+        self._rx_event = threading.Event()  # set by the reader thread whenever new frames are in the ring buffer
+        self._acceptance = None
+        self._async = None  # the AsyncReceiver, once a coroutine receives from the bus
+        self.async_dropped = 0  # frames built for an event loop that was closed before they were delivered
+        self._send_executor = None
+        self._capture = None  # the CaptureWriter, while the received frames are recorded
+        self._capture_lock = threading.Lock()
+        self.capture_only = False
+        self._read_error_log = RateLimitedLog(log, logging.ERROR)
+        self._error_frame_log = RateLimitedLog(log, logging.WARNING)
+        self._send_error_log = RateLimitedLog(log, logging.WARNING)
+        self.frame_size = FRAME_SIZE + DEVICE_TIMESTAMP.size if hardware_timestamps else FRAME_SIZE
+        self.clock = HostClock()
+        self.device_clock = DeviceClock() if hardware_timestamps else None
+        self.ring_size = ring_size
+        self.ring = RingBuffer(ring_size, self.frame_size) if reader_thread else None
+        self.bitrate = bitrate
+        self.statistics = BusStatistics(bitrate)
+        self.manager = get_device_manager(transport)
+        self.transport = self.manager.transport
+        self.Device = self.manager.acquire(channel, serial)  # the own handle of the device of this bus
+        if self.Device is not None:
+            self.channel_info = 'InnoMaker {}'.format(self.Device.deviceId)
+            log.info("Channel %s has the deviceID %s", channel, self.Device.deviceId)
+            self.connect(bitrate, canmode)
+            super(InnoMakerBus, self).__init__(channel=channel, can_filters=can_filters, **kwargs)
+            if self.ring is not None:
+                self.start_reader()
         else:
-            # if no hardware device was found
-            print('No Device found')
+            # if no free hardware device was found
+            log.error('No free Device found for channel %s', channel if serial is None else serial)
 
     def update(self):
         """The update-function can be used to start a new search for hardware modules.
             This is an additional function that is provided by the innomakerCAN2USB.dll and
             is by default not used inside the python-can interface.
+            The devices are otherwise enumerated only once per process, see :meth:`manager.DeviceManager.refresh`.
         """
-        self.bus.scanInnoMakerDevices()
-        if self.bus.getInnoMakerDeviceCount() > 0:
-            for i in range(0, self.bus.getInnoMakerDeviceCount()):
-                self.Device.deviceId = self.bus.getInnoMakerDevice(i).deviceId
-                self.Device.InnoMakerDev = self.bus.getInnoMakerDevice(i).InnoMakerDev
-                self.Device.usbReg = self.bus.getInnoMakerDevice(i).usbReg
-                # print("Device Number " + str(i) + " has the deviceID " + self.bus.getInnoMakerDevice(i).deviceId)
+        devices = self.manager.refresh()
+        if devices:
+            for i, device in enumerate(devices):
+                log.debug("Device Number %d has the deviceID %s", i, device.deviceId)
         else:
-            print('No Device connected')
+            log.warning('No Device connected')
 
     def connect(self, bitrate, canmode):
         """Enables the connection between the InnoMaker device and the software.
@@ -109,45 +340,18 @@ class InnoMakerBus(BusABC):
                      ListenOnly
                     per default the normal mode ist selected.
                 """
-        switchbus = {
-            "normal": InnoMakerBus.bus.UsbCanMode.UsbCanModeNormal,
-            "loopback": InnoMakerBus.bus.UsbCanMode.UsbCanModeLoopback,
-            "ListenOnly": InnoMakerBus.bus.UsbCanMode.UsbCanModeListenOnly
-        }
-        usbCanMode = switchbus.get(canmode, 4)
-        if usbCanMode == 4:
-            print("usbCanMode invalid")
-        else:
-
-            switchrate = {
-                20000: Baud20K,
-                33330: Baud33K,
-                40000: Baud40K,
-                50000: Baud50K,
-                66660: Baud66K,
-                80000: Baud80K,
-                83330: Baud83K,
-                100000: Baud100K,
-                125000: Baud125K,
-                200000: Baud200K,
-                250000: Baud250K,
-                400000: Baud400K,
-                500000: Baud500K,
-                666000: Baud666K,
-                800000: Baud800K,
-                1000000: Baud1M
-            }
-            bittiming = switchrate.get(bitrate, 0)
-            bittiming = bittiming()
-            if bittiming == 0:
-                print("bitrate invalid")
-            else:
-                try:
-                    self.bus.UrbSetupDevice(self.Device, usbCanMode, bittiming)
-                    self.bus.openInnoMakerDevice(self.Device)
-                    print("Successfully Connected")
-                except Exception:
-                    print("Connection failed")
+        try:
+            self.transport.setup(self.Device, canmode, bitrate)
+        except ValueError as error:
+            log.error("%s", error)
+            return
+        try:
+            self.transport.open(self.Device)
+            self._recv_engine = self.transport.receive_engine(self.Device, self.frame_size)
+            self._send_engine = self.transport.send_engine(self.Device)
+            log.info("Successfully Connected")
+        except Exception:
+            log.exception("Connection failed")
 
     # shutsdown the device but does NOT reset the internal memory of the device
     def shutdown(self):
@@ -155,112 +359,505 @@ class InnoMakerBus(BusABC):
             Note: This does NOT reset the device and therefore any memory on the device will remain.
             e.g. the error counter of the device will not be brought back to 0.
         """
+        if self._scheduler is not None:
+            self._scheduler.stop()  # no periodic message is due any more when the device is closed
+        self.stop_reader()
+        if self._async is not None:
+            self._async.close()  # waiting coroutines receive None
+        if self._send_executor is not None:
+            self._send_executor.shutdown()
+        self.stop_capture()
+        self.statistics.stop_export()
+        if self.Device is not None:
+            try:
+                self.transport.close(self.Device)
+                log.info("Successfully Disconnected")
+            except Exception:
+                log.exception("Disconnection failed")
+            self.manager.release(self.Device)
+        super(InnoMakerBus, self).shutdown()
+        for rate_limited in (self._read_error_log, self._error_frame_log, self._send_error_log):
+            rate_limited.flush()
+
+    def start_reader(self, batch_frames=64):
+        """Starts the reader thread that drains the device into the ring buffer.
+            :param batch_frames: The maximum number of frames that are read with one transfer.
+        """
+        if self._reader is not None:
+            return
+        if self.ring is None:
+            self.ring = RingBuffer(self.ring_size, self.frame_size)
+        self._reader_running.set()
+        self._reader = threading.Thread(target=self._read_loop, args=(batch_frames,),
+                                        name="InnoMakerReader", daemon=True)
+        self._reader.start()
+
+    def stop_reader(self):
+        """Stops the reader thread and discards the frames that are still in the ring buffer.
+            From then on recv and recv_batch read the device directly, a receive that has to wait
+            starts the reader thread again.
+        """
+        reader = self._reader
+        if reader is None:
+            return
+        self._reader_running.clear()
+        reader.join()
+        self._reader = None
+        self.ring.clear()  # the ring buffer keeps its overflow count for rx_overflows
+        self._rx_event.set()  # wakes up receivers that are still waiting
+
+    @property
+    def rx_overflows(self):
+        """The number of frames the reader thread had to drop because the ring buffer was full."""
+        return self.ring.overflows if self.ring is not None else 0
+
+    def _read_loop(self, batch_frames):
+        """The routine of the reader thread. If a transfer returns no frame, it waits poll_interval seconds.
+            An error while reading or processing a transfer is logged and the next transfer is read. If the
+            thread ends anyway, recv reads the device directly again and start_reader can start a new thread.
+        """
+        ring = self.ring
+        running = self._reader_running
         try:
-            self.bus.UrbResetDevice(self.Device)
-            self.bus.closeInnoMakerDevice(self.Device)
-            print("Successfully Disconnected")
-        except Exception:
-            print("Disconnection failed")
+            while running.is_set():
+                try:
+                    received = self._read_transfer(ring, batch_frames)
+                except Exception:
+                    self._read_error_log.log("Receive unsuccessful", exc_info=True)
+                    received = False
+                if not received and self.poll_interval:
+                    time.sleep(self.poll_interval)
+        finally:
+            if self._reader is threading.current_thread():
+                self._reader = None
+                self._rx_event.set()  # wakes up receivers, they read the device themselves
+
+    def _read_transfer(self, ring, batch_frames):
+        """Reads one transfer and hands its frames to the capture and to the ring buffer or the event loop.
+            :return: True if the transfer contained frames.
+        """
+        recvdata, offsets = self.readBatch(batch_frames)
+        if not offsets:
+            return False
+        host_ns = time.perf_counter_ns()
+        if self._capture is not None:
+            try:
+                self._capture_frames(recvdata, offsets, host_ns)
+            except Exception:  # e.g. the disk is full, the frames still reach the receivers
+                self._read_error_log.log("Capture failed, the capture is stopped", exc_info=True)
+                self._abort_capture()
+            if self.capture_only:  # no Message and no ring buffer, only the statistics are kept
+                rx_frame = self.statistics.rx_frame
+                for offset in offsets:
+                    rx_frame(recvdata, offset)
+                return True
+        timestamp = self.clock.to_time(host_ns)
+        acceptance = self._acceptance
+        rx_frame = self.statistics.rx_frame
+        receiver = self._async
+        if receiver is not None and receiver.loop.is_closed():
+            self._detach_async(receiver)  # back to the ring buffer, e.g. after asyncio.run returned
+            receiver = None
+        messages = None if receiver is None else []  # asyncio gets the messages, not the ring buffer
+        for offset in offsets:
+            rx_frame(recvdata, offset)
+            if self.device_clock is not None:
+                timestamp = self._timestamp(recvdata, offset, host_ns)
+            if acceptance is None or acceptance.accepts(recvdata, offset):
+                if messages is None:
+                    ring.push(recvdata, offset, timestamp)
+                else:
+                    messages.append(self.buildMessage(recvdata, offset, timestamp))
+        if messages is None:
+            self._rx_event.set()
+            late = self._async
+            if late is not None and not late.feed([]):  # a coroutine started receiving during this batch,
+                self._detach_async(late)  # its event loop takes the frames out of the ring buffer
+        elif messages and not receiver.feed(messages):  # one wake-up of the event loop per transfer
+            self._detach_async(receiver, len(messages))
+        return True
+
+    def start_capture(self, path, capture_only=False, **options):
+        """Records all received frames into a capture file, see :class:`capture.CaptureWriter`.
+            The frames are written by the reader thread directly after the transfer, the reader thread is
+            started if necessary. The acceptance filter does not apply to the capture.
+            :param path: The path of the capture file.
+            :param capture_only: True if the frames are only recorded. No Message is created and the frames do not
+                reach recv, recv_async or a Notifier until :meth:`stop_capture` is called.
+            :param options: max_bytes, max_seconds, chunk_records and flush_interval of the CaptureWriter.
+        """
+        self.stop_capture()
+        writer = CaptureWriter(path, bitrate=self.bitrate or 0, device_timestamps=self.device_clock is not None,
+                               **options)
+        self.capture_only = capture_only
+        self._capture = writer
+        self.start_reader()
+
+    def stop_capture(self):
+        """Stops the recording and closes the capture file.
+            :return: The paths of the written files, an empty list if no capture was running.
+        """
+        with self._capture_lock:
+            writer, self._capture = self._capture, None
+            self.capture_only = False
+        if writer is None:
+            return []
+        writer.close()
+        return writer.files
+
+    def _abort_capture(self):
+        """Stops a capture whose file can no longer be written, is called by the reader thread."""
+        try:
+            self.stop_capture()
+        except Exception:  # closing the broken file fails as well, the capture is stopped anyway
+            log.debug("Closing the capture failed", exc_info=True)
+
+    def _capture_frames(self, recvdata, offsets, host_ns):
+        """Writes the frames of one transfer into the capture file, is called by the reader thread."""
+        with self._capture_lock:
+            writer = self._capture
+            if writer is None:
+                return
+            if self.device_clock is None:
+                writer.write_batch(recvdata, offsets, self.clock.to_time_ns(host_ns), self.frame_size)
+                return
+            for offset in offsets:
+                ticks = DEVICE_TIMESTAMP.unpack_from(recvdata, offset + FRAME_SIZE)[0]
+                host = self.device_clock.to_host(ticks, host_ns)
+                writer.write(recvdata, offset, self.clock.to_time_ns(host), self.frame_size)
+
+    def _apply_filters(self, filters):
+        """Compiles the can_filters into the AcceptanceFilter of the bus.
+            The frames are then filtered directly after the transfer, before any Message is created.
+            :param filters: See :meth:`can.BusABC.set_filters` for details.
+        """
+        self._acceptance = AcceptanceFilter(filters) if filters else None
 
     @staticmethod
     def _detect_available_configs():
         """A method that is predefined by the python-can abstract class.
             It contains the default configuration on which the interface can run.
+            Without pythonnet or the dll (e.g. on Linux) no configuration is available.
         """
+        try:
+            serials = get_device_manager().serials
+        except Exception:  # e.g. ModuleNotFoundError for clr, can.detect_available_configs must keep working
+            log.debug("InnoMaker devices cannot be enumerated", exc_info=True)
+            return []
         configs = [{'interface': 'InnoMaker',
                     'app_name': None,
-                    'channel': 0}]
+                    'channel': channel,
+                    'serial': serial} for channel, serial in enumerate(serials)]
         return configs
 
     def _recv_internal(self, timeout):
         """Contains the receive routine for the InnoMaker device.
             The data is collected from the device by using the Method readData.
             The retrieved data is then converted from the usb2can-device framework to the format python-can is expecting.
-            :param timeout: is an optional timeout from the python-can abstract class that is currently not implemented.
+            :param timeout: Seconds to wait for a frame, None waits indefinitely and 0 only polls the device once.
+                Waiting is done by the reader thread, which is started with the first receive that has to wait.
+                The calling thread sleeps until the reader signals a new frame or the timeout expires.
         """
-        self._is_filtered = False
-        end_time = time.time() + timeout if timeout is not None else None
-        try:
-            recvdata = self.readData()
-        except Exception:
-            print("Receive unsuccessful")
+        self._is_filtered = True  # the filters are applied by the AcceptanceFilter before the message is built
+        if self._reader is None:
+            if timeout == 0 or self._recv_engine is None:
+                try:
+                    recvdata = self.readData()
+                except Exception:
+                    self._read_error_log.log("Receive unsuccessful", exc_info=True)
+                    return None, self._is_filtered
+
+                if recvdata == 0:
+                    return None, self._is_filtered
+                host_ns = time.perf_counter_ns()
+                self.statistics.rx_frame(recvdata)
+                if self._acceptance is not None and not self._acceptance.accepts(recvdata):
+                    return None, self._is_filtered
+                else:
+                    return self.buildMessage(recvdata, timestamp=self._timestamp(recvdata, 0, host_ns)), \
+                        self._is_filtered
+            self.start_reader()
+
+        end_time = time.perf_counter() + timeout if timeout is not None else None
+        entry = self.ring.pop()
+        while entry is None and timeout != 0 and self._wait_for_frame(end_time):
+            entry = self.ring.pop()
+        if entry is None:
             return None, self._is_filtered
+        return self.buildMessage(entry[0], timestamp=entry[1]), self._is_filtered
 
-        if recvdata == 0:
-            # print("Receive unsuccessful")
-            return None, self._is_filtered
+    def _timestamp(self, recvdata, offset, host_ns):
+        """Returns the timestamp of a frame in seconds since the epoch.
+            :param recvdata: The buffer that contains the frame.
+            :param offset: The position of the frame inside the buffer.
+            :param host_ns: The time.perf_counter_ns() value directly after the USB transfer of the frame.
+        """
+        if self.device_clock is None:
+            return self.clock.to_time(host_ns)
+        ticks = DEVICE_TIMESTAMP.unpack_from(recvdata, offset + FRAME_SIZE)[0]
+        return self.clock.to_time(self.device_clock.to_host(ticks, host_ns))
+
+    def _wait_for_frame(self, end_time):
+        """Blocks until the reader thread signals new frames in the ring buffer.
+            :param end_time: The time.perf_counter() value at which the waiting is given up, None waits indefinitely.
+            :return: False if the time is up or the reader thread was stopped.
+        """
+        self._rx_event.clear()
+        if len(self.ring) > 0:  # the reader may have pushed a frame before the event was cleared
+            return True
+        if self._reader is None:  # stopped before the event was cleared, nobody would set it
+            return False
+        if end_time is None:
+            self._rx_event.wait()
         else:
-            frameID = (recvdata[7] << 24) + (recvdata[6] << 16) + (recvdata[5] << 8) + (recvdata[4])
-            # print("frameID: " + str(frameID))
-            dlc = recvdata[8]
-            data = [0, 0, 0, 0, 0, 0, 0, 0]
-            for j in range(12, 12 + dlc):
-                data[j - 12] = recvdata[j]
-                # print("Data: " + str(data[j-12]))
-            if recvdata[7] == 32:
-                self.errorHandling(self, frameID, data)
-            msg = Message(
-                # timestamp= timestamp - self._time_offset,
-                arbitration_id=frameID,
-                dlc=dlc,
-                data=data
-            )
-            return msg, self._is_filtered
+            remaining = end_time - time.perf_counter()
+            if remaining <= 0 or not self._rx_event.wait(remaining):
+                return False
+        return self._reader is not None or len(self.ring) > 0
+
+    def recv_batch(self, max_frames=64, timeout=None):
+        """Receives all frames the InnoMaker device delivers with one bulk transfer.
+            Up to max_frames frames of 20 bytes are read with a single call of the dll and decoded at once.
+            This drains the FIFO of the device much faster than single calls of recv on a busy bus.
+            If the reader thread is running, up to max_frames frames are taken out of its ring buffer instead.
+            :param max_frames: The maximum number of frames that are read with one transfer.
+            :param timeout: Seconds to wait for at least one frame. None or 0 returns after the first transfer.
+            :return: A list of the received messages that match the filters of the bus, empty if none was received.
+        """
+        if self._reader is None and timeout and self._recv_engine is not None:
+            self.start_reader()
+        if self._reader is None:
+            try:
+                recvdata, offsets = self.readBatch(max_frames)
+            except Exception:
+                self._read_error_log.log("Receive unsuccessful", exc_info=True)
+                return []
+            host_ns = time.perf_counter_ns()
+            acceptance = self._acceptance
+            rx_frame = self.statistics.rx_frame
+            for offset in offsets:
+                rx_frame(recvdata, offset)
+            return [self.buildMessage(recvdata, offset, self._timestamp(recvdata, offset, host_ns)) for offset in offsets
+                    if acceptance is None or acceptance.accepts(recvdata, offset)]
+
+        end_time = time.perf_counter() + timeout if timeout else 0
+        messages = []
+        while True:
+            for _ in range(max_frames - len(messages)):
+                entry = self.ring.pop()
+                if entry is None:
+                    break
+                messages.append(self.buildMessage(entry[0], timestamp=entry[1]))
+            if messages or not self._wait_for_frame(end_time):
+                return messages
+
+    async def recv_async(self, timeout=None):
+        """Receives a message in a coroutine without blocking the event loop.
+            The reader thread is started with the first call. From then on it builds the messages itself and
+            hands all messages of one transfer to the event loop with a single call_soon_threadsafe,
+            so the ring buffer is bypassed and the event loop is woken up once per transfer.
+            The bus must then only be received from by coroutines of this event loop, not by recv.
+            When the event loop is closed, the reader thread returns to the ring buffer and recv works again,
+            messages already handed to the closed loop are counted as dropped, see :meth:`get_statistics`.
+            :param timeout: Seconds to wait for a message, None waits until the bus is shut down.
+            :return: The message or None if the time is up or the bus was shut down.
+        """
+        return await self._async_receiver().get(timeout)
+
+    def __aiter__(self):
+        """Allows ``async for msg in bus``, the iteration ends when the bus is shut down."""
+        return self._aiter_messages()
+
+    async def _aiter_messages(self):
+        while True:
+            msg = await self.recv_async()
+            if msg is None:
+                return
+            yield msg
+
+    async def send_async(self, msg, timeout=None):
+        """Transmits a message in a coroutine without blocking the event loop.
+            The transfer runs in a single sender thread, so the messages keep the order of the calls.
+            :param msg: The message for the CAN device.
+            :param timeout: See :meth:`send`.
+        """
+        if self._send_executor is None:
+            self._send_executor = ThreadPoolExecutor(1, thread_name_prefix="InnoMakerSender")
+        await asyncio.get_running_loop().run_in_executor(self._send_executor, self.send, msg, timeout)
+
+    def _async_receiver(self):
+        """Returns the AsyncReceiver of the running event loop and switches the reader thread over to it."""
+        loop = asyncio.get_running_loop()
+        receiver = self._async
+        if receiver is None or receiver.loop is not loop:
+            receiver = AsyncReceiver(loop, self._drain_ring)
+            receiver.messages.extend(self._drain_ring())
+            self._async = receiver
+            if self._recv_engine is not None:
+                self.start_reader()
+        return receiver
+
+    def _detach_async(self, receiver, dropped=0):
+        """Switches the reader thread back to the ring buffer because the event loop of the receiver is closed.
+            :param dropped: The number of messages that were handed to the closed event loop and are lost.
+        """
+        self.async_dropped += dropped
+        if self._async is receiver:  # not yet replaced by the receiver of a new event loop
+            self._async = None
+            log.debug("Event loop closed, the received frames go to the ring buffer again")
+
+    def _drain_ring(self):
+        """Builds the messages of the frames the reader thread pushed into the ring buffer before asyncio took over."""
+        messages = []
+        if self.ring is not None:
+            entry = self.ring.pop()
+            while entry is not None:
+                messages.append(self.buildMessage(entry[0], timestamp=entry[1]))
+                entry = self.ring.pop()
+        return messages
+
+    def buildMessage(self, recvdata, offset=0, timestamp=0.0):
+        """Converts a frame from the usb2can-device framework to the format python-can is expecting.
+            can_id, dlc and data are unpacked at once with the precompiled FRAME_FIELDS. Remote frames are
+            returned with is_remote_frame=True and without data.
+            Error frames are returned with is_error_frame=True, the error class in the arbitration_id and
+            the details in the data, see :func:`errors.decode_error_frame`.
+            :param recvdata: The buffer that contains the frame (bytes, bytearray or memoryview).
+            :param offset: The position of the 20 byte frame inside the buffer.
+            :param timestamp: The time the frame was received in seconds since the epoch, see :meth:`_timestamp`.
+        """
+        frameID, dlc, data = FRAME_FIELDS.unpack_from(recvdata, offset)
+        if frameID & CAN_ERR_ID_FLAG:
+            self.errorHandling(frameID, data)
+            return Message(timestamp, frameID & CAN_EFF_MASK, False, False, True, None, dlc, bytearray(data[:dlc]))
+        # the arguments are positional and the data is already a bytearray, this saves the most time in Message
+        return Message(timestamp, frameID & CAN_EFF_MASK, frameID & CAN_EFF_ID_FLAG != 0,
+                       frameID & CAN_RTR_ID_FLAG != 0, False, None, dlc, bytearray(data[:dlc]))
 
     def readData(self):
         """Gets the messages out of the buffer of the InnoMaker device
         """
-        myclasstype = clr.System.Type.GetType("InnoMakerUsb2CanLib.UsbCan, InnoMakerUsb2CanLib")
-        method = myclasstype.GetMethod("getInnoMakerDeviceBuf")
-        buffer = clr.System.Array.CreateInstance(clr.System.Byte, 20)
-        parameters = clr.System.Array[clr.System.Object]([self.Device, buffer, 20])
-        device = UsbCan()
-        result = method.Invoke(device, parameters)
-        readdata = parameters[1]
-
-        if result:
-            if readdata[1] == 0 and readdata[2] == 0 and readdata[3] == 0:  # fängt wiederhallende Signale von Send ab
-                return 0
-            else:
-                return readdata
-        else:
+        if self._recv_engine is None:
             return 0
+        return self._recv_engine.read()
+
+    def readBatch(self, max_frames):
+        """Gets up to max_frames messages out of the buffer of the InnoMaker device with one transfer.
+            :return: The buffer and the list of offsets of the valid frames inside the buffer.
+        """
+        if self._recv_engine is None:
+            return None, []
+        return self._recv_engine.read_batch(max_frames)
 
     # send function
     def send(self, msg, timeout=None):
         """Transmits a message to the CAN bus.
-            The method buildDataFrame is used inside this function to convert the msg format from python-can to
-            the format the InnoMaker device expects.
+            The SendEngine encodes the message into its preallocated buffer in the format the InnoMaker device expects.
             :param msg: The message for the CAN device.
             :param timeout: An optional timeout that is currently not implemented.
         """
-        frame = self.buildDataFrame(msg.arbitration_id, msg.dlc, msg.data)
-        result = InnoMakerBus.bus.sendInnoMakerDeviceBuf(self.Device, frame, 20)
-        if result:
-            print("send data successful")
+        if self._transmit(msg):
+            log.debug("send data successful: %s", msg)
         else:
-            print("send data failed")
+            self._send_error_log.log("send data failed: %s", msg)  # e.g. a flood under bus-off
+
+    def _transmit(self, msg):
+        """Transmits a message without any output, is used by send and the periodic tasks.
+            :return: True if the dll accepted the frame.
+        """
+        if self._send_engine is None:
+            return False
+        frameID = self.frameID(msg)
+        result = self._send_engine.send(frameID, msg.dlc, msg.data)
+        self.statistics.tx(frameID, msg.dlc, result)
+        return result
+
+    @staticmethod
+    def frameID(msg):
+        """Returns the identifier of the message including the flags the InnoMaker device expects."""
+        frameID = msg.arbitration_id
+        if msg.is_extended_id:
+            frameID |= CAN_EFF_ID_FLAG
+        if msg.is_remote_frame:
+            frameID |= CAN_RTR_ID_FLAG
+        return frameID
+
+    def send_many(self, messages, bulk=False):
+        """Transmits many messages to the CAN bus without any output on the terminal.
+            :param messages: The messages for the CAN device.
+            :param bulk: If True all frames are packed into one buffer and handed to the dll with one transfer.
+                This requires a device firmware that accepts several frames per transfer.
+                Otherwise the frames are sent in a tight loop with one transfer per frame.
+            :return: A list with the result of the dll (True if accepted) for each message.
+        """
+        if self._send_engine is None:
+            return [False] * len(messages)
+        frameID = self.frameID
+        frames = [(frameID(msg), msg.dlc, msg.data) for msg in messages]
+        if bulk:
+            results = [self._send_engine.send_bulk(frames)] * len(frames)
+        else:
+            results = self._send_engine.send_frames(frames)
+        tx = self.statistics.tx
+        for (frameID, dlc, data), result in zip(frames, results):
+            tx(frameID, dlc, result)
+        return results
+
+    def _send_periodic_internal(self, msgs, period, duration=None, autostart=True, modifier_callback=None):
+        """Starts sending messages periodically, is called by :meth:`can.BusABC.send_periodic`.
+            All periodic tasks of the bus share one scheduler thread with drift-free absolute deadlines.
+            The timing of all tasks is returned by :meth:`periodic_statistics`.
+            :param msgs: The messages to be sent periodically.
+            :param period: The period in seconds.
+            :param duration: Seconds to continue sending, None sends until the task is stopped.
+            :param autostart: If True the task is started immediately.
+            :param modifier_callback: Function that modifies the data of each message before it is sent.
+        """
+        if self._scheduler is None:
+            self._scheduler = CyclicScheduler(self._transmit)
+        return CyclicSendTask(self._scheduler, msgs, period, duration, autostart, modifier_callback)
+
+    def periodic_statistics(self):
+        """Returns the timing of the periodic tasks, see :meth:`CyclicScheduler.statistics` for details."""
+        if self._scheduler is None:
+            return CyclicScheduler(None).statistics()
+        return self._scheduler.statistics()
+
+    def get_statistics(self, consumer=None):
+        """Returns a snapshot of the traffic and the errors of the bus.
+
+            The snapshot is a dictionary with the received and sent frames and bytes, the failed transmissions,
+            the error frames per error class, the dropped frames of the ring buffer and of closed event loops
+            (see :meth:`recv_async`), the RX overflows reported
+            by the controller, the estimated bus load (None without bitrate), the count and rate of every
+            identifier (keyed by the identifier including the flags of the InnoMaker frame) and a histogram of the frame rates. Rates and bus load refer to the interval since
+            the previous snapshot of the same consumer, see :class:`statistics.BusStatistics` for details.
+            :param consumer: The name of the caller, callers with different names do not shorten each other's
+                interval. The export of :meth:`export_statistics` uses 'export'.
+        """
+        return self.statistics.snapshot(dropped=self.rx_overflows + self.async_dropped, consumer=consumer)
+
+    def export_statistics(self, path, interval=1.0):
+        """Appends a snapshot of :meth:`get_statistics` as JSON line to a file every interval seconds
+            until the bus is shut down.
+            :param path: The file the snapshots are appended to.
+            :param interval: Seconds between two snapshots.
+        """
+        self.statistics.start_export(path, interval, self.get_statistics)
 
     # buildDataFrame is used to convert the python-can frame to the format the InnoMaker devices is expecting
     @staticmethod
     def buildDataFrame(frameID, length, data):
         """Is used to convert the python-can frame to the format the InnoMaker devices is expecting.
 
-            :param frameID: The identifier of the CAN-frame.
+            :param frameID: The identifier of the CAN-frame including the flags
+                (CAN_EFF_ID_FLAG for extended and CAN_RTR_ID_FLAG for remote frames).
             :param length: The data length carry (DLC) that specifies the length of the data.
             :param data: The data that will be transmitted in the message
         """
-        frame = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        buffer = struct.pack('H', frameID)
-        # dbuffer = struct.pack('>Q', data) # only if data is not already in byte-format
-
-        frame[4] = buffer[0]
-        frame[5] = buffer[1]
-        frame[8] = length
-        for i in range(12, 12 + length):
-            frame[i] = data[i - 12]
-        # print(frame)
-        return frame
+        frame = bytearray(FRAME.size)
+        FRAME.pack_into(frame, 0, 0, frameID, length, 0, 0, 0, bytes(data[:length]))
+        return list(frame)
 
     # todo: AddDeviceNotifyDelegate is included in the DLL of Innomaker but the purpose is not yet clear
     def AddDeviceNotifyDelegate(self):
@@ -270,7 +867,6 @@ class InnoMakerBus(BusABC):
         if self.Device is not None:
             self.shutdown()
             # self.Device = None
-        InnoMakerBus.bus.scanInnoMakerDevices()
         self.update()
 
     # todo: RemoveDeviceNotifyDelegate is included in the DLL of Innomaker but the purpose is not yet clear
@@ -281,216 +877,204 @@ class InnoMakerBus(BusABC):
         if self.Device is not None:
             self.shutdown()
             # self.Device = None
-        InnoMakerBus.bus.scanInnoMakerDevices()
         self.update()
 
-    # The errorHandling function is called in case something went wrong during the send or receive functions
-    # It prints out the respecting error with a short explanation on the terminal
-    @staticmethod
+    # The errorHandling function is called when an error frame was received
+    # It decodes the error frame with the lookup tables of the errors module and logs it, identical errors are rate limited
     def errorHandling(self, frameID, data):
-        """is called in case something went wrong during the send or receive process.
-            It prints out the respecting error with a short explanation on the terminal.
+        """is called when an error frame was received.
+            The error frame is decoded into an immutable BusError in constant time and logged as warning.
+            Identical error frames are logged at most once per second, the suppressed ones are counted.
             :param frameID: contains the identifier of the errorframe
             :param data: contains the data of the errorframe
+            :return: The decoded :class:`BusError`.
+        """
+        error = decode_error_frame(frameID, data)
+        self._error_frame_log.log('Error frame: %s', error, key=error)
+        return error
+
+
+class ReceiveEngine:
+    """The ReceiveEngine collects the frames out of the buffer of an opened InnoMaker device.
+
+        The reflected getInnoMakerDeviceBuf method of the dll, the device handle and the .NET buffers
+        are resolved once when the engine is created and are reused for every following read.
+        This keeps the reflection and the allocations out of the receive routine.
+        After each transfer the .NET buffer is copied with one Marshal.Copy into a host buffer,
+        so the frames are decoded without crossing the pythonnet boundary for every byte.
+        """
+    FRAME_SIZE = 20
+    _method = None
+
+    def __init__(self, usbcan, device, frame_size=FRAME_SIZE):
+        """Resolves the receive method of the dll and allocates the buffers for the given device.
+
+            :param usbcan: The UsbCan object of the dll that the receive method is invoked on.
+            :param device: The opened InnoMakerDevice the frames are read from.
+            :param frame_size: The size of one frame, 24 bytes if the device appends a timestamp.
+        """
+        self.frame_size = frame_size
+        if ReceiveEngine._method is None:  # the reflection is done once per process
+            myclasstype = clr.System.Type.GetType("InnoMakerUsb2CanLib.UsbCan, InnoMakerUsb2CanLib")
+            ReceiveEngine._method = myclasstype.GetMethod("getInnoMakerDeviceBuf")
+        self.method = ReceiveEngine._method
+        self.device = device
+        self.buffer = clr.System.Array.CreateInstance(clr.System.Byte, self.frame_size)
+        self.parameters = clr.System.Array[clr.System.Object]([device, self.buffer, self.frame_size])
+        self.host_buffer = (c_ubyte * self.frame_size)()
+        self.host_view = memoryview(self.host_buffer).cast('B')
+        self._host_address = clr.System.IntPtr(addressof(self.host_buffer))
+        self._copy = clr.System.Runtime.InteropServices.Marshal.Copy
+        self._invoke = self.method.Invoke
+        self._target = usbcan
+        self.batch_frames = 0
+        self.batch_buffer = None
+        self.batch_parameters = None
+        self.batch_host_buffer = None
+        self.batch_host_view = None
+        self._batch_host_address = None
+
+    def _allocate_batch(self, frames):
+        """Allocates the buffers for bulk transfers of the given number of frames."""
+        size = self.frame_size * frames
+        self.batch_frames = frames
+        self.batch_buffer = clr.System.Array.CreateInstance(clr.System.Byte, size)
+        self.batch_parameters = clr.System.Array[clr.System.Object]([self.device, self.batch_buffer, size])
+        self.batch_host_buffer = (c_ubyte * size)()
+        self.batch_host_view = memoryview(self.batch_host_buffer).cast('B')
+        self._batch_host_address = clr.System.IntPtr(addressof(self.batch_host_buffer))
+
+    def read(self):
+        """Reads one frame out of the buffer of the device.
+
+            Note: The returned buffer is reused by the next read and has to be processed before.
+            :return: The frame as memoryview or 0 if no frame was received.
+        """
+        parameters = self.parameters
+        if self._invoke(self._target, parameters):
+            self._copy(self.buffer, 0, self._host_address, self.frame_size)  # the dll filled it in place
+            readdata = self.host_view
+            if readdata[1] == 0 and readdata[2] == 0 and readdata[3] == 0:  # fängt wiederhallende Signale von Send ab
+                return 0
+            return readdata
+        return 0
+
+    def read_batch(self, max_frames):
+        """Reads up to max_frames frames out of the buffer of the device with one bulk transfer.
+
+            The buffer is cleared before the transfer, so records the device did not fill are skipped
+            in the same way as the echoes of sent frames.
+            Note: The returned buffer is reused by the next read and has to be processed before.
+            :return: The buffer as memoryview and the list of offsets of the received frames inside the buffer.
+        """
+        if max_frames != self.batch_frames:
+            self._allocate_batch(max_frames)
+        parameters = self.batch_parameters
+        size = self.frame_size * max_frames
+        clr.System.Array.Clear(self.batch_buffer, 0, size)
+        if not self._invoke(self._target, parameters):
+            return None, []
+        self._copy(self.batch_buffer, 0, self._batch_host_address, size)
+        readdata = self.batch_host_view
+        offsets = []
+        for offset in range(0, size, self.frame_size):
+            if readdata[offset + 1] == 0 and readdata[offset + 2] == 0 and readdata[offset + 3] == 0:
+                continue
+            offsets.append(offset)
+        return readdata, offsets
+
+
+class SendEngine:
+    """The SendEngine transmits frames to an opened InnoMaker device.
+
+        Every frame is packed with one FRAME.pack_into into a preallocated host buffer, which is copied
+        with one Marshal.Copy into a preallocated .NET array. The dll therefore gets a ready .NET array
+        instead of a python list that pythonnet would have to convert element by element.
+        """
+    FRAME_SIZE = 20
+
+    def __init__(self, usbcan, device):
+        """Allocates the buffers for the given device.
+
+            :param usbcan: The UsbCan object of the dll.
+            :param device: The opened InnoMakerDevice the frames are sent to.
+        """
+        self.device = device
+        self.buffer = clr.System.Array.CreateInstance(clr.System.Byte, self.FRAME_SIZE)
+        self.host_buffer = (c_ubyte * self.FRAME_SIZE)()
+        self._host_address = clr.System.IntPtr(addressof(self.host_buffer))
+        self._copy = clr.System.Runtime.InteropServices.Marshal.Copy
+        self._send = usbcan.sendInnoMakerDeviceBuf
+        self._lock = threading.Lock()  # the buffers are shared by all threads that send on the bus
+        self.bulk_frames = 0
+        self.bulk_buffer = None
+        self.bulk_host_buffer = None
+        self._bulk_host_address = None
+
+    def send(self, frameID, dlc, data):
+        """Encodes and transmits one frame.
+
+            :param frameID: The identifier of the frame including the flags.
+            :param dlc: The data length code.
+            :param data: The payload of the frame.
+            :return: True if the dll accepted the frame.
         """
-        la = 0  # lost arbitration
-        cp = 0  # controller problems
-        pv = 0  # protocol violations
-        ts = 0  # transceiver status
-        print('')
-        print('Error code was detected:')
-        buffer = frameID & 0x1
-        if buffer != 0:
-            print('TX timeout (by netdevice driver')
-        buffer = frameID & 0x2
-        if buffer != 0:
-            la = 1
-        buffer = frameID & 0x4
-        if buffer != 0:
-            cp = 1
-        buffer = frameID & 0x8
-        if buffer != 0:
-            pv = 1
-        buffer = frameID & 0x10
-        if buffer != 0:
-            ts = 1
-        buffer = frameID & 0x20
-        if buffer != 0:
-            print('received no ACK on transmission')
-        buffer = frameID & 0x40
-        if buffer != 0:
-            print('bus off')
-        buffer = frameID & 0x80
-        if buffer != 0:
-            print('bus error (may flood!)')
-        buffer = frameID & 0x100
-        if buffer != 0:
-            print('controller restarted')
-
-        # lookup for lost arbitration
-        if la == 1:
-            print('lost arbitration occurred in bit number: ', end='')
-            if data[0] == 0:
-                print('unspecified')
-            else:
-                print(data[0])
-
-        # lookup for controller problems
-        if cp == 1:
-            print('controller problem occurred: ')
-            if data[1] == 0:
-                print('unspecified')
-            else:
-                buffer = data[1] & 0x1
-                if buffer != 0:
-                    print('   RX buffer overflow')
-                buffer = data[1] & 0x2
-                if buffer != 0:
-                    print('   TX buffer overflow')
-                buffer = data[1] & 0x4
-                if buffer != 0:
-                    print('   reached warning level for RX errors')
-                buffer = data[1] & 0x8
-                if buffer != 0:
-                    print('   reached warning level for TX errors')
-                buffer = data[1] & 0x10
-                if buffer != 0:
-                    print('   reached error passive status RX')
-                buffer = data[1] & 0x20
-                if buffer != 0:
-                    print('   reached error passive status TX')
-                buffer = data[1] & 0x40
-                if buffer != 0:
-                    print('   recovered error active state')
-
-        # lookup for protocol error
-        if pv == 1:
-            print('protocol error occurred: ')
-            if data[2] == 0:
-                print('unspecified')
-            else:
-                buffer = data[2] & 0x1
-                if buffer != 0:
-                    print('   single bit error')
-                buffer = data[2] & 0x2
-                if buffer != 0:
-                    print('   frame format error')
-                buffer = data[2] & 0x4
-                if buffer != 0:
-                    print('   bit stuffing error')
-                buffer = data[2] & 0x8
-                if buffer != 0:
-                    print('   unable to send dominant bit')
-                buffer = data[2] & 0x10
-                if buffer != 0:
-                    print('   unable to send recessive bit')
-                buffer = data[2] & 0x20
-                if buffer != 0:
-                    print('   bus overload')
-                buffer = data[2] & 0x40
-                if buffer != 0:
-                    print('   active error announcement')
-                buffer = data[2] & 0x80
-                if buffer != 0:
-                    print('   error occurred on transmission')
-
-            print('location of protocol error: ')
-            if data[3] == 0:
-                print('unspecified')
-            else:
-                buffer = data[3] & 0x3
-                if buffer != 0:
-                    print('   start of frame')
-                buffer = data[3] & 0x2
-                if buffer != 0:
-                    print('   ID bits 28 - 21 (SFF: 10 - 3)')
-                buffer = data[3] & 0x6
-                if buffer != 0:
-                    print('   ID bits 20 - 18 (SFF: 2 - 0)')
-                buffer = data[3] & 0x4
-                if buffer != 0:
-                    print('   substitute RTR (SFF: RTR)')
-                buffer = data[3] & 0x7
-                if buffer != 0:
-                    print('   ID bits 17 - 13')
-                    buffer = data[3] & 0xF
-                    if buffer != 0:
-                        print('   ID bits 12 - 5')
-                buffer = data[3] & 0xE
-                if buffer != 0:
-                    print('   ID bits 4 - 0')
-                buffer = data[3] & 0xC
-                if buffer != 0:
-                    print('   RTR')
-                buffer = data[3] & 0xD
-                if buffer != 0:
-                    print('   reserved bit 1')
-                buffer = data[3] & 0x9
-                if buffer != 0:
-                    print('   reserved bit 0')
-                buffer = data[3] & 0xB
-                if buffer != 0:
-                    print('   data length code')
-                buffer = data[3] & 0xA
-                if buffer != 0:
-                    print('   data section')
-                buffer = data[3] & 0x8
-                if buffer != 0:
-                    print('   CRC sequence')
-                buffer = data[3] & 0x18
-                if buffer != 0:
-                    print('   CRC delimiter')
-                buffer = data[3] & 0x19
-                if buffer != 0:
-                    print('   ACK slot')
-                buffer = data[3] & 0x1B
-                if buffer != 0:
-                    print('   ACK delimiter')
-                buffer = data[3] & 0x1A
-                if buffer != 0:
-                    print('   end of frame')
-                buffer = data[3] & 0x12
-                if buffer != 0:
-                    print('   intermission')
-
-        # lookup for CAN-transceiver status problems
-        if ts == 1:
-            print('transceiver status error occurred: ')
-            if data[1] == 0:
-                print('unspecified')
-            else:
-                print('   CANH CANL')
-                buffer = data[4] & 0x1
-                if buffer != 0:
-                    print('   0000 0000')
-                buffer = data[4] & 0x4
-                if buffer != 0:
-                    print('   0000 0100')
-                buffer = data[4] & 0x5
-                if buffer != 0:
-                    print('   0000 0101')
-                buffer = data[4] & 0x6
-                if buffer != 0:
-                    print('   0000 0110')
-                buffer = data[4] & 0x7
-                if buffer != 0:
-                    print('   0000 0111')
-                buffer = data[4] & 0x40
-                if buffer != 0:
-                    print('   0100 0000')
-                buffer = data[4] & 0x50
-                if buffer != 0:
-                    print('   0101 0000')
-                buffer = data[4] & 0x60
-                if buffer != 0:
-                    print('   0110 0000')
-                buffer = data[4] & 0x70
-                if buffer != 0:
-                    print('   0111 0000')
-                buffer = data[4] & 0x80
-                if buffer != 0:
-                    print('   1000 0000')
-        print('Warning frame was:')
+        payload = bytes(data[:dlc])
+        with self._lock:
+            FRAME.pack_into(self.host_buffer, 0, 0, frameID, dlc, 0, 0, 0, payload)
+            self._copy(self._host_address, self.buffer, 0, self.FRAME_SIZE)
+            return self._send(self.device, self.buffer, self.FRAME_SIZE)
+
+    def send_frames(self, frames):
+        """Transmits the frames one by one while holding the lock only once.
+
+            :param frames: A list of (frameID, dlc, data) tuples.
+            :return: A list with the result of the dll for each frame.
+        """
+        pack_into = FRAME.pack_into
+        host_buffer = self.host_buffer
+        host_address = self._host_address
+        buffer = self.buffer
+        device = self.device
+        copy = self._copy
+        send = self._send
+        size = self.FRAME_SIZE
+        results = []
+        with self._lock:
+            for frameID, dlc, data in frames:
+                pack_into(host_buffer, 0, 0, frameID, dlc, 0, 0, 0, bytes(data[:dlc]))
+                copy(host_address, buffer, 0, size)
+                results.append(send(device, buffer, size))
+        return results
+
+    def _allocate_bulk(self, frames):
+        """Allocates the buffers for bulk transfers of the given number of frames."""
+        size = self.FRAME_SIZE * frames
+        self.bulk_frames = frames
+        self.bulk_buffer = clr.System.Array.CreateInstance(clr.System.Byte, size)
+        self.bulk_host_buffer = (c_ubyte * size)()
+        self._bulk_host_address = clr.System.IntPtr(addressof(self.bulk_host_buffer))
+
+    def send_bulk(self, frames):
+        """Packs all frames into one buffer and transmits them with one transfer.
+
+            :param frames: A list of (frameID, dlc, data) tuples.
+            :return: True if the dll accepted the transfer, also True for no frames, as nothing is transferred.
+        """
+        if not frames:
+            return True  # the buffers are only allocated for at least one frame
+        size = self.FRAME_SIZE * len(frames)
+        with self._lock:
+            if len(frames) > self.bulk_frames:
+                self._allocate_bulk(len(frames))
+            pack_into = FRAME.pack_into
+            host_buffer = self.bulk_host_buffer
+            offset = 0
+            for frameID, dlc, data in frames:
+                pack_into(host_buffer, offset, 0, frameID, dlc, 0, 0, 0, bytes(data[:dlc]))
+                offset += self.FRAME_SIZE
+            self._copy(self._bulk_host_address, self.bulk_buffer, 0, size)
+            return self._send(self.device, self.bulk_buffer, size)
 
 
 # The below functions predefine the values of the timing registers of the InnoMaker device
@@ -504,7 +1088,7 @@ def Baud20K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
     """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -519,7 +1103,7 @@ def Baud33K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 3
     bittiming.phase_seg1 = 3
     bittiming.phase_seg2 = 1
@@ -534,7 +1118,7 @@ def Baud40K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -549,7 +1133,7 @@ def Baud50K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -564,7 +1148,7 @@ def Baud66K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 3
     bittiming.phase_seg1 = 3
     bittiming.phase_seg2 = 1
@@ -579,7 +1163,7 @@ def Baud80K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 3
     bittiming.phase_seg1 = 3
     bittiming.phase_seg2 = 1
@@ -594,7 +1178,7 @@ def Baud83K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 3
     bittiming.phase_seg1 = 3
     bittiming.phase_seg2 = 1
@@ -609,7 +1193,7 @@ def Baud100K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -624,7 +1208,7 @@ def Baud125K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -639,7 +1223,7 @@ def Baud200K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -654,7 +1238,7 @@ def Baud250K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -669,7 +1253,7 @@ def Baud400K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 3
     bittiming.phase_seg1 = 3
     bittiming.phase_seg2 = 1
@@ -684,7 +1268,7 @@ def Baud500K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 6
     bittiming.phase_seg1 = 7
     bittiming.phase_seg2 = 2
@@ -699,7 +1283,7 @@ def Baud666K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 3
     bittiming.phase_seg1 = 3
     bittiming.phase_seg2 = 2
@@ -714,7 +1298,7 @@ def Baud800K():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 7
     bittiming.phase_seg1 = 8
     bittiming.phase_seg2 = 4
@@ -729,10 +1313,31 @@ def Baud1M():
         and should not be altered unless the user has a full understanding of the funcionality of the bittiming registers.
         A wrong configuration can lead to the device not being able to send or receive messages.
         """
-    bittiming = InnoMakerBus.bus.innomaker_device_bittming()
+    bittiming = UsbCan.innomaker_device_bittming()
     bittiming.prop_seg = 5
     bittiming.phase_seg1 = 6
     bittiming.phase_seg2 = 4
     bittiming.sjw = 1
     bittiming.brp = 3
     return bittiming
+
+
+# the bittiming of every valid bitrate, see :meth:`InnoMakerBus.connect`
+BITTIMINGS = {
+    20000: Baud20K,
+    33330: Baud33K,
+    40000: Baud40K,
+    50000: Baud50K,
+    66660: Baud66K,
+    80000: Baud80K,
+    83330: Baud83K,
+    100000: Baud100K,
+    125000: Baud125K,
+    200000: Baud200K,
+    250000: Baud250K,
+    400000: Baud400K,
+    500000: Baud500K,
+    666000: Baud666K,
+    800000: Baud800K,
+    1000000: Baud1M
+}
@@ -1 +1,7 @@
-from .InnoMaker import InnoMakerBus
\ No newline at end of file
+from .InnoMaker import InnoMakerBus, DllTransport, get_device_manager
+from .errors import BusError, decode_error_frame
+from .manager import DeviceManager
+from .transport import Transport
+from .simulation import SimulatedDevice, SimulatedTransport
+from .capture import CaptureWriter, CaptureReader
+from .replay import TraceReplay
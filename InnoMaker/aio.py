@@ -0,0 +1,96 @@
+"""
+This module contains the AsyncReceiver that hands the frames of the reader thread of an InnoMakerBus
+to an asyncio event loop, see :meth:`InnoMakerBus.recv_async`.
+"""
+# imports
+import asyncio
+from collections import deque
+
+
+class AsyncReceiver:
+    """The AsyncReceiver collects the messages of the reader thread for the coroutines of one event loop.
+
+        The reader thread hands over all messages of one USB transfer with a single call_soon_threadsafe,
+        so the event loop is woken up once per batch and not once per frame. Several coroutines can wait at
+        the same time, every delivered message wakes one of them in the order they started waiting.
+        All methods except feed and close must be called from the event loop.
+        """
+
+    def __init__(self, loop, backlog=None):
+        """
+            :param loop: The event loop the messages are delivered to.
+            :param backlog: A function that returns the messages the reader thread left in the ring buffer,
+                it is called in the event loop before every delivered batch.
+        """
+        self.loop = loop
+        self.backlog = backlog
+        self.messages = deque()
+        self.closed = False
+        self.batches = 0  # number of call_soon_threadsafe calls, for statistics
+        self._waiters = deque()  # the futures of the waiting coroutines, oldest first
+
+    def feed(self, messages):
+        """Hands a batch of messages to the event loop, is called by the reader thread.
+            :return: False if the event loop is closed, the messages are then not delivered.
+        """
+        self.batches += 1
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, messages)
+        except RuntimeError:  # the event loop is closed
+            self.closed = True
+            return False
+        return True
+
+    def close(self):
+        """Wakes up all waiting coroutines, they receive None. Can be called from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._close)
+        except RuntimeError:
+            pass  # the event loop is closed
+
+    def _deliver(self, messages):
+        if self.backlog is not None:
+            self.messages.extend(self.backlog())  # older than the batch
+        self.messages.extend(messages)
+        self._wake(len(self.messages))
+
+    def _close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self, count=None):
+        """Wakes up count waiting coroutines, all of them if count is None."""
+        waiters = self._waiters
+        while waiters and (count is None or count > 0):
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                if count is not None:
+                    count -= 1
+
+    async def get(self, timeout=None):
+        """Returns the next message.
+
+            :param timeout: Seconds to wait for a message, None waits until the bus is shut down.
+            :return: The message or None if the time is up or the bus was shut down.
+        """
+        if self.messages:
+            return self.messages.popleft()
+        deadline = None if timeout is None else self.loop.time() + timeout
+        while not self.messages and not self.closed:
+            remaining = None if deadline is None else deadline - self.loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            waiter = self.loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                self._wake(len(self.messages))  # a message this coroutine was woken for goes to the next one
+                return None
+            finally:
+                try:
+                    self._waiters.remove(waiter)  # still queued after a timeout or a cancellation
+                except ValueError:
+                    pass  # woken up by _wake
+        return self.messages.popleft() if self.messages else None
@@ -0,0 +1,377 @@
+"""
+This module contains the CaptureWriter that records the raw frames of the InnoMaker device
+into a binary, append-only capture file, see :meth:`InnoMakerBus.start_capture`.
+
+A capture file consists of a header of 64 bytes and records of 32 bytes (little endian):
+timestamp in ns since the epoch (8), the 20 byte frame of the device (20) and the microsecond counter of the
+device if hardware timestamps are enabled, otherwise 0 (4).
+The CaptureReader maps such a file as NumPy structured array and finds the frames of a time range and of an
+identifier through a sparse time index and an index per identifier.
+"""
+# imports
+import mmap
+import os
+import struct
+import time
+
+np = None  # NumPy is optional and imported with the first CaptureReader, see _numpy
+
+MAGIC = b'INNOCAP\x00'
+VERSION = 1
+# magic (8), version (2), record size (2), flags (4), bitrate (4), reserved (4), created in ns (8), record count (8)
+HEADER = struct.Struct('<8sHHIIIqQ')
+HEADER_SIZE = 64
+COUNT_OFFSET = 32  # position of the record count inside the header
+COUNT = struct.Struct('<Q')
+RECORD_SIZE = 32
+TIMESTAMP = struct.Struct('<Q')
+# timestamp, echo_id, can_id, dlc, channel, flags, reserved, data, device_ticks
+RECORD = struct.Struct('<QIIBBBB8sI')
+FRAME_SIZE = 20
+FLAG_DEVICE_TIMESTAMPS = 0x1
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+
+
+def iter_records(path, chunk_records=4096):
+    """Reads the records of a capture file one after another without NumPy.
+        :param chunk_records: The number of records that are read from the file at once.
+        :return: A generator of RECORD tuples, see :data:`RECORD`.
+        :raises ValueError: If the file is no capture file.
+    """
+    remaining = read_header(path)['count']
+    with open(path, 'rb') as file:
+        file.seek(HEADER_SIZE)
+        while remaining > 0:
+            data = file.read(min(remaining, chunk_records) * RECORD_SIZE)
+            records = len(data) // RECORD_SIZE  # a file that was not closed properly can be shorter
+            if records == 0:
+                return
+            yield from RECORD.iter_unpack(data[:records * RECORD_SIZE])
+            remaining -= records
+
+
+def _numpy():
+    """Imports NumPy when it is needed first, so ``import InnoMaker`` does not pay for it."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('the CaptureReader needs NumPy') from None
+        np = numpy
+    return np
+
+
+def record_dtype():
+    """Returns the NumPy dtype of a record, the fields are named like the fields of the frame."""
+    return _numpy().dtype([('timestamp', '<u8'), ('echo_id', '<u4'), ('can_id', '<u4'), ('dlc', 'u1'), ('channel', 'u1'),
+                     ('flags', 'u1'), ('reserved', 'u1'), ('data', 'u1', (8,)), ('device_ticks', '<u4')])
+
+
+def read_header(path):
+    """Reads the header of a capture file.
+        :return: A dict with version, record_size, flags, bitrate, created (ns since the epoch) and count.
+        :raises ValueError: If the file is no capture file.
+    """
+    with open(path, 'rb') as file:
+        data = file.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE or data[:8] != MAGIC:
+        raise ValueError('{} is no capture file'.format(path))
+    magic, version, record_size, flags, bitrate, reserved, created, count = HEADER.unpack_from(data)
+    return {'version': version, 'record_size': record_size, 'flags': flags, 'bitrate': bitrate,
+            'created': created, 'count': count}
+
+
+class CaptureWriter:
+    """The CaptureWriter appends the frames to a preallocated, memory-mapped capture file.
+
+        The file grows in steps of chunk_records records, so writing a frame is a copy into the mapped memory
+        without a system call. The record count in the header is updated with every flush, which happens at the
+        latest flush_interval seconds after the last one and when the file is closed; a file that was not closed
+        properly can still be read up to the last flush. On close the unused preallocated space is cut off.
+        With max_bytes or max_seconds the capture is continued in a new file (trace.1.cap, trace.2.cap, ...)
+        when the current one reaches the size or the duration.
+        The writer is not thread-safe, it is fed by the reader thread of the bus.
+        """
+
+    def __init__(self, path, max_bytes=None, max_seconds=None, chunk_records=65536, flush_interval=1.0,
+                 bitrate=0, device_timestamps=False):
+        """Creates the first capture file.
+
+            :param path: The path of the first file, the rotated files get a number in front of the suffix.
+            :param max_bytes: The maximum size of one file, None for no limit.
+            :param max_seconds: The maximum duration of one file, None for no limit.
+            :param chunk_records: The number of records the file is enlarged by at once.
+            :param flush_interval: Seconds between two flushes of the mapped memory to the file.
+            :param bitrate: The bitrate of the bus, it is stored in the header.
+            :param device_timestamps: True if the frames carry the microsecond counter of the device.
+        """
+        if max_bytes is not None and max_bytes < HEADER_SIZE + RECORD_SIZE * 64:
+            raise ValueError('max_bytes must hold at least 64 records')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_ns = None if max_seconds is None else int(max_seconds * 1e9)
+        self.chunk_bytes = chunk_records * RECORD_SIZE
+        self.flush_ns = int(flush_interval * 1e9)
+        self.bitrate = bitrate
+        self.flags = FLAG_DEVICE_TIMESTAMPS if device_timestamps else 0
+        self.files = []  # the paths of all written files
+        self.records = 0  # the records written into all files
+        self.closed = False
+        self._file = None
+        self._map = None
+        self._open(path)
+
+    def _file_name(self, index):
+        if index == 0:
+            return self.path
+        stem, suffix = os.path.splitext(self.path)
+        return '{}.{}{}'.format(stem, index, suffix)
+
+    def _open(self, path):
+        size = HEADER_SIZE + self.chunk_bytes
+        if self.max_bytes is not None:
+            size = min(size, self.max_bytes)
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD_SIZE, self.flags, self.bitrate, 0, time.time_ns(), 0)
+        self._position = HEADER_SIZE
+        self._end = size
+        self._first_ns = None  # timestamp of the first record of the file
+        self._next_flush_ns = 0
+        self.files.append(path)
+
+    def _finish(self):
+        """Writes the record count, cuts off the preallocated space and closes the current file."""
+        self.flush()
+        self._map.close()
+        self._file.truncate(self._position)
+        self._file.close()
+
+    def rotate(self):
+        """Closes the current file and continues in the next one."""
+        self._finish()
+        self._open(self._file_name(len(self.files)))
+
+    def _make_room(self, needed):
+        """Enlarges the mapping by a chunk or rotates if the file would exceed max_bytes."""
+        if self.max_bytes is not None and self._position + needed > self.max_bytes:
+            self.rotate()
+            return
+        size = max(self._end + self.chunk_bytes, self._position + needed)
+        if self.max_bytes is not None:
+            size = min(size, self.max_bytes)
+        self._map.resize(size)
+        self._end = size
+
+    @property
+    def count(self):
+        """The number of records in the current file."""
+        return (self._position - HEADER_SIZE) // RECORD_SIZE
+
+    def write(self, frame, offset, timestamp_ns, frame_size=FRAME_SIZE):
+        """Appends one frame.
+
+            :param frame: The buffer that contains the frame.
+            :param offset: The position of the frame inside the buffer.
+            :param timestamp_ns: The time the frame was received in ns since the epoch.
+            :param frame_size: 24 if the microsecond counter of the device follows the frame.
+        """
+        self.write_batch(frame, (offset,), timestamp_ns, frame_size)
+
+    def write_batch(self, frames, offsets, timestamp_ns, frame_size=FRAME_SIZE):
+        """Appends the frames of one transfer, they all get the same timestamp.
+
+            :param frames: The buffer that contains the frames.
+            :param offsets: The positions of the frames inside the buffer.
+            :param timestamp_ns: The time the frames were received in ns since the epoch.
+            :param frame_size: 24 if the microsecond counter of the device follows every frame.
+        """
+        if self.max_bytes is not None and len(offsets) * RECORD_SIZE > self.max_bytes - HEADER_SIZE:
+            limit = (self.max_bytes - HEADER_SIZE) // RECORD_SIZE  # the transfer is split over several files
+            for start in range(0, len(offsets), limit):
+                self.write_batch(frames, offsets[start:start + limit], timestamp_ns, frame_size)
+            return
+        if self._first_ns is None:
+            self._first_ns = timestamp_ns
+        elif self.max_ns is not None and timestamp_ns - self._first_ns >= self.max_ns:
+            self.rotate()
+            self._first_ns = timestamp_ns
+        needed = len(offsets) * RECORD_SIZE
+        while self._position + needed > self._end:
+            self._make_room(needed)
+        mapped = self._map
+        position = self._position
+        pack_into = TIMESTAMP.pack_into
+        for offset in offsets:
+            pack_into(mapped, position, timestamp_ns)
+            # the frame and, if present, the microsecond counter behind it fill the rest of the record
+            mapped[position + 8:position + 8 + frame_size] = frames[offset:offset + frame_size]
+            position += RECORD_SIZE
+        self._position = position
+        self.records += len(offsets)
+        if timestamp_ns >= self._next_flush_ns:
+            self.flush()
+            self._next_flush_ns = timestamp_ns + self.flush_ns
+
+    def flush(self):
+        """Writes the record count into the header and the mapped memory to the file."""
+        COUNT.pack_into(self._map, COUNT_OFFSET, self.count)
+        self._map.flush()
+
+    def close(self):
+        """Finishes the current file, further calls do nothing."""
+        if not self.closed:
+            self.closed = True
+            self._finish()
+
+
+class CaptureReader:
+    """The CaptureReader gives random access to the records of a capture file without reading the whole file.
+
+        The records are a NumPy structured array (see :func:`record_dtype`) on the memory-mapped file, so only
+        the pages that are accessed are read. A time range is found through a sparse index that holds every
+        index_step-th timestamp, the frames of an identifier through an index that lists the record numbers of
+        every identifier in ascending order. The identifier index needs one pass over the file, it is built with
+        the first query by identifier and stored next to the capture file (trace.cap.idx.npz), so it is only
+        built again if the capture file changed. A query then costs a few binary searches plus the size of its
+        result. The timestamps must not decrease, as written by the InnoMakerBus.
+        """
+
+    def __init__(self, path, index_step=4096, cache_index=True):
+        """Maps the capture file.
+
+            :param path: The path of the capture file.
+            :param index_step: The number of records between two entries of the sparse time index.
+            :param cache_index: True if the identifier index is stored in and loaded from path + '.idx.npz'.
+            :raises ValueError: If the file is no capture file.
+        """
+        self.path = path
+        self.header = read_header(path)
+        self.index_step = index_step
+        self.cache_index = cache_index
+        dtype = record_dtype()
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # a file that was not closed properly is read up to the last flush
+        self.count = min(self.header['count'], (size - HEADER_SIZE) // RECORD_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.records = np.frombuffer(self._map, dtype, self.count, HEADER_SIZE) if self.count else \
+            np.zeros(0, dtype)
+        self.timestamps = self.records['timestamp']
+        self._time_index = self.timestamps[::index_step].copy()  # reads one page per index_step records
+        self._keys = None  # the identifiers of the identifier index in ascending order
+        self._starts = None  # where the record numbers of an identifier begin in _positions
+        self._positions = None  # the record numbers grouped by identifier
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Unmaps the file. Arrays returned by the queries must not be used afterwards."""
+        self.records = self.timestamps = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a view of the records is still in use, the map is closed with the last view
+            self._map = None
+        self._file.close()
+
+    @staticmethod
+    def key(arbitration_id, is_extended_id=False):
+        """Returns the key of an identifier in the identifier index: the can_id without the RTR flag."""
+        return arbitration_id | CAN_EFF_FLAG if is_extended_id else arbitration_id
+
+    def position(self, timestamp):
+        """Returns the number of the first record at or after timestamp.
+            :param timestamp: Seconds since the epoch like Message.timestamp, None for the begin of the file.
+        """
+        if timestamp is None:
+            return 0
+        timestamp_ns = np.uint64(round(timestamp * 1e9))  # a python int would be compared as float64
+        block = int(np.searchsorted(self._time_index, timestamp_ns, 'left'))
+        if block == 0:
+            return 0
+        # the record lies between the two index entries, only this block of the file is searched
+        begin = (block - 1) * self.index_step
+        end = min(block * self.index_step, self.count)
+        return begin + int(np.searchsorted(self.timestamps[begin:end], timestamp_ns, 'left'))
+
+    def time_range(self, start=None, end=None):
+        """Returns the records with start <= timestamp < end as view of the mapped file, nothing is copied.
+            :param start: Seconds since the epoch, None for the begin of the file.
+            :param end: Seconds since the epoch, None for the end of the file.
+        """
+        return self.records[self.position(start):self.count if end is None else self.position(end)]
+
+    def build_index(self):
+        """Builds the identifier index, or loads it if it was stored for this version of the capture file."""
+        cache = self.path + '.idx.npz'
+        stat = os.stat(self.path)
+        if self.cache_index and os.path.exists(cache):
+            with np.load(cache) as index:
+                if int(index['count']) == self.count and int(index['mtime_ns']) == stat.st_mtime_ns:
+                    self._keys, self._starts, self._positions = index['keys'], index['starts'], index['positions']
+                    return
+        keys = self.records['can_id'] & np.uint32(~CAN_RTR_FLAG & 0xFFFFFFFF)
+        # the stable sort keeps the records of an identifier in file order and therefore in time order
+        positions = np.argsort(keys, kind='stable').astype(np.uint32 if self.count < 2 ** 32 else np.uint64)
+        sorted_keys = keys[positions]
+        del keys
+        first = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))) if self.count else \
+            np.zeros(0, np.int64)
+        self._keys = sorted_keys[first]
+        self._starts = np.append(first, self.count).astype(np.int64)
+        self._positions = positions
+        if self.cache_index:
+            np.savez(cache, keys=self._keys, starts=self._starts, positions=positions, count=self.count,
+                     mtime_ns=stat.st_mtime_ns)
+
+    def identifiers(self):
+        """Returns the keys of all identifiers in the file and the number of their records."""
+        if self._keys is None:
+            self.build_index()
+        return self._keys, np.diff(self._starts)
+
+    def positions(self, arbitration_id, start=None, end=None, is_extended_id=False):
+        """Returns the record numbers of an identifier with start <= timestamp < end in ascending order.
+            :param arbitration_id: The identifier.
+            :param start: Seconds since the epoch, None for the begin of the file.
+            :param end: Seconds since the epoch, None for the end of the file.
+            :param is_extended_id: True for a 29 bit identifier.
+        """
+        if self._keys is None:
+            self.build_index()
+        key = self.key(arbitration_id, is_extended_id)
+        index = int(np.searchsorted(self._keys, np.uint32(key)))
+        if index == len(self._keys) or self._keys[index] != key:
+            return self._positions[:0]
+        positions = self._positions[self._starts[index]:self._starts[index + 1]]
+        # the searched value has the dtype of the array, otherwise numpy would convert the whole array
+        dtype = positions.dtype.type
+        first = 0 if start is None else int(np.searchsorted(positions, dtype(self.position(start))))
+        last = len(positions) if end is None else int(np.searchsorted(positions, dtype(self.position(end))))
+        return positions[first:last]
+
+    def query(self, arbitration_id=None, start=None, end=None, is_extended_id=False):
+        """Returns the records of an identifier and a time range.
+
+            Without identifier the result is a view of the mapped file like :meth:`time_range`, with identifier
+            the records are gathered into a new array of the size of the result.
+            :param arbitration_id: The identifier, None for all identifiers.
+            :param start: Seconds since the epoch, None for the begin of the file.
+            :param end: Seconds since the epoch, None for the end of the file.
+            :param is_extended_id: True for a 29 bit identifier.
+        """
+        if arbitration_id is None:
+            return self.time_range(start, end)
+        return self.records[self.positions(arbitration_id, start, end, is_extended_id)]
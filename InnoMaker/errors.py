@@ -0,0 +1,188 @@
+"""
+This module contains the table driven decoder for the error frames of the InnoMaker device.
+The error frames follow the layout of the SocketCAN error frames (linux/can/error.h):
+the error class is encoded in the identifier, the details in the data bytes.
+"""
+# imports
+from collections import namedtuple
+
+# error classes (identifier of the error frame)
+CAN_ERR_TX_TIMEOUT = 0x001
+CAN_ERR_LOSTARB = 0x002
+CAN_ERR_CRTL = 0x004
+CAN_ERR_PROT = 0x008
+CAN_ERR_TRX = 0x010
+CAN_ERR_ACK = 0x020
+CAN_ERR_BUSOFF = 0x040
+CAN_ERR_BUSERROR = 0x080
+CAN_ERR_RESTARTED = 0x100
+CAN_ERR_CNT = 0x200
+CAN_ERR_CLASS_MASK = 0x3FF
+
+ERROR_CLASSES = (
+    (CAN_ERR_TX_TIMEOUT, 'TX timeout (by netdevice driver)'),
+    (CAN_ERR_LOSTARB, 'lost arbitration'),
+    (CAN_ERR_CRTL, 'controller problem'),
+    (CAN_ERR_PROT, 'protocol error'),
+    (CAN_ERR_TRX, 'transceiver status error'),
+    (CAN_ERR_ACK, 'received no ACK on transmission'),
+    (CAN_ERR_BUSOFF, 'bus off'),
+    (CAN_ERR_BUSERROR, 'bus error (may flood!)'),
+    (CAN_ERR_RESTARTED, 'controller restarted'),
+    (CAN_ERR_CNT, 'error counter'),
+)
+
+# controller problems (data[1])
+CONTROLLER_PROBLEMS = (
+    (0x01, 'RX buffer overflow'),
+    (0x02, 'TX buffer overflow'),
+    (0x04, 'reached warning level for RX errors'),
+    (0x08, 'reached warning level for TX errors'),
+    (0x10, 'reached error passive status RX'),
+    (0x20, 'reached error passive status TX'),
+    (0x40, 'recovered error active state'),
+)
+
+# protocol error types (data[2])
+PROTOCOL_ERRORS = (
+    (0x01, 'single bit error'),
+    (0x02, 'frame format error'),
+    (0x04, 'bit stuffing error'),
+    (0x08, 'unable to send dominant bit'),
+    (0x10, 'unable to send recessive bit'),
+    (0x20, 'bus overload'),
+    (0x40, 'active error announcement'),
+    (0x80, 'error occurred on transmission'),
+)
+
+# location of the protocol error (data[3]), an enumeration and not a bit field
+PROTOCOL_LOCATIONS = {
+    0x00: 'unspecified',
+    0x03: 'start of frame',
+    0x02: 'ID bits 28 - 21 (SFF: 10 - 3)',
+    0x06: 'ID bits 20 - 18 (SFF: 2 - 0)',
+    0x04: 'substitute RTR (SFF: RTR)',
+    0x05: 'identifier extension',
+    0x07: 'ID bits 17 - 13',
+    0x0F: 'ID bits 12 - 5',
+    0x0E: 'ID bits 4 - 0',
+    0x0C: 'RTR',
+    0x0D: 'reserved bit 1',
+    0x09: 'reserved bit 0',
+    0x0B: 'data length code',
+    0x0A: 'data section',
+    0x08: 'CRC sequence',
+    0x18: 'CRC delimiter',
+    0x19: 'ACK slot',
+    0x1B: 'ACK delimiter',
+    0x1A: 'end of frame',
+    0x12: 'intermission',
+}
+
+# transceiver status (data[4]), the low nibble describes CANH and the high nibble CANL
+TRANSCEIVER_CANH = {0x0: None, 0x4: 'CANH no wire', 0x5: 'CANH short to BAT', 0x6: 'CANH short to VCC',
+                    0x7: 'CANH short to GND'}
+TRANSCEIVER_CANL = {0x0: None, 0x4: 'CANL no wire', 0x5: 'CANL short to BAT', 0x6: 'CANL short to VCC',
+                    0x7: 'CANL short to GND', 0x8: 'CANL short to CANH'}
+
+CONTROLLER_STATES = ('error-active', 'error-warning', 'error-passive', 'bus-off')
+
+
+def _flag_table(size, names):
+    """Builds a table with the tuple of names for every possible value of a bit field."""
+    return tuple(tuple(name for mask, name in names if value & mask) for value in range(size))
+
+
+def _transceiver(value):
+    if value == 0:
+        return 'unspecified'
+    canh = TRANSCEIVER_CANH.get(value & 0x0F, 'CANH unknown')
+    canl = TRANSCEIVER_CANL.get(value >> 4, 'CANL unknown')
+    return ', '.join(name for name in (canh, canl) if name)
+
+
+CLASS_TABLE = _flag_table(CAN_ERR_CLASS_MASK + 1, ERROR_CLASSES)
+CONTROLLER_TABLE = _flag_table(256, CONTROLLER_PROBLEMS)
+PROTOCOL_TABLE = _flag_table(256, PROTOCOL_ERRORS)
+LOCATION_TABLE = tuple(PROTOCOL_LOCATIONS.get(value, 'unknown') for value in range(256))
+TRANSCEIVER_TABLE = tuple(_transceiver(value) for value in range(256))
+
+
+def _state(error_class, controller):
+    if error_class & CAN_ERR_BUSOFF:
+        return 'bus-off'
+    if controller & 0x30:
+        return 'error-passive'
+    if controller & 0x0C:
+        return 'error-warning'
+    return 'error-active'
+
+
+# the controller state for every combination of the bus-off class bit and the controller problems
+STATE_TABLE = tuple(_state(busoff * CAN_ERR_BUSOFF, controller) for busoff in (0, 1) for controller in range(256))
+
+
+class BusError(namedtuple('BusError', ['error_class', 'classes', 'state', 'lost_arbitration_bit', 'controller',
+                                       'protocol', 'location', 'transceiver', 'tx_errors', 'rx_errors'])):
+    """The BusError is the decoded content of an error frame. It is immutable and can be used as dictionary key.
+
+        error_class: the error class bits of the identifier, classes: their names,
+        state: the controller state (error-active, error-warning, error-passive or bus-off),
+        lost_arbitration_bit: the bit in which arbitration was lost (None if unspecified),
+        controller and protocol: the names of the controller problems and protocol error types,
+        location: the location of the protocol error, transceiver: the transceiver status,
+        tx_errors and rx_errors: the error counters of the controller (None if not reported).
+        """
+    __slots__ = ()
+
+    def __str__(self):
+        parts = list(self.classes)
+        if self.error_class & CAN_ERR_LOSTARB:
+            parts.append('lost arbitration occurred in bit number: {}'.format(
+                'unspecified' if self.lost_arbitration_bit is None else self.lost_arbitration_bit))
+        if self.error_class & CAN_ERR_CRTL:
+            parts.append('controller problem occurred: {}'.format(', '.join(self.controller) or 'unspecified'))
+        if self.error_class & CAN_ERR_PROT:
+            parts.append('protocol error occurred: {} (location: {})'.format(
+                ', '.join(self.protocol) or 'unspecified', self.location))
+        if self.error_class & CAN_ERR_TRX:
+            parts.append('transceiver status error occurred: {}'.format(self.transceiver))
+        parts.append('state: {}'.format(self.state))
+        return '; '.join(parts)
+
+
+_cache = {}
+
+
+def decode_error_frame(frameID, data):
+    """Decodes an error frame with table lookups only.
+        Identical error frames return the same BusError object from a cache.
+
+        :param frameID: The identifier of the error frame (the flag bits are ignored).
+        :param data: The 8 data bytes of the error frame.
+        :return: The decoded BusError.
+    """
+    data = bytes(data[:8]).ljust(8, b'\0')
+    key = (frameID & CAN_ERR_CLASS_MASK, data)
+    error = _cache.get(key)
+    if error is not None:
+        return error
+    error_class = key[0]
+    controller = data[1] if error_class & CAN_ERR_CRTL else 0
+    counters = error_class & CAN_ERR_CNT
+    error = BusError(
+        error_class=error_class,
+        classes=CLASS_TABLE[error_class],
+        state=STATE_TABLE[(256 if error_class & CAN_ERR_BUSOFF else 0) + controller],
+        lost_arbitration_bit=data[0] if error_class & CAN_ERR_LOSTARB and data[0] else None,
+        controller=CONTROLLER_TABLE[controller],
+        protocol=PROTOCOL_TABLE[data[2]] if error_class & CAN_ERR_PROT else (),
+        location=LOCATION_TABLE[data[3]] if error_class & CAN_ERR_PROT else 'unspecified',
+        transceiver=TRANSCEIVER_TABLE[data[4]] if error_class & CAN_ERR_TRX else 'unspecified',
+        tx_errors=data[6] if counters else None,
+        rx_errors=data[7] if counters else None,
+    )
+    if len(_cache) >= 4096:
+        _cache.clear()
+    _cache[key] = error
+    return error
@@ -0,0 +1,88 @@
+"""
+This module contains the AcceptanceFilter that applies the can_filters of python-can
+directly to the raw 20 byte frames of the InnoMaker device.
+"""
+
+# the flags of the can_id as they appear in its highest byte (byte 7 of the frame)
+EFF_BYTE_FLAG = 0x80  # extended frame format, bit 31 of the can_id
+ERR_BYTE_FLAG = 0x20  # error frame, bit 29 of the can_id
+CAN_SFF_MASK = 0x7FF
+CAN_EFF_MASK = 0x1FFFFFFF
+
+
+class AcceptanceFilter:
+    """The AcceptanceFilter works like the acceptance filter of a CAN controller.
+
+        The filters are compiled once: all accepted 11 bit identifiers are stored in a bitmap with one entry
+        per identifier, the filters for 29 bit identifiers are grouped by their mask.
+        A frame is therefore checked with one lookup (11 bit) or one set lookup per distinct mask (29 bit)
+        before any Message is created.
+        Error frames are always accepted.
+        """
+
+    def __init__(self, filters):
+        """Compiles the filters.
+
+            :param filters: A list of dictionaries with "can_id", "can_mask" and an optional "extended" key,
+                see :meth:`can.BusABC.set_filters` for details. For 29 bit identifiers can_id and can_mask
+                are masked with CAN_EFF_MASK.
+        """
+        self.standard = bytearray(CAN_SFF_MASK + 1)  # 1 for every accepted 11 bit identifier
+        extended = {}  # mask -> set of accepted masked identifiers
+        for _filter in filters:
+            can_id = _filter["can_id"]
+            can_mask = _filter["can_mask"]
+            is_extended = _filter.get("extended")
+            if is_extended is not True:
+                self._add_standard(can_id, can_mask)
+            if is_extended is not False:
+                # an identifier has only 29 bits, bits above them in can_id or can_mask (e.g. the flags
+                # of a SocketCAN can_id) are ignored
+                mask = can_mask & CAN_EFF_MASK
+                extended.setdefault(mask, set()).add(can_id & mask)
+        self.extended = list(extended.items())
+
+    def _add_standard(self, can_id, can_mask):
+        """Marks all 11 bit identifiers the filter matches in the bitmap."""
+        if can_id & can_mask & ~CAN_SFF_MASK:
+            return  # the filter requires bits that a standard identifier does not have
+        base = can_id & can_mask & CAN_SFF_MASK
+        free = ~can_mask & CAN_SFF_MASK
+        # enumerate every combination of the bits the mask does not care about
+        sub = free
+        while True:
+            self.standard[base | sub] = 1
+            if sub == 0:
+                break
+            sub = (sub - 1) & free
+
+    def matches(self, can_id, is_extended_id):
+        """Checks an identifier that was already decoded.
+
+            :param can_id: The arbitration identifier without flags.
+            :param is_extended_id: True for a 29 bit identifier.
+        """
+        if not is_extended_id:
+            return self.standard[can_id & CAN_SFF_MASK] == 1
+        for mask, values in self.extended:
+            if can_id & mask in values:
+                return True
+        return False
+
+    def accepts(self, recvdata, offset=0):
+        """Checks the identifier of a raw frame of the InnoMaker device.
+
+            :param recvdata: The buffer that contains the frame.
+            :param offset: The position of the 20 byte frame inside the buffer.
+        """
+        flags = recvdata[offset + 7]
+        if flags & ERR_BYTE_FLAG:
+            return True
+        if flags & EFF_BYTE_FLAG:
+            can_id = ((flags & 0x1F) << 24) | (recvdata[offset + 6] << 16) | (recvdata[offset + 5] << 8) | \
+                     recvdata[offset + 4]
+            for mask, values in self.extended:
+                if can_id & mask in values:
+                    return True
+            return False
+        return self.standard[((recvdata[offset + 5] & 0x7) << 8) | recvdata[offset + 4]] == 1
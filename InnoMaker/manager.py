@@ -0,0 +1,92 @@
+"""
+This module contains the DeviceManager that enumerates the InnoMaker devices once
+and hands each InnoMakerBus its own device.
+"""
+# imports
+import threading
+
+
+class DeviceManager:
+    """The DeviceManager enumerates the connected InnoMaker devices and keeps track of the opened ones.
+
+        All buses of a process share one manager and its transport, by default the UsbCan object of the dll.
+        Every bus gets its own device handle, so several buses can be opened side by side, one per device.
+        The devices are enumerated with the first request and only again when :meth:`refresh` is called
+        or when a requested device is not in the enumeration, so opening and closing a bus does not scan the USB.
+        """
+
+    def __init__(self, transport):
+        """
+            :param transport: The :class:`transport.Transport` that enumerates the devices and creates their handles.
+        """
+        self.transport = transport
+        self._devices = None
+        self._opened = {}  # deviceId -> handle of the bus that opened the device
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """Searches for devices connected to USB.
+            :return: The list of the devices, the index in the list is the channel of the device.
+        """
+        with self._lock:
+            self._devices = list(self.transport.scan())
+            return list(self._devices)
+
+    @property
+    def devices(self):
+        """The enumerated devices, they are enumerated on the first access."""
+        with self._lock:
+            if self._devices is None:
+                self.refresh()
+            return list(self._devices)
+
+    @property
+    def serials(self):
+        """The deviceId of every enumerated device in the order of the channels."""
+        return [device.deviceId for device in self.devices]
+
+    def find(self, channel=0, serial=None):
+        """Finds the index of a device.
+
+            :param channel: The index of the device or its deviceId, an index may also be given as string.
+            :param serial: The deviceId of the device, it takes precedence over the channel.
+            :return: The index of the device or None if no device matches.
+        """
+        devices = self.devices
+        if serial is None and isinstance(channel, str) and not channel.isdigit():
+            serial = channel
+        if serial is not None:
+            for index, device in enumerate(devices):
+                if str(device.deviceId) == str(serial):
+                    return index
+            return None
+        index = int(channel or 0)
+        return index if 0 <= index < len(devices) else None
+
+    def acquire(self, channel=0, serial=None):
+        """Reserves a device for a bus and creates its own handle.
+
+            :param channel: See :meth:`find`.
+            :param serial: See :meth:`find`.
+            :return: The new device handle or None if no free device matches.
+        """
+        with self._lock:
+            enumerated = self._devices is None  # find enumerates the devices if it was not done before
+            index = self.find(channel, serial)
+            if index is None and not enumerated:
+                self.refresh()  # the device may have been connected after the enumeration
+                index = self.find(channel, serial)
+            if index is None:
+                return None
+            found = self._devices[index]
+            if found.deviceId in self._opened:
+                return None
+            device = self.transport.handle(found)
+            self._opened[device.deviceId] = device
+            return device
+
+    def release(self, device):
+        """Frees a device that was reserved with :meth:`acquire`."""
+        with self._lock:
+            if self._opened.get(device.deviceId) is device:
+                del self._opened[device.deviceId]
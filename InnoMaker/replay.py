@@ -0,0 +1,169 @@
+"""
+This module contains the TraceReplay that sends the frames of capture files (see :mod:`capture`)
+with their original timing through the send method of a bus.
+"""
+# imports
+import threading
+import time
+from can import Message
+from .capture import iter_records
+
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CAN_EFF_MASK = 0x1FFFFFFF
+CAN_SFF_MASK = 0x000007FF
+ERROR_BUCKETS = 1000  # the timing error is counted in steps of 1 us up to 1 ms, later frames in one bucket
+
+
+class TraceReplay:
+    """The TraceReplay sends the recorded frames at the times they were received, relative to the first frame.
+
+        Every frame has an absolute deadline: start + (timestamp - first timestamp) / speed, so the timing does not
+        drift even if single frames are late, a late frame is sent immediately. The thread sleeps until spin
+        seconds before the deadline and waits for the rest in a loop on time.perf_counter_ns(), because a sleep
+        wakes up too late by up to a millisecond (on Windows by up to 15 ms). The Message of the next frame is
+        built before the wait. The error frames of the capture are not sent.
+        The timing error (time of the send call minus deadline) of every frame is counted, see :meth:`statistics`.
+        """
+
+    def __init__(self, bus, paths, speed=1.0, ids=None, loop=False, spin=0.002):
+        """Creates the replay, it is started with :meth:`start` or run in the calling thread with :meth:`run`.
+
+            :param bus: The bus the frames are sent with, e.g. an InnoMakerBus.
+            :param paths: The path of a capture file or the list of files of a rotated capture, e.g. the return
+                value of :meth:`InnoMakerBus.stop_capture`.
+            :param speed: The factor the replay is faster than the recording, 2.0 halves the gaps between the frames.
+            :param ids: The arbitration ids that are sent, None for all.
+            :param loop: If True the trace is sent again and again until :meth:`stop` is called,
+                the first frame of a pass follows the last frame of the previous pass without a gap.
+            :param spin: Seconds before a deadline from which on the thread waits actively instead of sleeping.
+        """
+        if speed <= 0:
+            raise ValueError('speed must be greater than 0')
+        self.bus = bus
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.speed = speed
+        self.ids = None if ids is None else frozenset(ids)
+        self.loop = loop
+        self.spin_ns = int(spin * 1e9)
+        self.frames = 0  # the sent frames
+        self.passes = 0  # the completed passes through the trace
+        self.error_sum = 0  # ns
+        self.error_max = 0  # ns
+        self.late = 0  # frames that were sent more than 1 ms after their deadline
+        self.errors = [0] * (ERROR_BUCKETS + 1)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the replay in its own thread."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="InnoMakerReplay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the replay, the current frame is still sent."""
+        self._stopped.set()
+        self.wait()
+
+    def wait(self, timeout=None):
+        """Waits until the replay is finished or stopped.
+            :return: True if the replay is finished.
+        """
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                return False
+            self._thread = None
+        return True
+
+    def _messages(self):
+        """Returns the frames of all files as (timestamp in ns, Message), filtered by the ids."""
+        ids = self.ids
+        for path in self.paths:
+            for timestamp, echo_id, can_id, dlc, channel, flags, reserved, data, ticks in iter_records(path):
+                if can_id & CAN_ERR_FLAG:
+                    continue
+                extended = bool(can_id & CAN_EFF_FLAG)
+                arbitration_id = can_id & (CAN_EFF_MASK if extended else CAN_SFF_MASK)
+                if ids is not None and arbitration_id not in ids:
+                    continue
+                dlc = min(dlc, 8)
+                yield timestamp, Message(timestamp=timestamp / 1e9, arbitration_id=arbitration_id,
+                                         is_extended_id=extended, is_remote_frame=bool(can_id & CAN_RTR_FLAG),
+                                         dlc=dlc, data=data[:dlc], channel=channel)
+
+    def run(self):
+        """Sends the trace in the calling thread until it is finished or :meth:`stop` is called."""
+        stopped = self._stopped
+        send = self.bus.send
+        clock = time.perf_counter_ns
+        speed = self.speed
+        spin_ns = self.spin_ns
+        start_ns = None  # the deadline of the first frame of the current pass
+        first = None  # the timestamp of the first frame of the current pass
+        while not stopped.is_set():
+            deadline = None
+            for timestamp, msg in self._messages():
+                if first is None:
+                    first = timestamp
+                    start_ns = clock() if start_ns is None else start_ns
+                deadline = start_ns + int((timestamp - first) / speed)
+                remaining = deadline - clock()
+                if remaining > spin_ns:
+                    if stopped.wait((remaining - spin_ns) / 1e9):
+                        return
+                while clock() < deadline:
+                    time.sleep(0)  # releases the GIL, e.g. for the reader thread of the bus, without sleeping
+                now = clock()
+                send(msg)
+                self._count(now - deadline)
+                if stopped.is_set():
+                    return
+            if deadline is None or not self.loop:
+                self.passes += deadline is not None
+                return
+            self.passes += 1
+            start_ns, first = deadline, None  # the next pass begins at the last deadline
+
+    def _count(self, error):
+        self.frames += 1
+        self.error_sum += error
+        if error > self.error_max:
+            self.error_max = error
+        bucket = error // 1000 if error > 0 else 0
+        if bucket >= ERROR_BUCKETS:
+            self.late += 1
+            bucket = ERROR_BUCKETS
+        self.errors[bucket] += 1
+
+    def _percentile(self, fraction):
+        """Returns the upper bound in seconds of the error bucket that contains the given fraction of the frames."""
+        limit = fraction * self.frames
+        total = 0
+        for bucket, count in enumerate(self.errors):
+            total += count
+            if total >= limit:
+                return (bucket + 1) * 1e-6 if bucket < ERROR_BUCKETS else self.error_max / 1e9
+        return 0.0
+
+    def statistics(self):
+        """Summarizes the achieved timing against the deadlines.
+
+            :return: A dictionary with the sent frames and completed passes, the mean and maximum error, the 50 %
+                and 99 % percentile of the error in seconds (with a resolution of 1 us, a percentile above 1 ms is
+                given as the maximum) and the number of frames that were sent more than 1 ms late.
+        """
+        return {
+            "frames": self.frames,
+            "passes": self.passes,
+            "mean_error": self.error_sum / self.frames / 1e9 if self.frames else 0.0,
+            "max_error": self.error_max / 1e9,
+            "p50_error": self._percentile(0.5) if self.frames else 0.0,
+            "p99_error": self._percentile(0.99) if self.frames else 0.0,
+            "late": self.late,
+        }
@@ -0,0 +1,72 @@
+"""
+This module contains the RingBuffer that hands the received frames of the InnoMaker device
+from the reader thread to the receive routine of the InnoMakerBus.
+"""
+# imports
+from array import array
+
+
+class RingBuffer:
+    """The RingBuffer is a preallocated fixed-size buffer of 20 byte records with a timestamp for each record.
+
+        It is written by exactly one thread (the reader) and read by exactly one thread (the receiver).
+        The write index is only changed by the writer and the read index only by the reader,
+        so no lock is needed. If the buffer is full, the new frame is dropped and counted as overflow.
+        """
+
+    def __init__(self, capacity=4096, record_size=20):
+        """Allocates the buffer.
+
+            :param capacity: The number of records the buffer can hold.
+            :param record_size: The size of one record in bytes.
+        """
+        self.capacity = capacity
+        self.record_size = record_size
+        self.buffer = bytearray(capacity * record_size)
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.head = 0  # number of records written, only changed by the writer
+        self.tail = 0  # number of records read, only changed by the reader
+        self.overflows = 0
+        self._view = memoryview(self.buffer)
+
+    def push(self, data, offset=0, timestamp=0.0):
+        """Copies one record into the buffer.
+
+            :param data: The buffer that contains the record (bytes, bytearray or memoryview).
+            :param offset: The position of the record inside data.
+            :param timestamp: The time the record was received.
+            :return: False if the buffer was full and the record was dropped.
+        """
+        head = self.head
+        if head - self.tail >= self.capacity:
+            self.overflows += 1
+            return False
+        slot = head % self.capacity
+        position = slot * self.record_size
+        size = self.record_size
+        self._view[position:position + size] = data[offset:offset + size]
+        self.timestamps[slot] = timestamp
+        self.head = head + 1
+        return True
+
+    def pop(self):
+        """Takes the oldest record out of the buffer.
+
+            :return: A tuple of the record as bytes and its timestamp or None if the buffer is empty.
+        """
+        tail = self.tail
+        if tail == self.head:
+            return None
+        slot = tail % self.capacity
+        position = slot * self.record_size
+        record = bytes(self._view[position:position + self.record_size])
+        timestamp = self.timestamps[slot]
+        self.tail = tail + 1
+        return record, timestamp
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def clear(self):
+        """Discards all records. Must only be called while the writer is stopped."""
+        self.tail = self.head
@@ -0,0 +1,225 @@
+"""
+This module contains the CyclicScheduler that transmits the periodic messages of an InnoMakerBus
+from one thread and the CyclicSendTask that python-can returns for :meth:`can.BusABC.send_periodic`.
+"""
+# imports
+import heapq
+import itertools
+import logging
+import threading
+import time
+from can.broadcastmanager import (LimitedDurationCyclicSendTaskABC, ModifiableCyclicTaskABC,
+                                  RestartableCyclicTaskABC)
+
+log = logging.getLogger('can.InnoMaker')
+ERROR_LOG_INTERVAL = 1.0  # seconds between two log messages of the failing transmissions of one task
+
+
+class CyclicScheduler:
+    """The CyclicScheduler sends the messages of any number of periodic tasks from a single thread.
+
+        The deadlines of all tasks are kept in a heap, the thread sleeps until the earliest deadline.
+        Every deadline is calculated from the start time of the task (start + n * period),
+        so the timing does not drift even if a single transmission is late.
+        If a task falls behind by more than one period, the missed transmissions are skipped and counted.
+        A transmission that raises an exception is logged and counted, the task stays scheduled,
+        so one failing task does not stop the other tasks.
+        """
+
+    def __init__(self, send):
+        """Creates the scheduler, the thread is started with the first task.
+
+            :param send: The function that transmits one message, e.g. :meth:`InnoMakerBus._transmit`.
+        """
+        self._send = send
+        self._heap = []  # entries: (deadline, sequence, task, generation)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.tasks = set()  # the tasks that are started
+
+    def add(self, task, deadline):
+        """Schedules the next transmission of the task.
+
+            :param task: The CyclicSendTask.
+            :param deadline: The time.perf_counter() value of the transmission.
+        """
+        with self._condition:
+            self.tasks.add(task)
+            heapq.heappush(self._heap, (deadline, next(self._sequence), task, task.generation))
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name="InnoMakerScheduler", daemon=True)
+                self._thread.start()
+            elif self._heap[0][2] is task:
+                self._condition.notify()  # the new deadline is the earliest one
+
+    def remove(self, task):
+        """Removes all scheduled transmissions of the task.
+            The entries stay in the heap but are skipped, because the generation of the task changed.
+        """
+        with self._condition:
+            task.generation += 1
+            self.tasks.discard(task)
+
+    def stop(self):
+        """Stops the thread of the scheduler and drops all tasks."""
+        with self._condition:
+            self._running = False
+            self._heap.clear()
+            self.tasks.clear()
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def statistics(self):
+        """Summarizes the timing of all tasks that are currently started.
+
+            :return: A dictionary with the number of tasks and transmissions, the mean and maximum jitter in seconds
+                (delay of a transmission after its deadline) and the number of skipped transmissions.
+        """
+        with self._condition:
+            tasks = list(self.tasks)
+        count = sum(task.count for task in tasks)
+        jitter = sum(task.jitter_sum for task in tasks)
+        return {
+            "tasks": len(tasks),
+            "transmissions": count,
+            "mean_jitter": jitter / count if count else 0.0,
+            "max_jitter": max((task.jitter_max for task in tasks), default=0.0),
+            "missed": sum(task.missed for task in tasks),
+            "errors": sum(task.errors for task in tasks),
+        }
+
+    def _run(self):
+        """The routine of the scheduler thread."""
+        try:
+            self._schedule()
+        finally:
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._running = False  # the next task starts a new thread
+                    self._thread = None
+
+    def _schedule(self):
+        heap = self._heap
+        condition = self._condition
+        while True:
+            with condition:
+                while True:
+                    if not self._running:
+                        return
+                    if heap:
+                        delay = heap[0][0] - time.perf_counter()
+                        if delay <= 0:
+                            break
+                        condition.wait(delay)
+                    else:
+                        condition.wait()
+                deadline, _, task, generation = heapq.heappop(heap)
+            if generation != task.generation:
+                continue
+            try:
+                next_deadline = task._transmit(deadline, self._send)
+            except Exception:
+                log.exception("Periodic task %r failed and is stopped", task)
+                task.active = False
+                self.remove(task)
+                continue
+            if next_deadline is not None:
+                with condition:
+                    if generation == task.generation and self._running:
+                        heapq.heappush(heap, (next_deadline, next(self._sequence), task, generation))
+
+
+class CyclicSendTask(LimitedDurationCyclicSendTaskABC, ModifiableCyclicTaskABC, RestartableCyclicTaskABC):
+    """The CyclicSendTask is returned by :meth:`can.BusABC.send_periodic` of the InnoMakerBus.
+
+        The messages are transmitted by the CyclicScheduler of the bus. If several messages are given,
+        one message is sent per period in turn. The data can be changed at any time with modify_data.
+        The timing of the task is measured: count, jitter_sum, jitter_max and missed.
+        Transmissions in which the send or the modifier_callback raised an exception are counted in errors.
+        """
+
+    def __init__(self, scheduler, messages, period, duration=None, autostart=True, modifier_callback=None):
+        """Creates the task and starts it if autostart is True.
+
+            :param scheduler: The CyclicScheduler of the bus.
+            :param messages: The messages to be sent periodically.
+            :param period: The period in seconds.
+            :param duration: Seconds to continue sending, None sends until the task is stopped.
+            :param autostart: If True the first message is sent immediately.
+            :param modifier_callback: Function that modifies the data of each message before it is sent.
+        """
+        super(CyclicSendTask, self).__init__(messages, period, duration)
+        self.scheduler = scheduler
+        self.modifier_callback = modifier_callback
+        self.generation = 0
+        self.active = False
+        self.index = 0
+        self.slot = 0
+        self.start_time = 0.0
+        self.count = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.missed = 0
+        self.errors = 0
+        self._error_logged = None  # time.perf_counter() of the last logged error
+        if autostart:
+            self.start()
+
+    def start(self):
+        """Starts the task or restarts a stopped task. The first message is sent immediately."""
+        if self.active:
+            return
+        self.active = True
+        self.slot = 0
+        self.start_time = time.perf_counter()
+        self.end_time = self.start_time + self.duration if self.duration else None
+        self.scheduler.add(self, self.start_time)
+
+    def stop(self):
+        """Stops the task. It can be restarted with start."""
+        self.active = False
+        self.scheduler.remove(self)
+
+    def _transmit(self, deadline, send):
+        """Sends the next message and records the timing, is called by the scheduler thread.
+
+            :param deadline: The time.perf_counter() value the message was due.
+            :param send: The function that transmits the message.
+            :return: The next deadline or None if the duration of the task is over.
+        """
+        messages = self.messages  # may be replaced by modify_data at any time
+        msg = messages[self.index % len(messages)]
+        self.index += 1
+        now = time.perf_counter()
+        try:
+            if self.modifier_callback is not None:
+                self.modifier_callback(msg)
+            send(msg)
+        except Exception:
+            self.errors += 1
+            if self._error_logged is None or now - self._error_logged >= ERROR_LOG_INTERVAL:
+                self._error_logged = now
+                log.exception("Periodic transmission of 0x%X failed (%d errors)", msg.arbitration_id, self.errors)
+        jitter = now - deadline
+        self.count += 1
+        self.jitter_sum += jitter
+        if jitter > self.jitter_max:
+            self.jitter_max = jitter
+
+        # the deadlines are counted from the start time, so rounding errors and late transmissions do not add up
+        self.slot += 1
+        next_deadline = self.start_time + self.slot * self.period
+        if next_deadline <= now:
+            missed = int((now - next_deadline) / self.period) + 1
+            self.missed += missed
+            self.slot += missed
+            next_deadline = self.start_time + self.slot * self.period
+        if self.end_time is not None and next_deadline > self.end_time:
+            self.active = False
+            return None
+        return next_deadline
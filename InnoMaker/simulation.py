@@ -0,0 +1,389 @@
+"""
+This module contains a pure python simulation of the InnoMaker device and the SimulatedTransport
+that opens it instead of the dll. It needs neither Windows nor hardware, so the driver can be run
+and measured on any platform, e.g. ``InnoMakerBus(channel=0, bitrate=500000, transport='simulated')``.
+"""
+# imports
+import random
+import struct
+import threading
+import time
+from collections import deque
+from .transport import Transport, MODES, BITRATES
+
+# layout of the 20 byte frame of the InnoMaker device (little endian):
+# echo_id (4), can_id with flags (4), dlc (1), channel (1), flags (1), reserved (1), data (8)
+FRAME = struct.Struct('<IIBBBB8s')
+FRAME_SIZE = 20
+DEVICE_TIMESTAMP = struct.Struct('<I')  # microsecond counter behind the frame, if hardware timestamps are enabled
+RX_ECHO_ID = 0xFFFFFFFF  # echo_id of a received frame, sent frames that are echoed carry their own echo_id
+CAN_EFF_ID_FLAG = 0x80000000
+CAN_ERR_ID_FLAG = 0x20000000
+CAN_ERR_CRTL = 0x004
+CAN_ERR_PROT = 0x008
+CAN_ERR_BUSERROR = 0x080
+CAN_ERR_CRTL_RX_OVERFLOW = 0x01
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def encode_frame(can_id, data=b'', dlc=None, echo_id=RX_ECHO_ID):
+    """Encodes a frame in the format of the InnoMaker device.
+        :param can_id: The identifier including the flags, e.g. CAN_EFF_ID_FLAG for an extended identifier.
+        :param data: The payload, up to 8 bytes.
+        :param dlc: The data length code, the length of data by default.
+        :return: The frame as 20 bytes.
+    """
+    data = bytes(data)
+    return FRAME.pack(echo_id, can_id, len(data) if dlc is None else dlc, 0, 0, 0, data)
+
+
+# a bus error (bit stuffing error) like it floods a bus with a missing termination
+BUS_ERROR_FRAME = encode_frame(CAN_ERR_ID_FLAG | CAN_ERR_PROT | CAN_ERR_BUSERROR, bytes([0, 0, 0x04, 0, 0, 0, 0, 0]))
+RX_OVERFLOW_FRAME = encode_frame(CAN_ERR_ID_FLAG | CAN_ERR_CRTL, bytes([0, CAN_ERR_CRTL_RX_OVERFLOW, 0, 0, 0, 0, 0, 0]))
+
+
+class SimulatedDevice:
+    """The SimulatedDevice behaves like an InnoMaker device on a bus.
+
+        Frames arrive with the given rate (frames per second), at scheduled times, by :meth:`inject`
+        or, in loopback, by sending. They wait in a FIFO of fifo_depth frames, every frame that arrives
+        at a full FIFO is dropped and counted in :attr:`overflows`. The frames are cycled out of frames,
+        error_rate is the probability that a frame of the rate is replaced by a bus error frame.
+        Every transfer takes transfer_latency seconds without holding the GIL like a call of the dll,
+        a read waits up to read_timeout seconds for the next frame like a bulk read.
+        The device counts its time in microseconds from the moment it was opened, the counter runs
+        clock_skew (e.g. 50e-6) faster than the host and is appended to the frames with hardware timestamps.
+        """
+
+    def __init__(self, deviceId="sim0", rate=0, fifo_depth=64, frames=None, loopback=False, error_rate=0.0,
+                 overflow_errors=False, transfer_latency=0.0, read_timeout=0.0, clock_skew=0.0, record=False,
+                 seed=0):
+        """
+            :param deviceId: The serial of the device.
+            :param rate: The frames per second that arrive, 0 for none.
+            :param fifo_depth: The number of frames the receive FIFO holds.
+            :param frames: The frames (20 bytes, see :func:`encode_frame`) the rate cycles through.
+            :param loopback: If True every sent frame is received again, like in the usbCanMode loopback.
+            :param error_rate: The probability that a frame of the rate is replaced by a bus error frame.
+            :param overflow_errors: If True an overflow of the FIFO is reported with an error frame.
+            :param transfer_latency: The duration of one USB transfer in seconds.
+            :param read_timeout: Seconds a read waits for the next frame.
+            :param clock_skew: The relative deviation of the microsecond counter from the host clock.
+            :param record: If True every sent frame is recorded in :attr:`sent`.
+            :param seed: The seed of the error injection.
+        """
+        self.deviceId = deviceId
+        self.InnoMakerDev = None
+        self.usbReg = None
+        self.fifo_depth = fifo_depth
+        self.frames = list(frames) if frames else [encode_frame(0x320, bytes(range(1, 9)))]
+        self.loopback = loopback
+        self.error_rate = error_rate
+        self.overflow_errors = overflow_errors
+        self.transfer_latency = transfer_latency
+        self.read_timeout = read_timeout
+        self.clock_skew = clock_skew
+        self.record = record
+        self.mode = None
+        self.bitrate = None
+        self.opened = False
+        self.fifo = deque()  # (arrival in perf_counter_ns, frame)
+        self.overflows = 0
+        self.rx_frames = 0  # frames delivered to the host
+        self.tx_frames = 0
+        self.tx_transfers = 0
+        self.sent = []  # (perf_counter_ns, can_id, dlc, data) of the sent frames if record is True
+        self._random = random.Random(seed)
+        self._condition = threading.Condition()
+        self._scheduled = deque()  # (arrival in perf_counter_ns, frame), sorted
+        self._overflowed = False
+        self._epoch_ns = time.perf_counter_ns()
+        self._rate = 0
+        self._rate_start_ns = self._epoch_ns
+        self._generated = 0
+        self.rate = rate
+
+    @property
+    def rate(self):
+        """The frames per second that arrive, a new rate starts counting from now."""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self._condition:
+            self._rate = rate
+            self._rate_start_ns = time.perf_counter_ns()
+            self._generated = 0
+
+    def setup(self, mode, bitrate):
+        self.mode = mode
+        self.bitrate = bitrate
+
+    def open(self):
+        with self._condition:
+            self.opened = True
+            self._epoch_ns = time.perf_counter_ns()
+
+    def close(self):
+        with self._condition:
+            self.opened = False
+            self._condition.notify_all()
+
+    def reset(self):
+        """Empties the FIFO and the schedule and clears all counters."""
+        with self._condition:
+            self.fifo.clear()
+            self._scheduled.clear()
+            self._overflowed = False
+            self.overflows = self.rx_frames = self.tx_frames = self.tx_transfers = 0
+            self.sent = []
+            self._rate_start_ns = time.perf_counter_ns()
+            self._generated = 0
+
+    def schedule(self, arrivals, frame=None):
+        """Lets one frame arrive at each of the given time.perf_counter() values.
+            :param frame: The frame, the first of frames by default.
+        """
+        frame = self.frames[0] if frame is None else frame
+        with self._condition:
+            self._scheduled.extend((int(arrival * 1e9), frame) for arrival in arrivals)
+            self._scheduled = deque(sorted(self._scheduled, key=lambda item: item[0]))
+            self._condition.notify_all()
+
+    def inject(self, can_id, data=b'', dlc=None):
+        """Lets a frame arrive now.
+            :param can_id: The identifier including the flags, see :func:`encode_frame`.
+        """
+        frame = encode_frame(can_id, data, dlc)
+        with self._condition:
+            self._arrive(time.perf_counter_ns(), frame)
+            self._condition.notify_all()
+
+    def inject_error(self, error_class=CAN_ERR_PROT | CAN_ERR_BUSERROR, data=bytes(8)):
+        """Lets an error frame of the given error class (see :mod:`errors`) arrive now."""
+        self.inject(CAN_ERR_ID_FLAG | error_class, data, 8)
+
+    def ticks(self, host_ns):
+        """The value of the microsecond counter of the device at the given time.perf_counter_ns()."""
+        return int((host_ns - self._epoch_ns) * (1 + self.clock_skew)) // 1000 & 0xFFFFFFFF
+
+    def _arrive(self, arrival_ns, frame):
+        fifo = self.fifo
+        if len(fifo) >= self.fifo_depth:
+            self.overflows += 1
+            self._overflowed = True
+            return
+        if self._overflowed and self.overflow_errors:
+            self._overflowed = False
+            fifo.append((arrival_ns, RX_OVERFLOW_FRAME))
+            if len(fifo) >= self.fifo_depth:
+                self.overflows += 1
+                return
+        fifo.append((arrival_ns, frame))
+
+    def _advance(self, now_ns):
+        """Moves the frames that arrived until now_ns into the FIFO."""
+        scheduled = self._scheduled
+        while scheduled and scheduled[0][0] <= now_ns:
+            self._arrive(*scheduled.popleft())
+        rate = self._rate
+        if not rate:
+            return
+        due = (now_ns - self._rate_start_ns) * rate // 1000000000
+        count = due - self._generated
+        if count <= 0:
+            return
+        free = max(self.fifo_depth - len(self.fifo), 0)
+        if count > free:
+            # only the first frames fit into the FIFO, the others are dropped without being built
+            self.overflows += count - free
+            self._overflowed = True
+            count = free
+        frames = self.frames
+        error_rate = self.error_rate
+        random_value = self._random.random
+        period = 1e9 / rate
+        for k in range(self._generated, self._generated + count):
+            frame = frames[k % len(frames)]
+            if error_rate and random_value() < error_rate:
+                frame = BUS_ERROR_FRAME
+            self._arrive(self._rate_start_ns + int(k * period), frame)
+        self._generated = due
+
+    def _next_arrival(self):
+        """The time.perf_counter_ns() of the next frame of the rate or the schedule, None if none is expected."""
+        arrivals = []
+        if self._scheduled:
+            arrivals.append(self._scheduled[0][0])
+        if self._rate:
+            arrivals.append(self._rate_start_ns + int((self._generated + 1) * 1e9 / self._rate))
+        return min(arrivals) if arrivals else None
+
+    def read(self, buffer, length, frame_size=FRAME_SIZE):
+        """Copies the frames of the FIFO into the buffer like getInnoMakerDeviceBuf.
+            :param buffer: A writable buffer of at least length bytes.
+            :param frame_size: 24 if the microsecond counter is appended to every frame.
+            :return: The number of frames copied into the buffer.
+        """
+        if self.transfer_latency:
+            time.sleep(self.transfer_latency)
+        with self._condition:
+            now = time.perf_counter_ns()
+            self._advance(now)
+            if not self.fifo and self.read_timeout and self.opened:
+                deadline = now + int(self.read_timeout * 1e9)
+                while not self.fifo and self.opened and now < deadline:
+                    arrival = self._next_arrival()
+                    wake = deadline if arrival is None else min(arrival, deadline)
+                    self._condition.wait((wake - now) / 1e9)
+                    now = time.perf_counter_ns()
+                    self._advance(now)
+            fifo = self.fifo
+            count = min(len(fifo), length // frame_size)
+            offset = 0
+            for _ in range(count):
+                arrival, frame = fifo.popleft()
+                buffer[offset:offset + FRAME_SIZE] = frame
+                if frame_size > FRAME_SIZE:
+                    DEVICE_TIMESTAMP.pack_into(buffer, offset + FRAME_SIZE, self.ticks(arrival))
+                offset += frame_size
+            self.rx_frames += count
+            return count
+
+    def write(self, buffer, length):
+        """Takes the frames of the buffer like sendInnoMakerDeviceBuf.
+            :return: True, the device accepts every frame.
+        """
+        if self.transfer_latency:
+            time.sleep(self.transfer_latency)
+        now = time.perf_counter_ns()
+        with self._condition:
+            self.tx_transfers += 1
+            loopback = self.loopback or self.mode == "loopback"
+            for offset in range(0, length - FRAME_SIZE + 1, FRAME_SIZE):
+                self.tx_frames += 1
+                if self.record or loopback:
+                    echo_id, can_id, dlc, channel, flags, reserved, data = FRAME.unpack_from(buffer, offset)
+                    if self.record:
+                        self.sent.append((now, can_id, dlc, data[:dlc]))
+                    if loopback:
+                        self._arrive(now, FRAME.pack(RX_ECHO_ID, can_id, dlc, channel, flags, reserved, data))
+            if loopback:
+                self._condition.notify_all()
+        return True
+
+
+class SimulatedReceiveEngine:
+    """Reads the frames of a SimulatedDevice with the interface of :class:`InnoMaker.ReceiveEngine`."""
+
+    def __init__(self, device, frame_size=FRAME_SIZE):
+        self.device = device
+        self.frame_size = frame_size
+        self.host_buffer = bytearray(frame_size)
+        self.host_view = memoryview(self.host_buffer)
+        self.batch_frames = 0
+        self.batch_host_buffer = None
+        self.batch_host_view = None
+
+    def read(self):
+        """Reads one frame, see :meth:`InnoMaker.ReceiveEngine.read`."""
+        if self.device.read(self.host_buffer, self.frame_size, self.frame_size):
+            readdata = self.host_view
+            if readdata[1] == 0 and readdata[2] == 0 and readdata[3] == 0:  # echo of a sent frame
+                return 0
+            return readdata
+        return 0
+
+    def read_batch(self, max_frames):
+        """Reads up to max_frames frames, see :meth:`InnoMaker.ReceiveEngine.read_batch`."""
+        if max_frames != self.batch_frames:
+            self.batch_frames = max_frames
+            self.batch_host_buffer = bytearray(self.frame_size * max_frames)
+            self.batch_host_view = memoryview(self.batch_host_buffer)
+        readdata = self.batch_host_view
+        count = self.device.read(readdata, self.frame_size * max_frames, self.frame_size)
+        return readdata, [offset for offset in range(0, count * self.frame_size, self.frame_size)
+                          if readdata[offset + 1] or readdata[offset + 2] or readdata[offset + 3]]
+
+
+class SimulatedSendEngine:
+    """Transmits frames to a SimulatedDevice with the interface of :class:`InnoMaker.SendEngine`."""
+
+    def __init__(self, device):
+        self.device = device
+        self.host_buffer = bytearray(FRAME_SIZE)
+        self.bulk_host_buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def send(self, frameID, dlc, data):
+        with self._lock:
+            FRAME.pack_into(self.host_buffer, 0, 0, frameID, dlc, 0, 0, 0, bytes(data[:dlc]))
+            return self.device.write(self.host_buffer, FRAME_SIZE)
+
+    def send_frames(self, frames):
+        return [self.send(frameID, dlc, data) for frameID, dlc, data in frames]
+
+    def send_bulk(self, frames):
+        if not frames:
+            return True
+        size = FRAME_SIZE * len(frames)
+        with self._lock:
+            if size > len(self.bulk_host_buffer):
+                self.bulk_host_buffer = bytearray(size)
+            offset = 0
+            for frameID, dlc, data in frames:
+                FRAME.pack_into(self.bulk_host_buffer, offset, 0, frameID, dlc, 0, 0, 0, bytes(data[:dlc]))
+                offset += FRAME_SIZE
+            return self.device.write(self.bulk_host_buffer, size)
+
+
+class SimulatedTransport(Transport):
+    """The SimulatedTransport opens SimulatedDevices instead of the devices of the dll."""
+
+    def __init__(self, devices=None, scan_time=0.0):
+        """
+            :param devices: The SimulatedDevices that are connected, one device by default.
+            :param scan_time: The duration of the USB enumeration in seconds.
+        """
+        self.devices = list(devices) if devices is not None else [SimulatedDevice()]
+        self.scan_time = scan_time
+
+    def scan(self):
+        if self.scan_time:
+            time.sleep(self.scan_time)
+        return list(self.devices)
+
+    def handle(self, device):
+        return device  # the bus works directly on the simulated device
+
+    def setup(self, device, mode, bitrate):
+        if mode not in MODES:
+            raise ValueError("usbCanMode {} invalid".format(mode))
+        if bitrate not in BITRATES:
+            raise ValueError("bitrate {} invalid".format(bitrate))
+        device.setup(mode, bitrate)
+
+    def open(self, device):
+        device.open()
+
+    def close(self, device):
+        device.close()
+
+    def receive_engine(self, device, frame_size):
+        return SimulatedReceiveEngine(device, frame_size)
+
+    def send_engine(self, device):
+        return SimulatedSendEngine(device)
+
+
+def shared_transport():
+    """Returns the SimulatedTransport that is opened with ``transport='simulated'``.
+        It has one SimulatedDevice in loopback, so every sent message is received again.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SimulatedTransport([SimulatedDevice(loopback=True)])
+        return _shared
@@ -0,0 +1,192 @@
+"""
+This module contains the BusStatistics that count the traffic and the errors of an InnoMakerBus.
+"""
+# imports
+import json
+import struct
+import threading
+import time
+from .errors import CAN_ERR_CLASS_MASK, CAN_ERR_CRTL, ERROR_CLASSES
+
+# can_id with flags and dlc of the 20 byte frame, starting at byte 4
+FRAME_ID_DLC = struct.Struct('<IB')
+CAN_EFF_ID_FLAG = 0x80000000
+CAN_RTR_ID_FLAG = 0x40000000
+CAN_ERR_ID_FLAG = 0x20000000
+
+# nominal length of a frame in bits including the 3 bit interframe space, without stuff bits:
+# standard frame 47 + 8 * dlc, extended frame 67 + 8 * dlc, remote frames carry no data
+FRAME_BITS = (tuple(47 + 8 * min(dlc, 8) for dlc in range(16)), tuple(67 + 8 * min(dlc, 8) for dlc in range(16)))
+REMOTE_FRAME_BITS = (47, 67)
+
+# the indices of the error classes that are set, for every value of the error class bits
+ERROR_CLASS_BITS = tuple(tuple(index for index, (mask, name) in enumerate(ERROR_CLASSES) if value & mask)
+                         for value in range(CAN_ERR_CLASS_MASK + 1))
+
+# upper bounds of the buckets of the frame rate histogram in frames per second
+RATE_BUCKETS = (1, 10, 100, 1000)
+
+
+class BusStatistics:
+    """The BusStatistics count the frames of a bus with constant cost per frame.
+
+        Counted are received and sent frames and bytes, received frames per identifier, error frames per error class
+        and reported RX overflows of the controller. The bus load is estimated from the nominal bit length
+        of every frame and the bitrate. The rates and the bus load of a snapshot refer to the interval since
+        the previous snapshot of the same consumer, so e.g. the export thread and the application
+        do not shorten each other's intervals.
+        """
+
+    def __init__(self, bitrate=None):
+        """
+            :param bitrate: The bitrate of the bus, needed for the bus load estimate.
+        """
+        self.bitrate = bitrate
+        self._tx_lock = threading.Lock()  # several threads may send, only one thread receives
+        self._baseline_lock = threading.Lock()  # several consumers may take snapshots at once
+        self._export_stop = threading.Event()
+        self._export_thread = None
+        self.reset()
+
+    def reset(self):
+        """Sets all counters back to 0."""
+        self.start = time.perf_counter()
+        self.rx_frames = 0
+        self.rx_bytes = 0
+        self.tx_frames = 0
+        self.tx_bytes = 0
+        self.tx_failed = 0
+        self.rx_bits = 0  # rx and tx are counted separately, because they are written by different threads
+        self.tx_bits = 0
+        self.per_id = {}
+        self.error_frames = 0
+        self.error_classes = [0] * len(ERROR_CLASSES)
+        self.controller_overflows = 0
+        self._baselines = {}  # consumer -> (time, bits, per_id) of its previous snapshot
+
+    def rx_frame(self, recvdata, offset=0):
+        """Counts a raw frame of the InnoMaker device, error frames are counted per error class.
+
+            :param recvdata: The buffer that contains the frame.
+            :param offset: The position of the 20 byte frame inside the buffer.
+        """
+        frameID, dlc = FRAME_ID_DLC.unpack_from(recvdata, offset + 4)
+        if frameID & CAN_ERR_ID_FLAG:
+            self.error(frameID, recvdata[offset + 12:offset + 20])
+            return
+        self.rx_frames += 1
+        self.rx_bytes += dlc
+        extended = 1 if frameID & CAN_EFF_ID_FLAG else 0
+        self.rx_bits += REMOTE_FRAME_BITS[extended] if frameID & CAN_RTR_ID_FLAG else FRAME_BITS[extended][dlc & 0xF]
+        per_id = self.per_id
+        per_id[frameID] = per_id.get(frameID, 0) + 1
+
+    def tx(self, frameID, dlc, success=True):
+        """Counts a sent frame.
+
+            :param frameID: The identifier including the flags.
+            :param dlc: The data length code.
+            :param success: False if the dll did not accept the frame.
+        """
+        with self._tx_lock:
+            if not success:
+                self.tx_failed += 1
+                return
+            self.tx_frames += 1
+            self.tx_bytes += dlc
+            extended = 1 if frameID & CAN_EFF_ID_FLAG else 0
+            if frameID & CAN_RTR_ID_FLAG:
+                self.tx_bits += REMOTE_FRAME_BITS[extended]
+            else:
+                self.tx_bits += FRAME_BITS[extended][dlc & 0xF]
+
+    def error(self, frameID, data):
+        """Counts an error frame.
+
+            :param frameID: The identifier of the error frame.
+            :param data: The data of the error frame.
+        """
+        self.error_frames += 1
+        error_classes = self.error_classes
+        for index in ERROR_CLASS_BITS[frameID & CAN_ERR_CLASS_MASK]:
+            error_classes[index] += 1
+        if frameID & CAN_ERR_CRTL and data[1] & 0x01:
+            self.controller_overflows += 1
+
+    def snapshot(self, dropped=0, consumer=None):
+        """Returns the current values as dictionary.
+
+            :param dropped: The number of frames the driver had to drop, e.g. because the ring buffer was full.
+            :param consumer: The name of the caller, the rates refer to the previous snapshot of the same consumer
+                (for the first snapshot to the reset of the counters).
+        """
+        now = time.perf_counter()
+        bits = self.rx_bits + self.tx_bits
+        per_id = dict(self.per_id)
+        with self._baseline_lock:
+            last_time, last_bits, last_per_id = self._baselines.get(consumer, (self.start, 0, {}))
+            self._baselines[consumer] = (now, bits, per_id)
+        interval = now - last_time
+        rates = {frameID: (count - last_per_id.get(frameID, 0)) / interval if interval > 0 else 0.0
+                 for frameID, count in per_id.items()}
+        histogram = [0] * (len(RATE_BUCKETS) + 1)
+        for rate in rates.values():
+            bucket = 0
+            while bucket < len(RATE_BUCKETS) and rate >= RATE_BUCKETS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+        snapshot = {
+            "time": time.time(),
+            "uptime": now - self.start,
+            "rx_frames": self.rx_frames,
+            "rx_bytes": self.rx_bytes,
+            "tx_frames": self.tx_frames,
+            "tx_bytes": self.tx_bytes,
+            "tx_failed": self.tx_failed,
+            "error_frames": self.error_frames,
+            "error_classes": {name: count for (mask, name), count in zip(ERROR_CLASSES, self.error_classes) if count},
+            "dropped": dropped,
+            "controller_overflows": self.controller_overflows,
+            "bus_load": ((bits - last_bits) / (interval * self.bitrate)
+                         if self.bitrate and interval > 0 else None),
+            # keyed by the identifier including the flags, so a standard, an extended and a remote frame
+            # with the same number are counted apart
+            "per_id": {
+                frameID: {
+                    "id": frameID & 0x1FFFFFFF,
+                    "extended": bool(frameID & CAN_EFF_ID_FLAG),
+                    "remote": bool(frameID & CAN_RTR_ID_FLAG),
+                    "count": count,
+                    "rate": rates[frameID],
+                } for frameID, count in per_id.items()
+            },
+            # number of identifiers per frame rate bucket: < 1, < 10, < 100, < 1000 and >= 1000 frames per second
+            "rate_histogram": histogram,
+        }
+        return snapshot
+
+    def start_export(self, path, interval, snapshot):
+        """Appends a snapshot as JSON line to a file every interval seconds.
+
+            :param path: The file the snapshots are appended to.
+            :param interval: Seconds between two snapshots.
+            :param snapshot: The function that returns the snapshot, e.g. :meth:`InnoMakerBus.get_statistics`.
+                It is called with consumer='export', so the export has its own interval.
+        """
+        self.stop_export()
+        self._export_stop.clear()
+
+        def export():
+            while not self._export_stop.wait(interval):
+                with open(path, 'a') as file:
+                    file.write(json.dumps(snapshot(consumer='export')) + '\n')
+
+        self._export_thread = threading.Thread(target=export, name="InnoMakerStatistics", daemon=True)
+        self._export_thread.start()
+
+    def stop_export(self):
+        """Stops the periodic export."""
+        if self._export_thread is not None:
+            self._export_stop.set()
+            self._export_thread.join()
+            self._export_thread = None
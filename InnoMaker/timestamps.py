@@ -0,0 +1,134 @@
+"""
+This module contains the clocks that timestamp the frames of the InnoMaker device:
+the HostClock converts time.perf_counter_ns() values into python-can timestamps and the DeviceClock
+correlates the timestamp counter of the device with the host clock.
+"""
+# imports
+import time
+
+
+class HostClock:
+    """The HostClock converts time.perf_counter_ns() values into seconds since the epoch like time.time().
+
+        time.perf_counter_ns() has the highest resolution and is monotonic, but it has no defined start.
+        The offset to the system time is measured once, so the timestamps stay monotonic even if the
+        system time is adjusted. The offset can be measured again with :meth:`synchronize`.
+        """
+
+    def __init__(self):
+        self.offset_ns = 0
+        self.synchronize()
+
+    def synchronize(self, samples=5):
+        """Measures the offset between time.perf_counter_ns() and time.time_ns().
+            The sample with the shortest interval between both readings is taken.
+
+            :param samples: The number of measurements.
+        """
+        best = None
+        for _ in range(samples):
+            before = time.perf_counter_ns()
+            system = time.time_ns()
+            after = time.perf_counter_ns()
+            if best is None or after - before < best[0]:
+                best = (after - before, system - (before + after) // 2)
+        self.offset_ns = best[1]
+
+    def to_time(self, perf_ns):
+        """Converts a time.perf_counter_ns() value into seconds since the epoch."""
+        return (perf_ns + self.offset_ns) / 1e9
+
+    def to_time_ns(self, perf_ns):
+        """Converts a time.perf_counter_ns() value into nanoseconds since the epoch."""
+        return perf_ns + self.offset_ns
+
+    def now(self):
+        """Returns the current time in seconds since the epoch."""
+        return (time.perf_counter_ns() + self.offset_ns) / 1e9
+
+
+class DeviceClock:
+    """The DeviceClock converts the timestamp counter of the device into host time.
+
+        The counter wraps around after 2 ** bits ticks, the wraps are counted. Every frame is received some time
+        after the device stamped it, so host time - device time is the clock offset plus a positive delay.
+        The smallest difference within a window is the best estimate of the offset; the drift between both clocks
+        is the slope of these minima from window to window and is smoothed over the windows.
+        A frame is never dated later than the moment it was read by the host.
+        """
+
+    def __init__(self, tick_ns=1000, bits=32, window_ns=1000000000, smoothing=0.25):
+        """
+            :param tick_ns: The duration of one tick of the device counter in ns (1000 for a microsecond counter).
+            :param bits: The width of the device counter.
+            :param window_ns: The length of a window in ns of device time.
+            :param smoothing: The weight of a new drift estimate, between 0 and 1.
+        """
+        self.tick_ns = tick_ns
+        self.period = 1 << bits
+        self.window_ns = window_ns
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        """Forgets the correlation, e.g. after the device was restarted."""
+        self.wraps = 0
+        self.last_ticks = None
+        self.drift = 0.0  # host ns per device ns - 1
+        self.drift_estimates = 0
+        self.anchor_device = None  # device time in ns of the point the offset refers to
+        self.anchor_offset = 0  # host time - device time in ns at the anchor
+        self.window_start = None
+        self.window_min = None  # (offset, device time) with the smallest offset in the current window
+        self.last_min = None  # the same for the previous window
+
+    def unwrap(self, ticks):
+        """Extends the wrapping counter value of the device to a steadily increasing value in ns."""
+        if self.last_ticks is not None and ticks < self.last_ticks and self.last_ticks - ticks > self.period // 2:
+            self.wraps += 1
+        self.last_ticks = ticks
+        return (self.wraps * self.period + ticks) * self.tick_ns
+
+    def to_host(self, ticks, host_ns):
+        """Converts the timestamp of a frame into host time.
+
+            :param ticks: The timestamp counter value of the device.
+            :param host_ns: The time.perf_counter_ns() value at which the frame was read.
+            :return: The time the device stamped the frame as time.perf_counter_ns() value.
+        """
+        device = self.unwrap(ticks)
+        offset = host_ns - device
+        if self.anchor_device is None:
+            self.anchor_device = device
+            self.anchor_offset = offset
+            self.window_start = device
+            self.window_min = (offset, device)
+            return host_ns
+
+        if device - self.window_start >= self.window_ns:
+            self._close_window(device)
+        if offset < self.window_min[0]:
+            self.window_min = (offset, device)
+
+        estimate = self.anchor_offset + self.drift * (device - self.anchor_device)
+        if offset < estimate:
+            # the frame was received faster than the estimate allows, the offset is moved down to it
+            self.anchor_device = device
+            self.anchor_offset = offset
+            estimate = offset
+        return device + int(estimate)
+
+    def _close_window(self, device):
+        """Takes the minimum of the finished window as new anchor and updates the drift."""
+        window_min = self.window_min
+        if self.last_min is not None and window_min[1] != self.last_min[1]:
+            drift = (window_min[0] - self.last_min[0]) / (window_min[1] - self.last_min[1])
+            if self.drift_estimates:
+                self.drift += self.smoothing * (drift - self.drift)
+            else:
+                self.drift = drift
+            self.drift_estimates += 1
+        self.last_min = window_min
+        self.anchor_offset, self.anchor_device = window_min
+        self.window_start = device
+        self.window_min = (float('inf'), device)
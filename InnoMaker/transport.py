@@ -0,0 +1,58 @@
+"""
+This module contains the Transport interface between the InnoMakerBus and the USB calls of a device.
+The InnoMakerUsb2CanLib.dll is used through :class:`InnoMaker.DllTransport`,
+a device simulated in python through :class:`simulation.SimulatedTransport`.
+"""
+
+# the usbCanModes and bitrates every transport has to support
+MODES = ("normal", "loopback", "ListenOnly")
+BITRATES = (20000, 33330, 40000, 50000, 66660, 80000, 83330, 100000, 125000, 200000, 250000, 400000, 500000,
+            666000, 800000, 1000000)
+
+
+class Transport:
+    """The Transport is the interface of the USB calls the InnoMakerBus and the DeviceManager need.
+
+        A transport enumerates the devices, sets them up, opens and closes them and creates the engines
+        that move the 20 byte frames between the device and the bus. The engines have the interface of
+        :class:`InnoMaker.ReceiveEngine` (read, read_batch) and :class:`InnoMaker.SendEngine`
+        (send, send_frames, send_bulk).
+        """
+
+    def scan(self):
+        """Enumerates the connected devices.
+            :return: The list of the devices, every device has a deviceId.
+        """
+        raise NotImplementedError
+
+    def handle(self, device):
+        """Creates the handle a bus uses for an enumerated device.
+            :param device: A device returned by :meth:`scan`.
+        """
+        raise NotImplementedError
+
+    def setup(self, device, mode, bitrate):
+        """Configures the usbCanMode and the bitrate of a device before it is opened.
+            :param mode: One of :data:`MODES`.
+            :param bitrate: One of :data:`BITRATES`.
+            :raises ValueError: If the mode or the bitrate is not supported.
+        """
+        raise NotImplementedError
+
+    def open(self, device):
+        """Opens the device, the frames are exchanged from now on."""
+        raise NotImplementedError
+
+    def close(self, device):
+        """Resets and closes the device. This does NOT reset the internal memory of the device."""
+        raise NotImplementedError
+
+    def receive_engine(self, device, frame_size):
+        """Creates the engine that reads the frames of the opened device.
+            :param frame_size: The size of one frame, 24 bytes if the device appends a timestamp.
+        """
+        raise NotImplementedError
+
+    def send_engine(self, device):
+        """Creates the engine that transmits frames to the opened device."""
+        raise NotImplementedError
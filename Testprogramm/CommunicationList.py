@@ -1,4 +1,34 @@
-from datetime import datetime
+import heapq
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+
+class Entry:
+    """
+    Ein Eintrag der CommunicationList: [TxId, dlc, data, save, timestamp, count]
+    active ist False, sobald der Eintrag per ACK (pop) entfernt wurde.
+    count zählt die Wiederholungen (resend), delivery ist die Delivery des ReliableSender oder None.
+    """
+    __slots__ = ('TxId', 'dlc', 'data', 'save', 'timestamp', 'count', 'sent', 'active', 'delivery')
+
+    def __init__(self, TxId, dlc, data, save, timestamp, count=0):
+        self.TxId = TxId
+        self.dlc = dlc
+        self.data = data
+        self.save = save
+        self.timestamp = timestamp
+        self.count = count
+        self.sent = False
+        self.active = True
+        self.delivery = None
+
+    def __iter__(self):
+        return iter((self.TxId, self.dlc, self.data, self.save, self.timestamp, self.count))
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class CommunicationList:
@@ -9,72 +39,202 @@ class CommunicationList:
 
     Soll eine Nachricht verschickt werden -> put(msg, save)
         Daraufhin wird ein Zeitstempel der Nachricht hinzugefügt
-        Anschließend wird die Nachricht als Array mit Zeitstempel in der Liste gespeichert -> [TxId, data, save, timestamp, count]
+        Anschließend wird die Nachricht als Eintrag mit Zeitstempel gespeichert -> [TxId, dlc, data, save, timestamp, count]
 
     Soll die Nachricht (save=True) aus dem Speicher gelöscht werden, z.b. bei ACK -> pop(RxId)
-        Daraufhin wird die Nachricht mit dem passendem RxId-Wert aus der Liste gelöscht
+        Daraufhin wird die älteste Nachricht mit dem passendem RxId-Wert gelöscht
 
     Soll die Nachricht ausgegeben werden, z.b. fürs versenden -> get()
-        Gibt die letzte Nachricht aus bei (save=True)
-        Wenn jedoch (save=False), dann wird die Nachricht zurückgeben und gelöscht.
+        Gibt die älteste Nachricht aus und entfernt sie aus der Warteschlange.
+        Sichere Nachrichten (save=True) bleiben bis zum ACK gespeichert (siehe unacknowledged und ack_timeout).
+
+    Sichere Nachrichten ohne ACK nach einer Wartezeit -> expired(timeout)
+        Sie können erneut in die Warteschlange gelegt (resend) oder aufgegeben werden (remove).
+        Darauf baut der ReliableSender (reliable.py) auf, die Liste ist die einzige Stelle, an der ACKs zugeordnet
+        und die Wartezeiten verfolgt werden.
+
+    Aufwand: put und get O(1) (deque), pop O(1) (Index nach Id), ack_timeout O(log n) (Heap nach Zeitstempel),
+    expired O(log n) je abgelaufener Nachricht.
+    Entfernte Einträge werden in der deque und im Heap nur markiert und beim nächsten Zugriff übersprungen.
+    Alle Funktionen sind threadsicher, get(block=True) wartet ohne Polling auf die nächste Nachricht.
     """
     def __init__(self):
-        self.queue = list()
-
-    def get(self):
-        if len(self.queue) > 0:
-            arr = self.queue[0]
-            msg = arr[2]
-            dlc = arr[1]
-            id = bin(arr[0])
-            self.queue.remove(arr)
-            return id, dlc, msg
+        self.queue = deque()  # Einträge, die noch verschickt werden müssen
+        self.index = {}  # Id -> deque der sicheren Einträge ohne ACK, älteste zuerst
+        self.deadlines = []  # Heap (timestamp, Nummer, Eintrag) der sicheren Einträge ohne ACK
+        self._sequence = itertools.count()
+        self._pending = 0  # Anzahl der Einträge in queue, die noch aktiv sind
+        self._unacknowledged = 0
+        self._condition = threading.Condition()  # put weckt die Threads, die in get(block=True) warten
+        self._closed = False
+
+    def get(self, block=False, timeout=None):
+        """
+        Gibt die älteste Nachricht als (Id, dlc, data) zurück oder (None, None, None), wenn keine vorhanden ist.
+        Die Id wird als int zurückgegeben, ohne Umweg über bin() und Strings.
+        :param block: wenn True, wird gewartet, bis eine Nachricht eingefügt oder die Liste geschlossen wird
+        :param timeout: maximale Wartezeit in Sekunden bei block=True, None wartet unbegrenzt
+        """
+        with self._condition:
+            if block and self._pending == 0 and not self._closed:
+                self._condition.wait_for(lambda: self._pending or self._closed, timeout)
+            queue = self.queue
+            while queue:
+                entry = queue.popleft()
+                if entry.active:
+                    self._pending -= 1
+                    entry.sent = True
+                    if not entry.save:
+                        entry.active = False
+                    return entry.TxId, entry.dlc, entry.data
         return None, None, None
 
     def put(self, TxId, dlc, data, save, timestamp, count=0):
-        if save is True:  # data
-            pass
-        else:  # ack
-            timestamp = None
-        self.queue.append([TxId, dlc, data, save, timestamp, count])
-        return True
+        """
+        Fügt eine Nachricht ein.
+        :return: der Eintrag (Entry), er ist wie bisher True in einer Bedingung
+        """
+        entry = Entry(TxId, dlc, data, save, timestamp, count)
+        with self._condition:
+            self.queue.append(entry)
+            self._pending += 1
+            if save is True:
+                self.index.setdefault(TxId, deque()).append(entry)
+                self._unacknowledged += 1
+                if isinstance(timestamp, datetime):
+                    heapq.heappush(self.deadlines, (timestamp, next(self._sequence), entry))
+            self._condition.notify()
+        return entry
 
     def pop(self, RxId):
-        for element in self.queue:
-            if element[3] is True and element[0] == RxId:
-                self.queue.remove(element)
-                return True
-        return False
+        """
+        Entfernt die älteste sichere Nachricht mit der Id, z.b. bei ACK.
+        :return: der entfernte Eintrag oder False, wenn keine sichere Nachricht mit der Id wartet
+        """
+        with self._condition:
+            entries = self.index.get(RxId)
+            if not entries:
+                return False
+            entry = entries.popleft()
+            if not entries:
+                del self.index[RxId]
+            entry.active = False
+            self._unacknowledged -= 1
+            if not entry.sent:
+                self._pending -= 1
+            if len(self.deadlines) > 64 and len(self.deadlines) > 2 * self._unacknowledged:
+                # zu viele bestätigte Einträge im Heap, er wird neu aufgebaut (amortisiert O(1))
+                self.deadlines = [item for item in self.deadlines if item[2].active]
+                heapq.heapify(self.deadlines)
+            return entry
+
+    def expired(self, timeout):
+        """
+        Gibt die sicheren Nachrichten zurück, deren Zeitstempel mehr als timeout Sekunden zurückliegt, älteste zuerst.
+        Sie werden aus dem Heap genommen, bleiben aber bis pop, resend oder remove unbestätigt gespeichert.
+        :param timeout: Wartezeit auf das ACK in Sekunden
+        :return: Liste der Einträge
+        """
+        cutoff = datetime.now() - timedelta(seconds=timeout)
+        expired = []
+        with self._condition:
+            deadlines = self.deadlines
+            while deadlines and deadlines[0][0] <= cutoff:
+                timestamp, sequence, entry = heapq.heappop(deadlines)
+                if entry.active and entry.timestamp == timestamp:  # nicht bestätigt und nicht erneut gesendet
+                    expired.append(entry)
+        return expired
+
+    def resend(self, entry, timestamp):
+        """
+        Legt eine sichere Nachricht ohne ACK erneut in die Warteschlange, count wird erhöht.
+        :param timestamp: Zeitstempel des neuen Sendeversuchs
+        :return: False, wenn die Nachricht inzwischen bestätigt oder entfernt wurde
+        """
+        with self._condition:
+            if not entry.active:
+                return False
+            entry.count += 1
+            entry.timestamp = timestamp
+            heapq.heappush(self.deadlines, (timestamp, next(self._sequence), entry))
+            if entry.sent:  # sonst wartet die Nachricht noch in der Warteschlange
+                entry.sent = False
+                self.queue.append(entry)
+                self._pending += 1
+                self._condition.notify()
+            return True
+
+    def remove(self, entry):
+        """
+        Entfernt eine sichere Nachricht ohne ACK, z.b. wenn alle Wiederholungen abgelaufen sind.
+        :return: False, wenn die Nachricht bereits bestätigt oder entfernt wurde
+        """
+        with self._condition:
+            if not entry.active:
+                return False
+            entry.active = False
+            entries = self.index[entry.TxId]
+            entries.remove(entry)
+            if not entries:
+                del self.index[entry.TxId]
+            self._unacknowledged -= 1
+            if not entry.sent:
+                self._pending -= 1
+            return True
+
+    def unacknowledged_entries(self):
+        """Gibt die Einträge der sicheren Nachrichten ohne ACK zurück."""
+        with self._condition:
+            return [entry for entries in self.index.values() for entry in entries]
+
+    def close(self):
+        """Weckt alle Threads, die in get(block=True) warten; get blockiert danach nicht mehr."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
 
     def size(self):
-        return len(self.queue)
+        return self._pending
 
     def empty(self):
-        if self.size() is 0:
-            return True
-        else:
-            return False
+        return self._pending == 0
+
+    def unacknowledged(self):
+        """Anzahl der sicheren Nachrichten, für die noch kein ACK empfangen wurde."""
+        return self._unacknowledged
 
     def clear(self):
-        self.queue.clear()
+        with self._condition:
+            for entry in self.queue:
+                entry.active = False
+            for entries in self.index.values():
+                for entry in entries:
+                    entry.active = False
+            self.queue.clear()
+            self.index.clear()
+            self.deadlines.clear()
+            self._pending = 0
+            self._unacknowledged = 0
+
+    def oldest(self):
+        """Gibt den Zeitstempel der ältesten sicheren Nachricht ohne ACK zurück oder None."""
+        with self._condition:
+            deadlines = self.deadlines
+            while deadlines and (not deadlines[0][2].active or deadlines[0][0] != deadlines[0][2].timestamp):
+                heapq.heappop(deadlines)  # bestätigt oder durch resend ersetzt
+            return deadlines[0][0] if deadlines else None
 
     def ack_timeout(self):
-        timelist = list()
-        if self.empty():
+        """Gibt die Zeit in Sekunden zurück, die die älteste sichere Nachricht schon auf ihr ACK wartet."""
+        oldest = self.oldest()
+        if oldest is None:
             return 0
-        else:
-            try:
-                for elem in self.queue:
-                    if elem[2] is True:
-                        timestamp = elem[3]
-                        timelist.append(timestamp)
-
-                last = max(timelist)
-                now = datetime.now()
-                elapsed = now - last
-                return elapsed.total_seconds()
-            except:
-                return 0
+        elapsed = datetime.now() - oldest
+        return elapsed.total_seconds()
+
+    def __len__(self):
+        return self._pending
 
     def __str__(self):
-        return self.queue
\ No newline at end of file
+        with self._condition:
+            return str([entry for entry in self.queue if entry.active])
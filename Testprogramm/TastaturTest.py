@@ -25,7 +25,7 @@ def on_press(key):
 
 
 if __name__ == "__main__":
-    can = can_lib.canLib()
+    can = can_lib.canLib(console=True)
     lis = keyboard.Listener(on_press=on_press)
     lis.start()  # start to listen on a separate thread
     lis.join()  # no this if main thread is polling self.keys
\ No newline at end of file
@@ -0,0 +1,1393 @@
+"""
+Micro-benchmarks for the hot paths of the InnoMakerBus.
+
+The benchmarks of the receive and send engines of the dll run against stubs that imitate the
+InnoMakerUsb2CanLib.dll and pythonnet, all others run against the SimulatedDevice of the InnoMaker package,
+so no hardware and no .NET runtime is needed. The numbers therefore show the python overhead of the
+driver and not the latency of the USB transfer itself. The stubs are python code as well, so every crossing into
+.NET (a method call, an element of a .NET array read or written from python, an element pythonnet converts from
+a python list) spins --crossing-ns ns (500 by default) to imitate the cost of pythonnet; with 0 only the python
+code is measured. A result that claims a gain is reported with the result it improves on (report(before=...)),
+an 'after' that is worse than its 'before' by more than the tolerance fails the run as well.
+
+Every result is also collected with its unit and whether a higher or a lower value is better, so a run can be
+written as JSON and compared with a stored baseline. A result that is worse than the baseline by more than the
+tolerance is a regression, the script then exits with 1.
+
+Usage: python benchmark.py [--only NAME ...] [--json FILE] [--baseline FILE] [--save-baseline FILE] [--tolerance T]
+                           [--crossing-ns NS]
+    e.g. python benchmark.py --save-baseline baseline.json on the reference version and
+    python benchmark.py --baseline baseline.json --json results.json on the changed version.
+"""
+import argparse
+import asyncio
+import collections
+import ctypes
+import io
+import json
+import logging
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime
+
+# the InnoMaker package is located one folder above the Testprogramm
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+# a received frame in the format of the InnoMaker device: echo_id, can_id, dlc, channel, flags, reserved, data
+RX_FRAME = bytes([0xFF, 0xFF, 0xFF, 0xFF, 0x20, 0x03, 0x00, 0x00, 8, 0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# stubbed transport
+# ----------------------------------------------------------------------------------------------------------------------
+CROSSING_NS = 500  # the imitated cost of one crossing from python into .NET, see --crossing-ns
+
+
+def cross(count=1):
+    """Spins for count crossings into .NET."""
+    end = time.perf_counter_ns() + CROSSING_NS * count
+    while time.perf_counter_ns() < end:
+        pass
+
+
+class StubDevice:
+    """Replaces the InnoMakerDevice of the dll."""
+    def __init__(self, deviceId="stub"):
+        self.deviceId = deviceId
+        self.InnoMakerDev = None
+        self.usbReg = None
+
+
+class StubUsbCan:
+    """Replaces the UsbCan class of the dll. Every read returns RX_FRAME, every send succeeds.
+        The methods called from python cross into .NET, getInnoMakerDeviceBuf is called through StubMethod.
+    """
+    scan_time = 0.0  # duration of the USB enumeration
+
+    def __init__(self):
+        cross()
+
+    class UsbCanMode:
+        UsbCanModeNormal = 0
+        UsbCanModeLoopback = 1
+        UsbCanModeListenOnly = 2
+
+    class innomaker_device_bittming:
+        prop_seg = phase_seg1 = phase_seg2 = sjw = brp = 0
+
+    def scanInnoMakerDevices(self):
+        if self.scan_time:
+            time.sleep(self.scan_time)
+
+    def getInnoMakerDeviceCount(self):
+        return 1
+
+    def getInnoMakerDevice(self, index):
+        return StubDevice("stub{}".format(index))
+
+    def UrbSetupDevice(self, device, mode, bittiming):
+        pass
+
+    def openInnoMakerDevice(self, device):
+        pass
+
+    def closeInnoMakerDevice(self, device):
+        pass
+
+    def UrbResetDevice(self, device):
+        pass
+
+    def sendInnoMakerDeviceBuf(self, device, frame, length):
+        cross()
+        return True
+
+    def getInnoMakerDeviceBuf(self, device, buffer, length):
+        ctypes.memmove(buffer, RX_FRAME, 20)  # inside .NET, no crossing
+        return True
+
+
+class StubMethod:
+    """Replaces the reflected MethodInfo of getInnoMakerDeviceBuf."""
+    def Invoke(self, target, parameters):
+        cross()
+        return target.getInnoMakerDeviceBuf(*parameters)  # the elements are passed inside .NET
+
+
+class StubType:
+    """Replaces the System.Type of the UsbCan class."""
+    def GetMethod(self, name):
+        cross()
+        return StubMethod()
+
+
+def get_type(name):
+    """Replaces System.Type.GetType."""
+    cross()
+    return StubType()
+
+
+def _net_item(array, index, count):
+    return count if isinstance(index, int) else len(range(*index.indices(len(array))))
+
+
+class NetByteArray:
+    """Base of the imitated .NET byte arrays: ctypes arrays whose elements cross into .NET when they are
+        read or written from python."""
+    def __getitem__(self, index):
+        cross(_net_item(self, index, 1))
+        return ctypes.Array.__getitem__(self, index)
+
+    def __setitem__(self, index, value):
+        cross(_net_item(self, index, 1))
+        ctypes.Array.__setitem__(self, index, value)
+
+
+class NetObjectArray(list):
+    """Replaces an object[] of .NET, every element read from python crosses into .NET."""
+    def __getitem__(self, index):
+        cross()
+        return list.__getitem__(self, index)
+
+
+_net_byte_arrays = {}
+
+
+class StubArray:
+    """Replaces System.Array, CreateInstance allocates and Array[Object](...) converts like pythonnet."""
+    @staticmethod
+    def CreateInstance(elementtype, length):
+        cross()
+        array_type = _net_byte_arrays.get(length)
+        if array_type is None:
+            array_type = _net_byte_arrays[length] = type('NetByteArray', (NetByteArray, ctypes.c_ubyte * length), {})
+        return array_type()
+
+    @staticmethod
+    def Clear(array, index, length):
+        cross()
+        ctypes.memset(ctypes.addressof(array) + index, 0, length)
+
+    def __getitem__(self, elementtype):
+        def convert(items):
+            cross(1 + len(items))  # pythonnet converts every element
+            return NetObjectArray(items)
+        return convert
+
+
+def to_net_bytes(values):
+    """Converts a python list into a new .NET byte array like pythonnet does for a byte[] parameter."""
+    array = StubArray.CreateInstance(None, len(values))
+    cross(len(values))
+    ctypes.memmove(array, bytes(values), len(values))
+    return array
+
+
+def stub_copy(source, index, destination, length):
+    """Replaces Marshal.Copy(byte[], int, IntPtr, int) and Marshal.Copy(IntPtr, byte[], int, int)."""
+    cross()
+    if isinstance(source, int):
+        ctypes.memmove(ctypes.addressof(index) + destination, source, length)
+    else:
+        ctypes.memmove(destination, ctypes.addressof(source) + index, length)
+
+
+def install_stubs():
+    """Registers the stubbed clr and InnoMakerUsb2CanLib modules so the driver can be imported."""
+    clr = types.ModuleType("clr")
+    clr.AddReference = lambda path: None
+    marshal = types.SimpleNamespace(Copy=stub_copy)
+    clr.System = types.SimpleNamespace(Type=types.SimpleNamespace(GetType=get_type),
+                                       Array=StubArray(), Byte=int, Object=object, IntPtr=int,
+                                       Runtime=types.SimpleNamespace(
+                                           InteropServices=types.SimpleNamespace(Marshal=marshal)))
+    lib = types.ModuleType("InnoMakerUsb2CanLib")
+    lib.InnoMakerDevice = StubDevice
+    lib.UsbCan = StubUsbCan
+    sys.modules["clr"] = clr
+    sys.modules["InnoMakerUsb2CanLib"] = lib
+
+
+install_stubs()
+import clr  # noqa: E402 (the stub)
+from can import Message  # noqa: E402
+from InnoMaker import InnoMaker  # noqa: E402
+from InnoMaker.InnoMaker import InnoMakerBus, get_device_manager  # noqa: E402
+from InnoMaker.simulation import SimulatedDevice, SimulatedTransport, encode_frame  # noqa: E402
+from InnoMaker.capture import CaptureWriter, CaptureReader, read_header, record_dtype, HEADER, HEADER_SIZE, \
+    RECORD_SIZE, MAGIC, VERSION  # noqa: E402
+from InnoMaker.replay import TraceReplay  # noqa: E402
+from InnoMaker.errors import decode_error_frame  # noqa: E402
+from InnoMaker.statistics import BusStatistics  # noqa: E402
+from InnoMaker.timestamps import DeviceClock  # noqa: E402
+from CommunicationList import CommunicationList  # noqa: E402
+from reliable import ReliableSender  # noqa: E402
+import codec  # noqa: E402
+import converters  # noqa: E402
+import can  # noqa: E402
+import can_lib  # noqa: E402
+
+try:
+    np = codec._numpy()
+except ImportError:
+    np = None  # the NumPy paths are skipped
+
+
+class LegacyCommunicationList:
+    """The list based CommunicationList before the deque, the Id index and the deadline heap were added."""
+    def __init__(self):
+        self.queue = list()
+
+    def get(self):
+        if len(self.queue) > 0:
+            arr = self.queue[0]
+            self.queue.remove(arr)
+            return bin(arr[0]), arr[1], arr[2]
+        return None, None, None
+
+    def put(self, TxId, dlc, data, save, timestamp, count=0):
+        self.queue.append([TxId, dlc, data, save, timestamp, count])
+        return True
+
+    def pop(self, RxId):
+        for element in self.queue:
+            if element[3] is True and element[0] == RxId:
+                self.queue.remove(element)
+                return True
+        return False
+
+    def ack_timeout(self):
+        timelist = [elem[4] for elem in self.queue if elem[3] is True]
+        return (datetime.now() - max(timelist)).total_seconds() if timelist else 0
+
+
+def legacy_read_data(bus):
+    """The receive routine before the ReceiveEngine was added, it resolves everything on every poll."""
+    myclasstype = clr.System.Type.GetType("InnoMakerUsb2CanLib.UsbCan, InnoMakerUsb2CanLib")
+    method = myclasstype.GetMethod("getInnoMakerDeviceBuf")
+    buffer = clr.System.Array.CreateInstance(clr.System.Byte, 20)
+    parameters = clr.System.Array[clr.System.Object]([bus.Device, buffer, 20])
+    device = StubUsbCan()
+    result = method.Invoke(device, parameters)
+    readdata = parameters[1]
+    if result:
+        if readdata[1] == 0 and readdata[2] == 0 and readdata[3] == 0:
+            return 0
+        else:
+            return readdata
+    else:
+        return 0
+
+
+def legacy_build_message(recvdata):
+    """The frame decoding before FRAME_FIELDS was added, every byte is indexed on its own."""
+    frameID = (recvdata[7] << 24) + (recvdata[6] << 16) + (recvdata[5] << 8) + (recvdata[4])
+    dlc = recvdata[8]
+    data = [0, 0, 0, 0, 0, 0, 0, 0]
+    for j in range(12, 12 + dlc):
+        data[j - 12] = recvdata[j]
+    return Message(arbitration_id=frameID, dlc=dlc, data=data)
+
+
+def legacy_send(bus, msg):
+    """The send routine before the SendEngine was added, a new list is built and converted for every frame."""
+    frame = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    buffer = struct.pack('H', msg.arbitration_id)
+    frame[4] = buffer[0]
+    frame[5] = buffer[1]
+    frame[8] = msg.dlc
+    for i in range(12, 12 + msg.dlc):
+        frame[i] = msg.data[i - 12]
+    # pythonnet converts the list into a new .NET array
+    return bus.transport.usbcan.sendInnoMakerDeviceBuf(bus.Device, to_net_bytes(frame), 20)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# helpers
+# ----------------------------------------------------------------------------------------------------------------------
+def open_bus():
+    """Opens an InnoMakerBus on the stubbed dll."""
+    return InnoMakerBus(channel=0, bitrate=500000, poll_interval=0.001)
+
+
+def open_simulated_bus(**options):
+    """Opens an InnoMakerBus on its own SimulatedDevice, the options configure the device."""
+    transport = SimulatedTransport([SimulatedDevice(**options)])
+    return InnoMakerBus(channel=0, bitrate=500000, poll_interval=0.001, transport=transport)
+
+
+def ns_per_call(function, repetitions=200000, rounds=5):
+    """Calls the function repeatedly and returns the mean duration of one call in ns.
+        The calls are split into rounds and the fastest round counts, so other processes disturb the result less.
+    """
+    calls = max(repetitions // rounds, 1)
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / calls
+
+
+def best_time(function, rounds=3):
+    """Returns the shortest duration of rounds calls of the function in seconds and the result of the last call."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def mixed_frames(count, seed=1):
+    """Creates raw frames with random 11 bit and 29 bit identifiers."""
+    rng = random.Random(seed)
+    frames = []
+    for i in range(count):
+        if i % 2:
+            can_id = rng.randrange(0x20000000) | 0x80000000
+        else:
+            can_id = rng.randrange(0x800)
+        frames.append(struct.pack('<IIBBBB8s', 0xFFFFFFFF, can_id, 8, 0, 0, 0, bytes(range(8))))
+    return frames
+
+
+# name -> {"value", "unit", "better"} of every reported result, see write_results and compare_results
+RESULTS = collections.OrderedDict()
+GAINS = collections.OrderedDict()  # name of an 'after' result -> name of the 'before' result, see compare_gains
+TIME_UNITS = ('ns', 'us', 'ms', '%')
+
+
+def report(name, value, unit, compare=True, before=None):
+    """Prints a result and collects it for the JSON output.
+        The first word of unit decides how the result is compared with the baseline: rates (e.g. frames/s) are better
+        if they are higher, durations (ns, us, ms) and percentages if they are lower, all other results and those
+        with compare=False are only recorded.
+        :param before: The name of the result of the previous implementation this result has to beat.
+    """
+    if before is not None:
+        GAINS[name] = before
+    print('{:<45} {:>12.1f} {}'.format(name, value, unit))
+    kind = unit.split()[0] if unit else ''
+    better = None
+    if compare and kind.endswith('/s'):
+        better = 'higher'
+    elif compare and kind.split('/')[0] in TIME_UNITS:
+        better = 'lower'
+    RESULTS[name] = {'value': float(value), 'unit': kind, 'better': better}
+
+
+def write_results(path):
+    """Writes the collected results with a description of the machine as JSON."""
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'results': RESULTS,
+    }
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2)
+
+
+def compare_results(path, tolerance):
+    """Compares the collected results with the baseline in path.
+        :param tolerance: The relative deterioration that is still accepted, e.g. 0.3 for 30 %.
+        :return: The names of the results that regressed.
+    """
+    with open(path) as file:
+        baseline = json.load(file)['results']
+    regressions = []
+    print()
+    print('{:<45} {:>12} {:>12} {:>8}'.format('compared with ' + os.path.basename(path), 'baseline', 'now', 'change'))
+    for name, result in RESULTS.items():
+        reference = baseline.get(name)
+        if reference is None or result['better'] is None or not reference['value']:
+            continue
+        change = result['value'] / reference['value'] - 1
+        worse = -change if result['better'] == 'higher' else change
+        regressed = worse > tolerance
+        if regressed:
+            regressions.append(name)
+        print('{:<45} {:>12.1f} {:>12.1f} {:>+7.0f}% {}'.format(name, reference['value'], result['value'],
+                                                             change * 100, 'REGRESSION' if regressed else ''))
+    print('{} regressions (tolerance {:.0f} %)'.format(len(regressions), tolerance * 100))
+    return regressions
+
+
+def compare_gains(tolerance):
+    """Compares every 'after' result with the 'before' result it claims to improve on.
+        :param tolerance: The relative deterioration that is still accepted, e.g. 0.3 for 30 %.
+        :return: The names of the 'after' results that are worse than their 'before'.
+    """
+    failed = []
+    if not GAINS:
+        return failed
+    print()
+    print('{:<45} {:>12} {:>12} {:>8}'.format('gains', 'before', 'after', 'change'))
+    for name, before in GAINS.items():
+        result = RESULTS[name]
+        reference = RESULTS[before]['value']
+        if not reference:
+            continue
+        change = result['value'] / reference - 1
+        worse = -change if result['better'] == 'higher' else change
+        lost = worse > tolerance
+        if lost:
+            failed.append(name)
+        print('{:<45} {:>12.1f} {:>12.1f} {:>+7.0f}% {}'.format(name, reference, result['value'], change * 100,
+                                                             'NO GAIN' if lost else ''))
+    print('{} results without gain (tolerance {:.0f} %)'.format(len(failed), tolerance * 100))
+    return failed
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# benchmarks
+# ----------------------------------------------------------------------------------------------------------------------
+def bench_read_data(bus):
+    before = ns_per_call(lambda: legacy_read_data(bus))
+    after = ns_per_call(bus.readData)
+    report('readData before (resolved per poll)', before, 'ns/poll')
+    report('readData after (ReceiveEngine)', after, 'ns/poll', before='readData before (resolved per poll)')
+
+
+def bench_decode(bus):
+    # before: every byte is indexed in the .NET array, after: one copy into the host buffer and FRAME_FIELDS
+    engine = bus._recv_engine
+    net_array = StubArray.CreateInstance(None, 20)
+    net_array[:20] = RX_FRAME
+    before = ns_per_call(lambda: legacy_build_message(net_array), 100000)
+
+    def decode():
+        stub_copy(net_array, 0, engine._host_address, 20)
+        return bus.buildMessage(engine.host_view)
+    after = ns_per_call(decode, 100000)
+    build = ns_per_call(lambda: bus.buildMessage(engine.host_view), 100000)
+    fields = InnoMaker.FRAME_FIELDS.unpack_from
+    unpack = ns_per_call(lambda: fields(engine.host_view, 0), 100000)
+    report('decode before (indexed .NET array)', before, 'ns/frame')
+    report('decode after (copy + FRAME_FIELDS)', after, 'ns/frame', before='decode before (indexed .NET array)')
+    report('  of which buildMessage', build, 'ns/frame')
+    report('  of which unpack', unpack, 'ns/frame')
+
+
+def bench_send(bus, frames=50000):
+    msg = Message(arbitration_id=0x123, dlc=8, data=bytes(range(8)), is_extended_id=False)
+    start = time.perf_counter()
+    for _ in range(frames):
+        legacy_send(bus, msg)
+    before = frames / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(frames):
+        bus.send(msg)
+    after = frames / (time.perf_counter() - start)
+    encode = ns_per_call(lambda: InnoMaker.FRAME.pack_into(bus._send_engine.host_buffer, 0, 0, 0x123, 8, 0, 0, 0,
+                                                          bytes(msg.data)), 100000)
+    report('send before (list per frame)', before, 'frames/s')
+    report('send after (SendEngine)', after, 'frames/s', before='send before (list per frame)')
+    report('  encode with FRAME.pack_into', encode, 'ns/frame')
+
+
+def bench_throughput(bus, frames=50000):
+    # frames/s of recv and send when the simulated device never has to wait: the python cost of the hot path
+    device = bus.Device
+    device.reset()
+    device.fifo_depth = frames
+    for name, receive in (('recv', lambda: 1 if bus.recv(0) is not None else 0),
+                          ('recv_batch', lambda: len(bus.recv_batch(64, 0)))):
+        device.schedule([0.0] * frames)  # all frames are waiting in the FIFO
+        received = 0
+        start = time.perf_counter()
+        while received < frames:
+            received += receive()
+        report('{} throughput (simulated device)'.format(name), frames / (time.perf_counter() - start), 'frames/s')
+    device.fifo_depth = 64
+    msg = Message(arbitration_id=0x123, dlc=8, data=bytes(range(8)), is_extended_id=False)
+    device.reset()
+    start = time.perf_counter()
+    for _ in range(frames):
+        bus.send(msg)
+    report('send throughput (simulated device)', device.tx_frames / (time.perf_counter() - start), 'frames/s')
+
+
+def bench_send_many(bus, frames=2000):
+    messages = [Message(arbitration_id=i & 0x7FF, dlc=8, data=bytes(range(8)), is_extended_id=False)
+                for i in range(frames)]
+
+    def run(send):
+        device = bus.Device
+        device.reset()
+        device.transfer_latency = 0.0001
+        start = time.perf_counter()
+        send()
+        rate = device.tx_frames / (time.perf_counter() - start)
+        device.transfer_latency = 0.0
+        return rate, device.tx_transfers
+
+    single = run(lambda: [bus.send(msg) for msg in messages])
+    loop = run(lambda: bus.send_many(messages))
+    bulk = run(lambda: bus.send_many(messages, bulk=True))
+    report('send per message (simulated device)', single[0], 'frames/s ({} transfers)'.format(single[1]))
+    report('send_many loop (simulated device)', loop[0], 'frames/s ({} transfers)'.format(loop[1]))
+    report('send_many bulk (simulated device)', bulk[0], 'frames/s ({} transfers)'.format(bulk[1]))
+
+
+def bench_periodic(bus, tasks=100, duration=2.0):
+    device = bus.Device
+    device.reset()
+    device.record = True
+    periods = {}
+    for i in range(tasks):
+        period = 0.005 + (i % 10) * 0.005  # 5 ms ... 50 ms
+        periods[i] = period
+        bus.send_periodic(Message(arbitration_id=i, dlc=2, data=[i, 0], is_extended_id=False), period)
+    time.sleep(duration)
+    statistics = bus.periodic_statistics()
+    bus.stop_all_periodic_tasks()
+    device.record = False
+    times_by_id = {}
+    for sent, can_id, dlc, data in device.sent:
+        times_by_id.setdefault(can_id, []).append(sent / 1e9)
+    errors = []
+    for can_id, times in times_by_id.items():
+        measured = (times[-1] - times[0]) / (len(times) - 1)
+        errors.append(abs(measured - periods[can_id]) / periods[can_id] * 100)
+    report('{} periodic tasks: transmissions'.format(tasks), statistics["transmissions"],
+           '({} missed)'.format(statistics["missed"]))
+    report('{} periodic tasks: mean jitter'.format(tasks), statistics["mean_jitter"] * 1e6, 'us')
+    report('{} periodic tasks: max jitter'.format(tasks), statistics["max_jitter"] * 1e6, 'us')
+    report('{} periodic tasks: max period error'.format(tasks), max(errors), '%')
+
+
+def bench_error_flood(bus, frames=20000):
+    # a flood of identical "bus error" frames, the log output goes into a buffer instead of the terminal
+    error_frame = struct.pack('<IIBBBB8s', 0xFFFFFFFF, 0x20000080, 8, 0, 0, 0, bytes(8))
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    logger = logging.getLogger('can.InnoMaker')
+    logger.addHandler(handler)
+    start = time.perf_counter_ns()
+    for _ in range(frames):
+        bus.buildMessage(error_frame)
+    cost = (time.perf_counter_ns() - start) / frames
+    bus._error_frame_log.flush()  # the summary of the suppressed frames
+    logger.removeHandler(handler)
+    report('error frame flood', cost, 'ns/frame ({} log lines)'.format(output.getvalue().count('\n')))
+    details = bytes([0, 0x14, 0x84, 0x0A, 0x00, 0, 12, 130])
+    decode = ns_per_call(lambda: decode_error_frame(0x20000A0D, details), 100000)
+    report('decode_error_frame (cached)', decode, 'ns/frame')
+
+
+def bench_line_rate(bus, duration=1.0, rate=8000):
+    def run(receive, reader_thread=False):
+        device = bus.Device
+        device.reset()
+        device.transfer_latency = 0.0002  # a USB round trip
+        device.rate = rate
+        if reader_thread:
+            bus.start_reader()
+        received = 0
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            received += receive()
+        if reader_thread:
+            bus.stop_reader()
+        device.rate = 0
+        device.transfer_latency = 0.0
+        return received / duration, device.overflows
+
+    single, single_overflows = run(lambda: 1 if bus.recv(0) is not None else 0)
+    batch, batch_overflows = run(lambda: len(bus.recv_batch(64, 0)))
+    report('recv at {} frames/s line rate'.format(rate), single, 'frames/s ({} overflows)'.format(single_overflows))
+    report('recv_batch at {} frames/s line rate'.format(rate), batch, 'frames/s ({} overflows)'.format(batch_overflows))
+
+    # the reader thread drains the device while the application thread only pops from the ring buffer
+    threaded, threaded_overflows = run(lambda: 1 if bus.recv(0) is not None else 0, reader_thread=True)
+    report('recv with reader thread at {} frames/s'.format(rate), threaded,
+           'frames/s ({} overflows, {} ring overflows)'.format(threaded_overflows, bus.rx_overflows))
+
+
+def bench_wakeup(bus, frames=100, spacing=0.005, idle=0.5):
+    # idle CPU while a receive waits for a frame, before: polling with recv(0), after: blocking recv(timeout)
+    device = bus.Device
+    device.reset()
+    cpu = time.process_time()
+    end = time.perf_counter() + idle
+    while time.perf_counter() < end:
+        bus.recv(0)
+    polling = (time.process_time() - cpu) / idle * 100
+    device.read_timeout = 0.05  # a bulk read of the dll waits for the next frame
+    cpu = time.process_time()
+    bus.recv(idle)
+    blocking = (time.process_time() - cpu) / idle * 100
+    report('idle CPU while polling with recv(0)', polling, '%')
+    report('idle CPU while blocking in recv({})'.format(idle), blocking, '%')
+    bus.stop_reader()
+
+    # latency between the arrival of a frame at the device and the return of recv
+    start = time.perf_counter() + spacing
+    arrivals = [start + i * spacing for i in range(frames)]
+    device.schedule(arrivals)
+    latencies = []
+    for arrival in arrivals:
+        if bus.recv(1.0) is not None:
+            latencies.append(time.perf_counter() - arrival)
+    bus.stop_reader()
+    device.read_timeout = 0.0
+    report('wake-up latency mean ({} frames)'.format(len(latencies)), sum(latencies) / len(latencies) * 1e6, 'us')
+    report('wake-up latency max', max(latencies) * 1e6, 'us')
+
+
+def bench_filters(bus, frames=20000):
+    stream = mixed_frames(frames)
+    for count in (10, 1000):
+        rng = random.Random(count)
+        filters = [{"can_id": rng.randrange(0x800), "can_mask": 0x7FF, "extended": False} for _ in range(count // 2)]
+        filters += [{"can_id": rng.randrange(0x20000000), "can_mask": 0x1FFFFFFF, "extended": True}
+                    for _ in range(count // 2)]
+        start = time.perf_counter_ns()
+        bus.set_filters(filters)
+        compile_time = (time.perf_counter_ns() - start) / 1e6
+
+        start = time.perf_counter_ns()
+        for frame in stream:
+            msg = bus.buildMessage(frame)
+            bus._matches_filters(msg)
+        generic = (time.perf_counter_ns() - start) / frames
+
+        accepts = bus._acceptance.accepts
+        start = time.perf_counter_ns()
+        for frame in stream:
+            if accepts(frame):
+                bus.buildMessage(frame)
+        prefilter = (time.perf_counter_ns() - start) / frames
+        report('{} filters: build + python-can filter'.format(count), generic, 'ns/frame')
+        report('{} filters: AcceptanceFilter prefilter'.format(count), prefilter,
+               'ns/frame (compiled in {:.1f} ms)'.format(compile_time))
+    bus.set_filters(None)
+
+
+def bench_statistics(bus, frames=20000, rate=8000, budget=1.0):
+    # the statistics must cost less than budget percent of one CPU core at the given frame rate
+    stream = mixed_frames(frames)
+    statistics = BusStatistics(500000)
+    rx_frame = statistics.rx_frame
+    start = time.perf_counter_ns()
+    for frame in stream:
+        rx_frame(frame)
+    cost = (time.perf_counter_ns() - start) / frames
+    load = cost * rate / 1e9 * 100
+    report('statistics per received frame', cost, 'ns/frame')
+    report('statistics at {} frames/s (budget {} %)'.format(rate, budget), load,
+           '% of one core ({})'.format('ok' if load < budget else 'OVER BUDGET'))
+
+    # the snapshot after one second at line rate shows the rate and the bus load of the simulated device,
+    # 8000 standard frames with 8 data bytes need 888 kbit/s, so the load refers to a 1 Mbit/s bus
+    bitrate = bus.statistics.bitrate
+    bus.statistics.bitrate = 1000000
+    bus.statistics.reset()
+    bus.get_statistics()
+    bus.Device.reset()
+    bus.Device.rate = rate
+    end = time.perf_counter() + 1.0
+    while time.perf_counter() < end:
+        bus.recv_batch(64, 0)
+    bus.Device.rate = 0
+    snapshot = bus.get_statistics()
+    report('statistics: received frames', snapshot['rx_frames'], 'frames')
+    bus.statistics.bitrate = bitrate
+    report('statistics: bus load at 1 Mbit/s', snapshot['bus_load'] * 100, '%', compare=False)
+
+
+def bench_timestamps(bus, frames=200, spacing=0.002):
+    # host timestamps: the frames arrive at known times, the timestamp is taken directly after the transfer
+    start = time.perf_counter() + spacing
+    arrivals = [start + i * spacing for i in range(frames)]
+    device = bus.Device
+    device.reset()
+    device.read_timeout = 0.05
+    device.schedule(arrivals)
+    delays = []
+    intervals = []
+    last = None
+    for arrival in arrivals:
+        msg = bus.recv(1.0)
+        if msg is None:
+            continue
+        delays.append(msg.timestamp - bus.clock.to_time(int(arrival * 1e9)))
+        if last is not None:
+            intervals.append(msg.timestamp - last)
+        last = msg.timestamp
+    bus.stop_reader()
+    device.read_timeout = 0.0
+    jitter = [abs(interval - spacing) for interval in intervals]
+    report('host timestamp delay after arrival (mean)', sum(delays) / len(delays) * 1e6, 'us')
+    report('host timestamp period jitter (mean)', sum(jitter) / len(jitter) * 1e6, 'us')
+    report('host timestamp period jitter (max)', max(jitter) * 1e6, 'us')
+
+    # device timestamps: a simulated device with a microsecond counter that runs 50 ppm fast and wraps after
+    # 10 seconds, the frames reach the host after a random USB delay of 0.1 to about 2 ms
+    rng = random.Random(13)
+    skew = 50e-6
+    clock = DeviceClock()
+    offset_ns = 123456789
+    errors = []
+    for k in range(60000):
+        true_ns = k * 1000000  # one frame per ms for 60 s
+        ticks = (int(true_ns * (1 + skew)) // 1000 + (1 << 32) - 10000000) % (1 << 32)
+        host_ns = true_ns + offset_ns + 100000 + int(min(rng.expovariate(1 / 300000), 1900000))
+        corrected = clock.to_host(ticks, host_ns)
+        if true_ns >= 5000000000:  # after the correlation has settled
+            errors.append(corrected - (true_ns + offset_ns))
+    # the constant part of the error is the shortest USB delay, which no correlation can observe
+    mean = sum(errors) / len(errors)
+    spread = max(errors) - min(errors)
+    drift_error = abs(clock.drift - (1 / (1 + skew) - 1)) * 1e6
+    report('device timestamp error (mean, USB delay >= 100us)', mean / 1e3, 'us')
+    report('device timestamp jitter', spread / 1e3, 'us')  # the bounds are asserted in tests/test_timestamps.py
+    report('device clock drift error', drift_error, 'ppm')
+
+
+def bench_multi_device(counts=(1, 2, 4), duration=1.0, rate=8000):
+    # every simulated device delivers rate frames/s, each bus has its own reader and its own receiving thread
+    for count in counts:
+        devices = [SimulatedDevice("sim{}".format(i), transfer_latency=0.0002) for i in range(count)]
+        transport = SimulatedTransport(devices)
+        buses = [InnoMakerBus(channel=i, bitrate=500000, poll_interval=0.001, transport=transport)
+                 for i in range(count)]
+        for device in devices:
+            device.rate = rate
+        received = [0] * count
+        end = time.perf_counter() + duration
+
+        def receive(index, bus):
+            while time.perf_counter() < end:
+                received[index] += len(bus.recv_batch(64, 0.01))
+
+        threads = [threading.Thread(target=receive, args=(i, bus)) for i, bus in enumerate(buses)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for bus in buses:
+            bus.shutdown()
+        overflows = sum(device.overflows for device in devices)
+        report('{} devices at {} frames/s each'.format(count, rate), sum(received) / duration,
+               'frames/s ({} overflows)'.format(overflows))
+
+
+def bench_startup(cycles=50, scan_time=0.02):
+    # the import runs in a fresh interpreter, python-can is imported before the measurement
+    code = '\n'.join([
+        'import sys, time, types',
+        'sys.path.insert(0, {!r})'.format(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')),
+        'import can',
+        'loaded = []',
+        'clr = types.ModuleType("clr")',
+        'clr.AddReference = loaded.append',
+        'sys.modules["clr"] = clr',
+        'start = time.perf_counter()',
+        'import InnoMaker',
+        'print(time.perf_counter() - start, len(loaded))',
+    ])
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    report('import InnoMaker', float(output[0]) * 1e3, 'ms (dll loaded on import: {})'.format(
+        'yes' if int(output[1]) else 'no'))
+
+    # open and close cycles of a test station, the USB enumeration takes scan_time seconds
+    manager = get_device_manager()
+    manager.transport.usbcan.scan_time = scan_time
+    for name, refresh in (('before (scan per open)', True), ('after (cached enumeration)', False)):
+        start = time.perf_counter()
+        for _ in range(cycles):
+            if refresh:
+                manager.refresh()
+            bus = InnoMakerBus(channel=0, bitrate=500000)
+            bus.shutdown()
+            if bus.Device is None:  # a failed open would only measure the enumeration
+                raise RuntimeError('channel 0 could not be opened, is it still used by another bus?')
+        report('open + shutdown {}'.format(name), (time.perf_counter() - start) / cycles * 1e3, 'ms/cycle',
+               before=None if refresh else 'open + shutdown before (scan per open)')
+    manager.transport.usbcan.scan_time = 0.0
+
+
+def bench_communication_list(messages=100000, legacy_messages=10000):
+    # put all messages, acknowledge every second one by its Id, query the ACK timeout and take all out again
+    def run(queue, count):
+        now = datetime.now()
+        data = bytes(8)
+        start = time.perf_counter()
+        for i in range(count):
+            queue.put(i, 8, data, True, now)
+        put = time.perf_counter()
+        for i in range(0, count, 2):
+            queue.pop(i)
+        pop = time.perf_counter()
+        for _ in range(1000):
+            queue.ack_timeout()
+        timeout = time.perf_counter()
+        while queue.get()[0] is not None:
+            pass
+        end = time.perf_counter()
+        return ((put - start) / count * 1e6, (pop - put) / (count // 2) * 1e6, (timeout - pop) / 1000 * 1e6,
+                (end - timeout) / (count - count // 2) * 1e6)
+
+    for name, queue, count in (('list', LegacyCommunicationList(), legacy_messages),
+                               ('deque', CommunicationList(), messages)):
+        put, pop, timeout, get = run(queue, count)
+        report('CommunicationList {} {}: put'.format(name, count), put, 'us/op')
+        report('CommunicationList {} {}: pop(RxId)'.format(name, count), pop, 'us/op')
+        report('CommunicationList {} {}: ack_timeout'.format(name, count), timeout, 'us/op')
+        report('CommunicationList {} {}: get'.format(name, count), get, 'us/op')
+
+
+def bench_reliable(messages=5000, loss=0.3, ack_delay=0.02, timeout=0.1):
+    # a simulated peer acknowledges every received message after ack_delay, loss of the transmissions get lost
+    rng = random.Random(17)
+    send_list = CommunicationList()
+    sender = ReliableSender(send_list, retries=5, timeout=timeout)
+    running = True
+
+    def peer():
+        # takes the messages from the send list like the send thread of the canLib
+        acks = collections.deque()
+        while running:
+            TxId, dlc, data = send_list.get(block=True, timeout=0.001)
+            now = time.monotonic()
+            if TxId is not None and rng.random() >= loss:
+                acks.append((now + ack_delay, TxId))
+            while acks and acks[0][0] <= now:
+                sender.acknowledge(acks.popleft()[1])
+
+    thread = threading.Thread(target=peer)
+    thread.start()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    deliveries = [sender.send(i, 8, bytes(8)) for i in range(messages)]
+    acknowledged = sum(1 for delivery in deliveries if delivery.exception() is None)
+    duration = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    running = False
+    thread.join()
+    time.sleep(timeout * 2)  # the timers of the acknowledged messages run out
+    idle = time.process_time()
+    time.sleep(0.5)
+    idle = (time.process_time() - idle) / 0.5 * 100
+    sender.stop()
+    report('reliable: {} messages, {:.0f} % loss'.format(messages, loss * 100), acknowledged,
+           'acknowledged ({} retransmissions, {} failed)'.format(sender.retransmissions, sender.failures))
+    report('reliable: completion time', duration * 1e3, 'ms')
+    report('reliable: CPU per message (incl. peer)', cpu / messages * 1e6, 'us')
+    report('reliable: idle CPU without messages in flight', idle, '%')
+
+
+def bench_canlib(messages=200, idle=1.0):
+    # canLib on a simulated (virtual) bus, the peer is a second bus on the same virtual channel
+    def measure(start_threads, stop_threads, send, received):
+        peer = can.Bus(interface='virtual', channel='canlib_bench')
+        bus = can.ThreadSafeBus(interface='virtual', channel='canlib_bench')
+        handle = start_threads(bus)
+        time.sleep(0.1)
+        cpu = time.process_time()
+        time.sleep(idle)
+        idle_cpu = (time.process_time() - cpu) / idle * 100
+        send_latency = []
+        for i in range(messages):
+            start = time.perf_counter()
+            send(handle, i)
+            if peer.recv(1.0) is not None:
+                send_latency.append(time.perf_counter() - start)
+        recv_latency = []
+        for i in range(messages):
+            start = time.perf_counter()
+            peer.send(can.Message(arbitration_id=0x200, data=[i & 0xFF], is_extended_id=False))
+            if received(handle):
+                recv_latency.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        stop_threads(handle)
+        stop = time.perf_counter() - start
+        peer.shutdown()
+        return idle_cpu, send_latency, recv_latency, stop
+
+    def legacy_start(bus):
+        # the loops of the canLib before: 1 ms sleep in the send thread, recv(0.001) in the receive thread
+        handle = types.SimpleNamespace(bus=bus, running=True, send_msg=CommunicationList(),
+                                       recv_msg=CommunicationList())
+
+        def send_loop():
+            while handle.running:
+                time.sleep(0.001)
+                if not handle.send_msg.empty():
+                    TxId, dlc, data = handle.send_msg.get()
+                    bus.send(can.Message(arbitration_id=TxId, data=data, is_extended_id=False))
+
+        def receive_loop():
+            while handle.running:
+                recv = bus.recv(0.001)
+                if recv is not None:
+                    handle.recv_msg.put(recv.arbitration_id, recv.dlc, recv.data, False, None)
+
+        handle.threads = [threading.Thread(target=send_loop), threading.Thread(target=receive_loop)]
+        for thread in handle.threads:
+            thread.start()
+        return handle
+
+    def legacy_stop(handle):
+        handle.running = False
+        for thread in handle.threads:
+            thread.join()
+        handle.bus.shutdown()
+
+    def legacy_received(handle):
+        end = time.perf_counter() + 1.0
+        while handle.recv_msg.empty() and time.perf_counter() < end:
+            time.sleep(0.0001)
+        return handle.recv_msg.get()[0] is not None
+
+    results = (
+        ('before (polling)', measure(legacy_start, legacy_stop,
+                                     lambda handle, i: handle.send_msg.put(0x100, 1, [i & 0xFF], False, None),
+                                     legacy_received)),
+        ('after (event-driven)', measure(lambda bus: can_lib.canLib(bus=bus), lambda lib: lib.shutdown(),
+                                         lambda lib, i: lib.add_msg(0x100, 1, i & 0xFF),
+                                         lambda lib: lib.recv_msg.get(block=True, timeout=1.0)[0] is not None)),
+    )
+    for name, (idle_cpu, send_latency, recv_latency, stop) in results:
+        legacy = name == results[0][0]
+        # the event-driven shutdown waits up to recv_timeout for the receive thread, it claims no gain
+        for metric, value, unit, gain in (
+                ('idle CPU', idle_cpu, '%', True),
+                ('add_msg -> bus', sum(send_latency) / len(send_latency) * 1e6,
+                 'us mean, {:.0f} us max'.format(max(send_latency) * 1e6), True),
+                ('bus -> recv_msg', sum(recv_latency) / len(recv_latency) * 1e6,
+                 'us mean, {:.0f} us max'.format(max(recv_latency) * 1e6), True),
+                ('shutdown', stop * 1e3, 'ms', False)):
+            report('canLib {}: {}'.format(name, metric), value, unit,
+                   before=None if legacy or not gain else 'canLib {}: {}'.format(results[0][0], metric))
+
+
+def bench_asyncio(duration=1.0, rate=20000, messages=5000):
+    # receiving in an event loop: frames/s and how late a 1 ms timer of the loop fires meanwhile
+    async def ticker(lateness, stopped):
+        loop = asyncio.get_running_loop()
+        while not stopped.is_set():
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            lateness.append(loop.time() - start - 0.001)
+
+    async def measure(receive):
+        bus = open_simulated_bus(fifo_depth=256, transfer_latency=0.0002)
+        device = bus.Device
+        device.rate = rate
+        lateness = []
+        stopped = asyncio.Event()
+        tick = asyncio.ensure_future(ticker(lateness, stopped))
+        received = await receive(bus, asyncio.get_running_loop().time() + duration)
+        stopped.set()
+        await tick
+        device.rate = 0
+        bus.shutdown()
+        return received / duration, device.overflows + bus.rx_overflows, lateness
+
+    async def executor(bus, end):
+        # before: every frame is fetched with a blocking recv in the default executor
+        loop = asyncio.get_running_loop()
+        received = 0
+        while loop.time() < end:
+            if await loop.run_in_executor(None, bus.recv, 0.01) is not None:
+                received += 1
+        return received
+
+    async def notifier(bus, end):
+        reader = can.AsyncBufferedReader()
+        loop = asyncio.get_running_loop()
+        notify = can.Notifier(bus, [reader], timeout=0.01, loop=loop)
+        received = 0
+        while loop.time() < end:
+            try:
+                await asyncio.wait_for(reader.get_message(), 0.01)
+                received += 1
+            except asyncio.TimeoutError:
+                pass
+        notify.stop()
+        return received
+
+    async def native(bus, end):
+        loop = asyncio.get_running_loop()
+        received = 0
+        while loop.time() < end:
+            if await bus.recv_async(0.01) is not None:
+                received += 1
+        return received
+
+    async def iterate(bus, end):
+        loop = asyncio.get_running_loop()
+        received = 0
+        async for msg in bus:
+            received += 1
+            if loop.time() >= end:
+                break
+        return received
+
+    async def send(bus, count):
+        device = bus.Device
+        start = time.perf_counter()
+        for i in range(count):
+            await bus.send_async(Message(arbitration_id=0x100, data=[i & 0xFF], is_extended_id=False))
+        elapsed = time.perf_counter() - start
+        return count / elapsed, device.tx_frames
+
+    for name, receive in (('run_in_executor(recv)', executor), ('Notifier + AsyncBufferedReader', notifier),
+                          ('recv_async', native), ('async for msg in bus', iterate)):
+        frames, overflows, lateness = asyncio.run(measure(receive))
+        report('asyncio {} at {} frames/s'.format(name, rate), frames, 'frames/s ({} overflows)'.format(overflows))
+        report('asyncio {}: loop latency'.format(name), sum(lateness) / len(lateness) * 1e6,
+               'us mean, {:.0f} us max'.format(max(lateness) * 1e6))
+
+    async def run_send():
+        bus = open_simulated_bus()
+        result = await send(bus, messages)
+        bus.shutdown()
+        return result
+    sent, frames = asyncio.run(run_send())
+    report('asyncio send_async', sent, 'msg/s ({} frames on the device)'.format(frames))
+
+
+def bench_codec(payloads=10000):
+    # scalar conversions of converters.py against the codec, then a log of payloads in bulk
+    rng = random.Random(2)
+    value = 0x0102030405060708
+    data = codec.int_to_bytes(value, 8)
+    bits = codec.int_to_bits(0x123, 11)
+    scalars = (
+        ('int -> bytes', lambda: converters.conv_int_to_bytes(value, 8), lambda: codec.int_to_bytes(value, 8)),
+        ('bytes -> int', lambda: converters.conv_bytes_to_int(data), lambda: codec.bytes_to_int(data)),
+        ('bitarray -> int', lambda: converters.conv_bitarr_to_int(bits), lambda: codec.bits_to_int(bits)),
+        ('int -> bitarray', lambda: converters.conv_str_to_bitarr(bin(0x123), 11), lambda: codec.int_to_bits(0x123, 11)),
+        ('ack id', lambda: converters.get_ack_tribeID(b'\x05', [0, 1, 1, 0, 1]),
+         lambda: codec.ack_tribe_id(b'\x05', [0, 1, 1, 0, 1])),
+        # the way sendCAN converted every message: Id via bin() and strings, data via the byte loop
+        ('canLib Id + data', lambda: (int(converters.conv_bitarr_to_string(bin(0x320)), 2),
+                                      converters.conv_int_to_bytes(value, 8)),
+         lambda: (0x320, codec.int_to_bytes(value, 8))),
+    )
+    for name, before, after in scalars:
+        report('codec {} before (converters)'.format(name), ns_per_call(before, 50000), 'ns/call')
+        report('codec {} after'.format(name), ns_per_call(after, 50000), 'ns/call',
+               before='codec {} before (converters)'.format(name))
+
+    values = [rng.randrange(1 << 64) for _ in range(payloads)]
+    dlcs = [rng.randrange(9) for _ in range(payloads)]
+    loop, loop_decoded = best_time(lambda: [converters.conv_bytes_to_int(converters.conv_int_to_bytes(v, d))
+                                            for v, d in zip(values, dlcs)])
+    scalar, scalar_decoded = best_time(lambda: [codec.bytes_to_int(codec.int_to_bytes(v, d))
+                                                for v, d in zip(values, dlcs)])
+    report('codec {} payloads before (converters)'.format(payloads), loop * 1e3, 'ms')
+    report('codec {} payloads after (int.to_bytes)'.format(payloads), scalar * 1e3, 'ms',
+           before='codec {} payloads before (converters)'.format(payloads))
+    if np is None:
+        print('codec bulk path skipped, NumPy is not installed')
+        return
+    dlc_array = np.array(dlcs)
+    value_array = np.array(values, dtype=np.uint64)
+    bulk, decoded = best_time(lambda: codec.decode_payloads(codec.encode_payloads(value_array, dlc_array), dlc_array))
+    assert decoded.tolist() == loop_decoded == scalar_decoded
+    report('codec {} payloads after (NumPy bulk)'.format(payloads), bulk * 1e3, 'ms',
+           before='codec {} payloads before (converters)'.format(payloads))
+
+
+def bench_canlib_loopback(messages=1000):
+    # end-to-end latency of the canLib queues: add_msg -> send thread -> bus -> device in loopback -> receive thread
+    # -> recv_msg, on an InnoMakerBus with a simulated device whose reads block like the bulk reads of the dll
+    lib = can_lib.canLib(bus=open_simulated_bus(loopback=True, read_timeout=0.05))
+    latencies = []
+    for i in range(messages):
+        start = time.perf_counter()
+        lib.add_msg(0x100, 1, i & 0xFF)
+        if lib.recv_msg.get(block=True, timeout=1.0)[0] is not None:
+            latencies.append(time.perf_counter() - start)
+    lib.shutdown()
+    latencies.sort()
+    report('canLib end-to-end latency (loopback, mean)', sum(latencies) / len(latencies) * 1e6, 'us')
+    report('canLib end-to-end latency (loopback, p99)', latencies[int(len(latencies) * 0.99)] * 1e6, 'us')
+
+
+def bench_capture(duration=1.0, rate=21000, frames=200000):
+    # recording to disk: the CaptureWriter alone, against a text log of python-can, and end-to-end in capture-only
+    # mode at the frame rate of a saturated 1 Mbit/s bus with empty data fields
+    with tempfile.TemporaryDirectory() as folder:
+        batch = RX_FRAME * 64
+        offsets = range(0, len(batch), 20)
+        writer = CaptureWriter(os.path.join(folder, 'writer.cap'))
+        start = time.perf_counter()
+        for i in range(frames // 64):
+            writer.write_batch(batch, offsets, i)
+        elapsed = time.perf_counter() - start
+        writer.close()
+        report('CaptureWriter write_batch', elapsed / writer.records * 1e9,
+               'ns/frame ({:.0f} frames/s max)'.format(writer.records / elapsed))
+
+        bus = open_simulated_bus()
+        with open(os.path.join(folder, 'trace.asc'), 'w') as file:
+            logger = can.ASCWriter(file)
+            count = frames // 10
+            start = time.perf_counter()
+            for _ in range(count):
+                logger.on_message_received(bus.buildMessage(RX_FRAME, 0, time.time()))
+            elapsed = time.perf_counter() - start
+            logger.stop()
+        bus.shutdown()
+        report('Message + can.ASCWriter', elapsed / count * 1e9, 'ns/frame')
+
+        path = os.path.join(folder, 'bus.cap')
+        bus = open_simulated_bus(fifo_depth=64, frames=[encode_frame(0x100 + i) for i in range(16)])
+        device = bus.Device
+        bus.start_capture(path, capture_only=True)
+        device.rate = rate
+        cpu = time.process_time()
+        time.sleep(duration)
+        cpu = time.process_time() - cpu
+        device.rate = 0
+        time.sleep(0.01)
+        files = bus.stop_capture()
+        bus.shutdown()
+        header = read_header(files[0])
+        with open(files[0], 'rb') as file:
+            file.seek(HEADER_SIZE)
+            records = file.read()
+        valid = len(records) == header['count'] * RECORD_SIZE == device.rx_frames * RECORD_SIZE
+        report('capture-only at {} frames/s'.format(rate), header['count'] / duration,
+               'frames/s ({} overflows, {} of {} frames in the file{})'.format(
+                   device.overflows, header['count'], device.rx_frames, '' if valid else ', INCOMPLETE'))
+        report('capture-only CPU at {} frames/s'.format(rate), cpu / duration * 100, '%')
+
+
+# the number of frames of the synthetic log of bench_capture_index, --log-frames 100000000 for a log of 3.2 GB
+LOG_FRAMES = 10000000
+
+
+def synthetic_log(path, frames, rate=8000, ids=200, chunk=1000000, seed=3):
+    """Writes a capture file with frames at a mean rate and identifiers of very different frequency."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, ids + 1)  # a few identifiers make up most of the traffic
+    weights /= weights.sum()
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, 0, 500000, 0, time.time_ns(), frames).ljust(HEADER_SIZE,
+                                                                                                     b'\0'))
+    records = np.memmap(path, record_dtype(), 'r+', HEADER_SIZE, (frames,))
+    timestamp = 1700000000 * 10 ** 9
+    for begin in range(0, frames, chunk):
+        block = records[begin:begin + chunk]
+        steps = rng.exponential(1e9 / rate, len(block)).astype(np.uint64)
+        block['timestamp'] = timestamp + np.cumsum(steps)
+        timestamp = int(block['timestamp'][-1])
+        block['echo_id'] = 0xFFFFFFFF
+        block['can_id'] = 0x100 + rng.choice(ids, len(block), p=weights)
+        block['dlc'] = 8
+        block['data'] = rng.integers(0, 256, (len(block), 8), np.uint8)
+    records.flush()
+    del records
+
+
+def bench_capture_index(frames=None):
+    # queries on a large capture file: with the indexes of the CaptureReader against a linear scan of the file
+    if np is None:
+        print('capture_index skipped, NumPy is not installed')
+        return
+    frames = frames or LOG_FRAMES
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'log.cap')
+        start = time.perf_counter()
+        synthetic_log(path, frames)
+        report('synthetic log of {} frames: written'.format(frames), time.perf_counter() - start, 's', compare=False)
+
+        reader = CaptureReader(path)
+        start = time.perf_counter()
+        reader.build_index()
+        report('identifier index: built', time.perf_counter() - start, 's')
+        reader.close()
+        start = time.perf_counter()
+        reader = CaptureReader(path)
+        reader.build_index()
+        report('identifier index: loaded', (time.perf_counter() - start) * 1e3, 'ms')
+
+        keys, counts = reader.identifiers()
+        first = int(reader.timestamps[0]) / 1e9
+        duration = int(reader.timestamps[-1]) / 1e9 - first
+        window = (first + duration / 2, first + duration / 2 + 1.0)  # one second in the middle of the log
+        frequent, rare = int(keys[np.argmax(counts)]), int(keys[np.argmin(counts)])
+        for name, query in (('time range 1 s', lambda: reader.query(None, *window)),
+                            ('frequent ID, 1 s', lambda: reader.query(frequent, *window)),
+                            ('rare ID, whole log', lambda: reader.query(rare)),
+                            ('frequent ID, whole log', lambda: reader.query(frequent))):
+            elapsed, result = best_time(query)
+            report('CaptureReader {}'.format(name), elapsed * 1e6, 'us ({} frames)'.format(len(result)))
+
+        def scan():
+            # without index every record is read and compared
+            timestamps = reader.records['timestamp']
+            start_ns, end_ns = np.uint64(window[0] * 1e9), np.uint64(window[1] * 1e9)
+            return reader.records[(reader.records['can_id'] == frequent) & (timestamps >= start_ns) &
+                                  (timestamps < end_ns)]
+        elapsed, expected = best_time(scan, rounds=1)
+        valid = np.array_equal(expected, reader.query(frequent, *window))
+        report('linear scan frequent ID, 1 s', elapsed * 1e6,
+               'us ({} frames{})'.format(len(expected), '' if valid else ', MISMATCH'))
+        reader.close()
+
+
+def bench_replay(frames=2000, rate=2000, speed=2.0):
+    # replaying a capture with its timing: the device stamps every sent frame, the stamps are compared with the
+    # gaps of the trace; before there was only a sleep per gap in front of bus.send
+    rng = random.Random(4)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'trace.cap')
+        writer = CaptureWriter(path)
+        timestamp = 1700000000 * 10 ** 9
+        trace = []
+        for i in range(frames):
+            timestamp += int(rng.expovariate(rate) * 1e9)
+            can_id = 0x100 + i % 4
+            writer.write(encode_frame(can_id, bytes([i & 0xFF])), 0, timestamp)
+            trace.append((timestamp, can_id))
+        writer.close()
+
+        def errors(device, sent_ids, factor):
+            # deviation of the device stamps from the gaps of the trace, relative to the first frame
+            targets = [t for t, can_id in trace if can_id in sent_ids]
+            stamps = [sent for sent, can_id, dlc, data in device.sent]
+            if len(stamps) != len(targets):
+                return None
+            deviation = sorted(abs((stamp - stamps[0]) - (target - targets[0]) / factor)
+                               for stamp, target in zip(stamps, targets))
+            return deviation[len(deviation) // 2] / 1e3, deviation[int(len(deviation) * 0.99)] / 1e3
+
+        def measure(name, replay, sent_ids, factor=1.0):
+            bus = open_simulated_bus(record=True)
+            statistics = replay(bus)
+            result = errors(bus.Device, sent_ids, factor)
+            bus.shutdown()
+            if result is None:
+                report('replay {}'.format(name), 0, 'frames MISSING')
+                return
+            report('replay {}: device timing error'.format(name), result[0],
+                   'us median, {:.0f} us p99'.format(result[1]))
+            if statistics is not None:
+                report('replay {}: deadline error'.format(name), statistics['mean_error'] * 1e6,
+                       'us mean, {:.0f} us p99, {} late'.format(statistics['p99_error'] * 1e6, statistics['late']))
+
+        def sleep_per_gap(bus):
+            previous = trace[0][0]
+            for timestamp, can_id in trace:
+                time.sleep((timestamp - previous) / 1e9)
+                previous = timestamp
+                bus.send(Message(arbitration_id=can_id, data=[0], is_extended_id=False))
+
+        def traced(**options):
+            def replay(bus):
+                engine = TraceReplay(bus, path, **options)
+                engine.start()
+                engine.wait()
+                return engine.statistics()
+            return replay
+
+        all_ids = {0x100, 0x101, 0x102, 0x103}
+        measure('sleep per gap (before)', sleep_per_gap, all_ids)
+        measure('TraceReplay', traced(), all_ids)
+        measure('TraceReplay speed {}'.format(speed), traced(speed=speed), all_ids, speed)
+        measure('TraceReplay ids 0x100, 0x101', traced(ids=[0x100, 0x101]), {0x100, 0x101})
+
+        bus = open_simulated_bus(record=True)
+        engine = TraceReplay(bus, path, speed=10.0, loop=True)
+        engine.start()
+        while engine.passes < 2:
+            time.sleep(0.01)
+        engine.stop()
+        bus.shutdown()
+        report('replay loop: passes after stop', engine.passes, '({} frames)'.format(engine.frames), compare=False)
+
+
+# the benchmarks in the order they run, with the bus they need: the stubbed dll, the simulated device or none
+SUITE = (
+    (bench_read_data, 'dll'),
+    (bench_decode, 'dll'),
+    (bench_send, 'dll'),
+    (bench_error_flood, 'dll'),
+    (bench_filters, 'dll'),
+    (bench_throughput, 'simulated'),
+    (bench_send_many, 'simulated'),
+    (bench_periodic, 'simulated'),
+    (bench_line_rate, 'simulated'),
+    (bench_wakeup, 'simulated'),
+    (bench_statistics, 'simulated'),
+    (bench_timestamps, 'simulated'),
+    (bench_multi_device, None),
+    (bench_startup, None),
+    (bench_communication_list, None),
+    (bench_reliable, None),
+    (bench_canlib, None),
+    (bench_canlib_loopback, None),
+    (bench_asyncio, None),
+    (bench_codec, None),
+    (bench_capture, None),
+    (bench_capture_index, None),
+    (bench_replay, None),
+)
+
+
+def run_suite(only=None):
+    """Runs the benchmarks of the SUITE, only the given names (without bench_) if only is set.
+        The shared buses are shut down before a benchmark that opens its own buses, so it finds the devices free.
+    """
+    buses = {}
+    for benchmark, kind in SUITE:
+        if only and benchmark.__name__[len('bench_'):] not in only:
+            continue
+        if kind is None:
+            for bus in buses.values():
+                bus.shutdown()
+            buses.clear()  # opened again by the next benchmark that needs them
+            benchmark()
+            continue
+        if kind not in buses:
+            buses[kind] = open_bus() if kind == 'dll' else open_simulated_bus()
+        benchmark(buses[kind])
+    for bus in buses.values():
+        bus.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks of the InnoMakerBus')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='run only these benchmarks, e.g. throughput codec (names without bench_)')
+    parser.add_argument('--json', metavar='FILE', help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare the results with a stored baseline')
+    parser.add_argument('--save-baseline', metavar='FILE', help='store the results as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='accepted relative deterioration against the baseline (default 0.3)')
+    parser.add_argument('--crossing-ns', type=int, default=CROSSING_NS,
+                        help='imitated cost of one call from python into .NET in ns (default {})'.format(CROSSING_NS))
+    parser.add_argument('--log-frames', type=int, default=LOG_FRAMES,
+                        help='frames of the synthetic log of the capture_index benchmark (default {})'.format(LOG_FRAMES))
+    args = parser.parse_args()
+    LOG_FRAMES = args.log_frames
+    CROSSING_NS = args.crossing_ns
+    run_suite(args.only)
+    for path in (args.json, args.save_baseline):
+        if path:
+            write_results(path)
+    failed = compare_gains(args.tolerance)
+    if args.baseline:
+        failed += compare_results(args.baseline, args.tolerance)
+    if failed:
+        sys.exit(1)
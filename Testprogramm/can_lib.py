@@ -1,11 +1,14 @@
-import time
+import logging
 import can
-from threading import Thread
+from threading import Thread, Event
 # import own Libs
 import CommunicationList
-import converters as conv
+import codec
+from reliable import ReliableSender
 from datetime import datetime
 
+log = logging.getLogger('canLib')
+
 
 class canLib:
     # declare interface
@@ -19,25 +22,36 @@ class canLib:
     recv_msg = None
     callback = None
     callbackavailable = False
-    console = False  # for information output in console
+    console = False  # for information output in console, otherwise everything goes only to the logging module
 
     # CAN Type-ID's length for standard CAN
     CAN_id_length = 11
 
-    def __init__(self, returnObj=None, console=False):
+    # the receive thread blocks up to recv_timeout seconds inside the bus, this bounds the duration of shutdown
+    recv_timeout = 0.1
+
+    def __init__(self, returnObj=None, console=False, ack_id=None, retries=3, ack_timeout=0.1, bus=None):
         """
         initializes communication and starts the various processes in threads
+        :param ack_id: function that returns the TxId a received message acknowledges or None if it is no ACK,
+            e.g. lambda msg: codec.ack_tribe_id(msg.data, dcdcID) for the ACKs of a DCDC
+        :param retries: number of retransmissions of a safe message (save=True) without ACK
+        :param ack_timeout: seconds to wait for the ACK of a safe message before it is sent again
+        :param bus: an already opened bus, e.g. a simulated one, otherwise a ThreadSafeBus is opened with can.rc
         :return: None
         """
+        self.stopped = Event()
         try:
-            self.bus = can.ThreadSafeBus()
+            self.bus = can.ThreadSafeBus() if bus is None else bus
             self.canRunning = True
         except Exception:
-            print('Error initializing CAN-Interface')
+            log.exception('Error initializing CAN-Interface')
 
         # intitialize send and receive list
         self.send_msg = CommunicationList.CommunicationList()
         self.recv_msg = CommunicationList.CommunicationList()
+        self.ack_id = ack_id
+        self.reliable = ReliableSender(self.send_msg, retries, ack_timeout)
 
         # initialize and start Threads
         self.receive = Thread(target=self.receiveCAN, args=())
@@ -52,53 +66,83 @@ class canLib:
             self.callback = returnObj
             self.callbackavailable = True
         self.console = console
+        if console and not log.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+            log.addHandler(handler)
+            log.setLevel(logging.DEBUG)
 
     def receiveCAN(self):  # receive function
         """
         Thread for regular retrieval of receive data from the FIFO of the interface. Data is added to the recv_msg list
         :return: none
         """
-        while 1:
-            if self.canRunning:
-                recv = self.bus.recv(0.001)  # get received msg
-                if recv is not None:
-                    self.recv_msg.put(recv.arbitration_id, recv.dlc, recv.data, False, datetime.now())
-                    print('[INFO -> Input] {}'.format(recv))  # for testing, prints data which are send
+        if not self.canRunning:
+            return
+        while not self.stopped.is_set():
+            try:
+                recv = self.bus.recv(self.recv_timeout)  # blocks inside the bus until a msg is received
+            except Exception:
+                log.exception('receiveCAN Empfangen fehlgeschlagen')
+                self.stopped.wait(self.recv_timeout)
+                continue
+            if recv is not None:
+                # the timestamp was taken by the driver directly after the USB transfer
+                self.recv_msg.put(recv.arbitration_id, recv.dlc, recv.data, False,
+                                  datetime.fromtimestamp(recv.timestamp))
+                if self.ack_id is not None:
+                    try:
+                        acknowledged = self.ack_id(recv)
+                        if acknowledged is not None:
+                            self.reliable.acknowledge(acknowledged)
+                    except Exception:  # a malformed ACK must not end the receive thread
+                        log.exception('receiveCAN ACK konnte nicht zugeordnet werden')
+                log.debug('Input %s', recv)  # for testing, logs data which are received
 
-    def add_msg(self, type_id, dlc, data):
-        self.send_msg.put(type_id, dlc, data, True, True, datetime.now())  # add to send list
+    def add_msg(self, type_id, dlc, data, save=False, callback=None):
+        """
+        adds a message to the send list
+        :param save: if True the message is sent again until its ACK is received, see ack_id
+        :param callback: function that is called with the Delivery of a safe message when it is completed
+        :return: a Delivery (Future) for a safe message, otherwise None
+        """
+        if save:
+            return self.reliable.send(type_id, dlc, data, callback)  # safe messages wait in send_msg for the ACK
+        self.send_msg.put(type_id, dlc, data, False, datetime.now())  # add to send list
 
     def sendCAN(self):
         """
         Thread takes messages from the message list, converts them and sends them on the bus.
         :return: None
         """
-        while True:
-            time.sleep(0.001)
-            if self.canRunning:
-                if not self.send_msg.empty():
-                    # Get the Message from the Queue
-                    try:
-                        id, dlc, mymsg = self.send_msg.get()
-                    except:
-                        pass
-                    finally:
-                        # build Message
-                        if id is None:  # elements are None if no msg in list or msg is in list but have to wait a
-                            pass  # second
-                        else:
-                            canid = int(conv.conv_bitarr_to_string(id), 2)  # convert ID to right TxID format
-                            send = conv.conv_int_to_bytes(mymsg, dlc)  # convert data in Bytes to send
-                            # create can message
-                            msg = can.Message(arbitration_id=canid, dlc=dlc, is_fd=False, is_extended_id=False, data=send)
-                            try:
-                                self.bus.send(msg)  # send can message
-
-                                print('[INFO -> Output] {}'.format(msg))
-
-                            except Exception:
-                                print('[ERROR] sendCAN Senden fehlgeschlagen')
-                                # self.canRunning = False
+        if not self.canRunning:
+            return
+        while not self.stopped.is_set():
+            # Get the Message from the Queue, wakes up as soon as add_msg puts one or shutdown closes the list
+            id, dlc, mymsg = self.send_msg.get(block=True)
+            if id is None:  # the list was closed
+                continue
+            send = codec.int_to_bytes(mymsg, dlc)  # convert data in Bytes to send
+            # create can message
+            msg = can.Message(arbitration_id=id, dlc=dlc, is_fd=False, is_extended_id=False, data=send)
+            try:
+                self.bus.send(msg)  # send can message
+
+                log.debug('Output %s', msg)
+
+            except Exception:
+                log.exception('sendCAN Senden fehlgeschlagen')
+                # self.canRunning = False
 
     def shutdown(self):
-        self.bus.shutdown()  # closes the connection with the device
+        """
+        stops both threads and closes the bus, the receive thread returns within recv_timeout seconds
+        :return: None
+        """
+        self.stopped.set()
+        self.reliable.stop()  # pending safe messages are cancelled
+        self.send_msg.close()  # wakes up the send thread
+        for thread in (self.send, self.receive):
+            thread.join()
+        if self.bus is not None:
+            self.bus.shutdown()  # closes the connection with the device
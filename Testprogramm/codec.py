@@ -0,0 +1,143 @@
+"""
+Fast conversions of CAN identifiers and payloads.
+The functions replace the loops and string operations of converters.py with int.to_bytes/int.from_bytes
+and precompiled struct formats. The bulk functions encode or decode whole arrays of payloads with NumPy,
+e.g. for processing logs, they are only available if NumPy is installed.
+"""
+import struct
+
+np = None  # NumPy is optional and imported with the first bulk function, see _numpy
+
+# precompiled formats of the scalars in the data field (big endian like int_to_bytes)
+UINT8 = struct.Struct('>B')
+UINT16 = struct.Struct('>H')
+UINT32 = struct.Struct('>I')
+UINT64 = struct.Struct('>Q')
+INT8 = struct.Struct('>b')
+INT16 = struct.Struct('>h')
+INT32 = struct.Struct('>i')
+INT64 = struct.Struct('>q')
+FLOAT32 = struct.Struct('>f')
+FLOAT64 = struct.Struct('>d')
+
+_structs = {}
+
+
+def scalar(fmt):
+    """
+    returns the precompiled struct of a format, every format is compiled only once
+    :param fmt: string struct format, e.g. '>HH'
+    :return: struct.Struct
+    """
+    compiled = _structs.get(fmt)
+    if compiled is None:
+        compiled = _structs[fmt] = struct.Struct(fmt)
+    return compiled
+
+
+def int_to_bytes(value, length):
+    """
+    converts a integer value to bytes, most significant byte first (like converters.conv_int_to_bytes)
+    bits above length bytes are cut off, negative values are encoded in two's complement
+    :param value: int
+    :param length: int length of the bytes
+    :return: bytes
+    """
+    return (value & ((1 << (length << 3)) - 1)).to_bytes(length, 'big')
+
+
+def bytes_to_int(data):
+    """
+    converts bytes in integer, most significant byte first (like converters.conv_bytes_to_int)
+    :param data: bytes, bytearray or list of int
+    :return: int
+    """
+    return int.from_bytes(data, 'big')
+
+
+def int_to_bits(value, length):
+    """
+    converts a integer to a bitarray, most significant bit first, filled with 0 up to length
+    (like converters.conv_str_to_bitarr(bin(value), length))
+    :param value: int
+    :param length: int minimum length of the bitarray
+    :return: list of int
+    """
+    length = max(length, value.bit_length())
+    return [(value >> i) & 1 for i in range(length - 1, -1, -1)]
+
+
+def bits_to_int(bits):
+    """
+    converts a bitarray to int, most significant bit first (like converters.conv_bitarr_to_int)
+    :param bits: list of int
+    :return: int
+    """
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return value
+
+
+def bytes_to_hex(data):
+    """
+    converts bytes to a hex string like converters.conv_bytearr_to_string, the bytes are not padded with 0
+    :param data: bytes
+    :return: String
+    """
+    return '0x' + ''.join(['{:X}'.format(b) for b in data])
+
+
+def ack_tribe_id(data, dcdcID):
+    """
+    reconstructs the send id from the given ack datafield (like converters.get_ack_tribeID)
+    :param data: bytes
+    :param dcdcID: bitarray of the DCDC
+    :return: int
+    """
+    return (((bytes_to_int(data) << len(dcdcID)) | bits_to_int(dcdcID)) << 1) | 1
+
+
+def _numpy():
+    """Imports NumPy when it is needed first, so ``import codec`` does not pay for it."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('the bulk functions of the codec need NumPy') from None
+        np = numpy
+    return np
+
+
+def encode_payloads(values, dlc):
+    """
+    converts many integer values to data fields at once, like int_to_bytes for every value
+    :param values: sequence or array of int, each fits into 64 bit
+    :param dlc: int or array of int, the length of each data field
+    :return: numpy array (n, 8) of uint8, the first dlc bytes of a row are the data field, the rest is 0
+    """
+    numpy = _numpy()
+    values = numpy.asarray(values, dtype=numpy.uint64)
+    shift = (8 - numpy.asarray(dlc, dtype=numpy.uint64)) * numpy.uint64(8)
+    mask = numpy.where(shift == 64, numpy.uint64(0),
+                       numpy.uint64(0xFFFFFFFFFFFFFFFF) >> numpy.minimum(shift, numpy.uint64(63)))
+    # the value is moved to the front of the 8 bytes, as big endian the data field starts with its highest byte
+    aligned = (values & mask) << numpy.minimum(shift, numpy.uint64(63))
+    return aligned.astype('>u8').view(numpy.uint8).reshape(-1, 8)
+
+
+def decode_payloads(payloads, dlc):
+    """
+    converts many data fields to integer values at once, like bytes_to_int for every data field
+    :param payloads: numpy array (n, 8) of uint8 or bytes of n * 8 bytes, the data fields padded to 8 bytes
+    :param dlc: int or array of int, the length of each data field
+    :return: numpy array of uint64
+    """
+    numpy = _numpy()
+    payloads = numpy.ascontiguousarray(numpy.frombuffer(payloads, numpy.uint8) if isinstance(
+        payloads, (bytes, bytearray, memoryview)) else payloads, dtype=numpy.uint8).reshape(-1, 8)
+    values = payloads.view('>u8').reshape(-1).astype(numpy.uint64)
+    shift = (8 - numpy.asarray(dlc, dtype=numpy.uint64)) * numpy.uint64(8)
+    # a shift by 64 bits is undefined, an empty data field is 0
+    return numpy.where(shift == 64, numpy.uint64(0), values >> numpy.minimum(shift, numpy.uint64(63)))
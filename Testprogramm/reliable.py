@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import Future, InvalidStateError
+from datetime import datetime
+
+
+class DeliveryError(Exception):
+    """Wird gesetzt, wenn eine sichere Nachricht auch nach allen Wiederholungen nicht bestätigt wurde."""
+
+
+class Delivery(Future):
+    """
+    Future einer sicheren Nachricht (save=True).
+    result() gibt die Anzahl der Sendeversuche zurück, sobald das ACK empfangen wurde,
+    oder wirft DeliveryError, wenn alle Wiederholungen ohne ACK abgelaufen sind.
+    """
+    def __init__(self, TxId, dlc, data):
+        super().__init__()
+        self.TxId = TxId
+        self.dlc = dlc
+        self.data = data
+        self.attempts = 0
+        self.sent = None  # datetime des letzten Sendeversuchs
+
+
+class ReliableSender:
+    """
+    Zuverlässige Übertragung der sicheren Nachrichten (save=True) über eine CommunicationList:
+    Jede Nachricht wird mit save=True in die Liste gelegt, die Liste ordnet die ACKs über ihren Index nach Id zu
+    (pop, bei mehreren Nachrichten mit derselben Id die älteste) und führt die Zeitstempel der Nachrichten ohne ACK
+    in ihrem Heap. Ist eine Nachricht nach timeout Sekunden nicht bestätigt, wird sie erneut in die Liste gelegt
+    (resend), bis retries Wiederholungen erreicht sind; danach wird sie entfernt und ihre Delivery schlägt fehl.
+    Ein einziger Thread wartet jeweils auf den ältesten Zeitstempel und schläft, solange keine Nachricht auf ein
+    ACK wartet.
+    """
+    def __init__(self, send_list, retries=3, timeout=0.1):
+        """
+        :param send_list: CommunicationList, aus der die Nachrichten gesendet werden, z.b. die Sendeliste des canLib
+        :param retries: Anzahl der Wiederholungen nach dem ersten Sendeversuch
+        :param timeout: Sekunden, die auf das ACK gewartet wird
+        """
+        self.send_list = send_list
+        self.retries = retries
+        self.timeout = timeout
+        self.retransmissions = 0
+        self.failures = 0
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ReliableSender", daemon=True)
+        self._thread.start()
+
+    @property
+    def in_flight(self):
+        """Anzahl der Nachrichten, die auf ein ACK warten."""
+        return self.send_list.unacknowledged()
+
+    def send(self, TxId, dlc, data, callback=None):
+        """
+        Sendet eine sichere Nachricht.
+        :param callback: Funktion, die mit der Delivery aufgerufen wird, sobald sie abgeschlossen ist
+        :return: Delivery (Future)
+        """
+        delivery = Delivery(TxId, dlc, data)
+        if callback is not None:
+            delivery.add_done_callback(callback)
+        with self._condition:
+            if not self._running:
+                delivery.cancel()
+                return delivery
+            delivery.attempts = 1
+            delivery.sent = datetime.now()
+            entry = self.send_list.put(TxId, dlc, data, True, delivery.sent)
+            entry.delivery = delivery
+            self._condition.notify()
+        return delivery
+
+    def acknowledge(self, TxId):
+        """
+        Ordnet ein empfangenes ACK der ältesten Nachricht mit der Id zu, die darauf wartet.
+        :return: True, wenn eine Nachricht bestätigt wurde
+        """
+        entry = self.send_list.pop(TxId)
+        if not entry:
+            return False
+        self._settle(entry.delivery, result=entry.count + 1)
+        return True
+
+    @staticmethod
+    def _settle(delivery, result=None, exception=None):
+        """Schließt eine Delivery ab, wenn der Aufrufer sie nicht schon abgebrochen hat."""
+        if delivery is None or delivery.done():
+            return
+        try:
+            if exception is None:
+                delivery.set_result(result)
+            else:
+                delivery.set_exception(exception)
+        except InvalidStateError:
+            pass  # zwischen done() und set_result abgebrochen
+
+    def stop(self):
+        """Beendet den Thread, alle Nachrichten ohne ACK werden aus der Liste entfernt und abgebrochen."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        for entry in self.send_list.unacknowledged_entries():
+            if self.send_list.remove(entry) and entry.delivery is not None:
+                entry.delivery.cancel()
+
+    def _run(self):
+        condition = self._condition
+        send_list = self.send_list
+        while True:
+            with condition:
+                while self._running and not send_list.unacknowledged():
+                    condition.wait()  # keine Nachricht wartet auf ein ACK
+                if not self._running:
+                    return
+                oldest = send_list.oldest()
+                delay = self.timeout if oldest is None else \
+                    (oldest - datetime.now()).total_seconds() + self.timeout
+                if delay > 0:
+                    condition.wait(delay)
+                    if not self._running:
+                        return
+            now = datetime.now()
+            for entry in send_list.expired(self.timeout):
+                if entry.count >= self.retries:
+                    if send_list.remove(entry):  # sonst kam das ACK inzwischen
+                        self.failures += 1
+                        self._settle(entry.delivery, exception=DeliveryError(
+                            'no ACK for 0x{:X} after {} attempts'.format(entry.TxId, entry.count + 1)))
+                elif send_list.resend(entry, now):
+                    self.retransmissions += 1
+                    if entry.delivery is not None:
+                        entry.delivery.attempts = entry.count + 1
+                        entry.delivery.sent = now
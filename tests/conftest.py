@@ -0,0 +1,37 @@
+"""
+Common fixtures of the tests. The tests run against the SimulatedDevice, no hardware and no dll is needed.
+"""
+import os
+import sys
+
+import pytest
+
+# the InnoMaker package is located one folder above the tests, the modules of the Testprogramm next to it
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'Testprogramm'))
+
+from InnoMaker import InnoMakerBus, SimulatedDevice, SimulatedTransport  # noqa: E402
+
+
+def open_bus(**options):
+    """Opens an InnoMakerBus on its own SimulatedDevice, the bus options are split from the device options."""
+    bus_options = {key: options.pop(key) for key in ('reader_thread', 'ring_size', 'hardware_timestamps',
+                                                     'poll_interval') if key in options}
+    bus_options.setdefault('poll_interval', 0.001)
+    transport = SimulatedTransport([SimulatedDevice(**options)])
+    return InnoMakerBus(channel=0, bitrate=500000, transport=transport, **bus_options)
+
+
+@pytest.fixture
+def make_bus():
+    """Returns a function that opens simulated buses, they are shut down after the test."""
+    buses = []
+
+    def make(**options):
+        bus = open_bus(**options)
+        buses.append(bus)
+        return bus
+    yield make
+    for bus in buses:
+        bus.shutdown()
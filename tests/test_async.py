@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from InnoMaker.aio import AsyncReceiver
+
+
+def test_recv_after_event_loop_closed(make_bus):
+    bus = make_bus(reader_thread=True)
+
+    async def receive():
+        bus.Device.inject(0x123, b'\x01')
+        return await bus.recv_async(1.0)
+    msg = asyncio.run(receive())
+    assert msg is not None and msg.arbitration_id == 0x123
+    assert bus._async is not None
+    bus.Device.inject(0x124, b'\x02')
+    msg = bus.recv(1.0)  # the reader thread detaches the receiver of the closed loop
+    assert msg is not None and msg.arbitration_id == 0x124
+    assert bus._async is None
+    assert bus.get_statistics()['dropped'] == 0
+
+
+def test_messages_for_a_closed_loop_are_dropped(make_bus):
+    bus = make_bus(reader_thread=True)
+    loop = asyncio.new_event_loop()
+    receiver = AsyncReceiver(loop)
+    loop.close()
+    assert not receiver.feed(['a', 'b'])
+    bus._async = receiver
+    bus._detach_async(receiver, 2)
+    assert bus._async is None
+    assert bus.get_statistics()['dropped'] == 2
+
+
+def test_concurrent_consumers_are_all_woken():
+    async def consume():
+        receiver = AsyncReceiver(asyncio.get_running_loop())
+        first = asyncio.ensure_future(receiver.get(1.0))
+        second = asyncio.ensure_future(receiver.get(1.0))
+        await asyncio.sleep(0)  # both consumers wait
+        start = time.perf_counter()
+        receiver.feed(['a'])
+        receiver.feed(['b'])
+        results = await asyncio.gather(first, second)
+        return results, time.perf_counter() - start
+    results, duration = asyncio.run(consume())
+    assert results == ['a', 'b']
+    assert duration < 0.5  # nobody waited for the timeout
+
+
+def test_close_wakes_all_consumers():
+    async def consume():
+        receiver = AsyncReceiver(asyncio.get_running_loop())
+        consumers = [asyncio.ensure_future(receiver.get()) for _ in range(3)]
+        await asyncio.sleep(0)
+        receiver.close()
+        return await asyncio.wait_for(asyncio.gather(*consumers), 1.0)
+    assert asyncio.run(consume()) == [None, None, None]
+
+
+def test_concurrent_recv_async(make_bus):
+    bus = make_bus(reader_thread=True)
+
+    async def consume():
+        consumers = [asyncio.ensure_future(bus.recv_async(1.0)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        bus.Device.inject(0x1)
+        bus.Device.inject(0x2)
+        return await asyncio.gather(*consumers)
+    messages = asyncio.run(consume())
+    assert sorted(msg.arbitration_id for msg in messages) == [1, 2]
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+can_lib = pytest.importorskip('can_lib')
+
+
+@pytest.fixture
+def lib(make_bus):
+    lib = can_lib.canLib(bus=make_bus(record=True))
+    yield lib
+    lib.shutdown()
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.0001)
+    return condition()
+
+
+def test_idle_cpu(lib):
+    time.sleep(0.1)  # the threads have started
+    cpu = time.process_time()
+    time.sleep(1.0)
+    idle = time.process_time() - cpu
+    assert idle < 0.1  # below 10 % of one core, the bus included
+
+
+def test_receive_latency(lib):
+    latencies = []
+    for i in range(20):
+        time.sleep(0.003)
+        start = time.perf_counter()
+        lib.bus.Device.inject(0x100 + i, b'\x01')
+        TxId, dlc, data = lib.recv_msg.get(block=True, timeout=1.0)
+        latencies.append(time.perf_counter() - start)
+        assert TxId == 0x100 + i
+    assert sum(latencies) / len(latencies) < 0.005
+    assert max(latencies) < 0.025
+
+
+def test_send_latency(lib):
+    sent = lib.bus.Device.sent
+    latencies = []
+    for i in range(20):
+        start = time.perf_counter()
+        lib.add_msg(0x200 + i, 1, 1)
+        assert wait_for(lambda: len(sent) > i)
+        latencies.append(time.perf_counter() - start)
+    assert [can_id for _, can_id, _, _ in sent] == [0x200 + i for i in range(20)]
+    assert sum(latencies) / len(latencies) < 0.002
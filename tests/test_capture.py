@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from InnoMaker.capture import CaptureWriter, CaptureReader, HEADER_SIZE, RECORD_SIZE, iter_records, read_header
+from InnoMaker.simulation import FRAME_SIZE, encode_frame
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+
+def frames(count):
+    data = b''.join(encode_frame(i, bytes([i])) for i in range(count))
+    return data, list(range(0, len(data), FRAME_SIZE))
+
+
+def test_rotation_by_size(tmp_path):
+    path = str(tmp_path / 'trace.cap')
+    data, offsets = frames(100)
+    writer = CaptureWriter(path, max_bytes=HEADER_SIZE + RECORD_SIZE * 64, chunk_records=16)
+    writer.write_batch(data, offsets[:10], 1000)
+    for i, offset in enumerate(offsets[10:]):
+        writer.write(data, offset, 2000 + i)
+    writer.close()
+    assert writer.files == [path, str(tmp_path / 'trace.1.cap')]
+    assert writer.records == 100
+    assert [read_header(name)['count'] for name in writer.files] == [64, 36]
+    assert os.path.getsize(writer.files[1]) == HEADER_SIZE + RECORD_SIZE * 36  # the preallocation is cut off
+    records = [record for name in writer.files for record in iter_records(name)]
+    assert [record[2] for record in records] == list(range(100))
+    assert [record[0] for record in records[:11]] == [1000] * 10 + [2000]
+    assert records[5][7][:1] == b'\x05'
+
+
+def test_rotation_by_duration(tmp_path):
+    path = str(tmp_path / 'trace.cap')
+    data, offsets = frames(3)
+    writer = CaptureWriter(path, max_seconds=1.0)
+    for offset, timestamp in zip(offsets, (0, 500000000, 1000000000)):
+        writer.write(data, offset, timestamp)
+    writer.close()
+    assert [[record[2] for record in iter_records(name)] for name in writer.files] == [[0, 1], [2]]
+
+
+def test_reader_queries(tmp_path):
+    pytest.importorskip('numpy')
+    path = str(tmp_path / 'trace.cap')
+    data, offsets = frames(10)
+    writer = CaptureWriter(path)
+    for offset in offsets + offsets:  # every identifier twice, 1 us apart
+        writer.write(data, offset, 1000 * (writer.records + 1))
+    writer.close()
+    with CaptureReader(path, index_step=4, cache_index=False) as reader:
+        assert len(reader) == 20
+        assert reader.position(5.5e-6) == 5
+        assert list(reader.time_range(3e-6, 6e-6)['can_id']) == [2, 3, 4]
+        assert list(reader.positions(7)) == [7, 17]
+        assert list(reader.positions(7, start=9e-6)) == [17]
+        assert len(reader.positions(42)) == 0
+        assert list(reader.query(3)['timestamp']) == [4000, 14000]
+
+
+def test_import_does_not_load_numpy():
+    code = 'import sys, InnoMaker; print("numpy" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+import codec
+
+
+def test_import_does_not_load_numpy():
+    code = 'import sys; sys.path.insert(0, {!r}); import codec; print("numpy" in sys.modules)'.format(
+        os.path.dirname(os.path.realpath(codec.__file__)))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
+
+
+def test_bulk_functions_match_the_scalar_functions():
+    values, dlcs = [0, 0x12, 0x1234, 0x123456789ABCDEF0], [0, 1, 2, 8]
+    payloads = codec.encode_payloads(values, dlcs)
+    for row, value, dlc in zip(payloads, values, dlcs):
+        assert bytes(row[:dlc]) == bytes(codec.int_to_bytes(value, dlc))
+    assert codec.decode_payloads(payloads, dlcs).tolist() == values
@@ -0,0 +1,52 @@
+import random
+import types
+
+from can import BusABC, Message
+
+from InnoMaker.filters import AcceptanceFilter, CAN_EFF_MASK
+from InnoMaker.simulation import encode_frame
+
+FILTERS = [
+    {"can_id": 0x123, "can_mask": 0x7FF, "extended": False},
+    {"can_id": 0x400, "can_mask": 0x700},
+    {"can_id": 0x18DA00F1, "can_mask": 0x1FFF00FF, "extended": True},
+    {"can_id": 0xE0000055, "can_mask": 0xFFFFFFFF, "extended": True},  # bits above 29, e.g. SocketCAN flags
+]
+
+
+def python_can_matches(filters, can_id, is_extended_id):
+    """The result of python-can's own filtering, with can_id and can_mask of extended filters masked to 29 bits."""
+    masked = [dict(_filter, can_id=_filter["can_id"] & CAN_EFF_MASK, can_mask=_filter["can_mask"] & CAN_EFF_MASK)
+              if _filter.get("extended") else _filter for _filter in filters]
+    bus = types.SimpleNamespace(_filters=masked)
+    return BusABC._matches_filters(bus, Message(arbitration_id=can_id, is_extended_id=is_extended_id))
+
+
+def test_filters_match_python_can():
+    acceptance = AcceptanceFilter(FILTERS)
+    rng = random.Random(1)
+    ids = [(0x123, False), (0x124, False), (0x4AB, False), (0x4AB, True), (0x18DA55F1, True), (0x18DA55F2, True),
+           (0x55, True), (0x55, False)]
+    ids += [(rng.getrandbits(11), False) for _ in range(500)] + [(rng.getrandbits(29), True) for _ in range(500)]
+    for can_id, is_extended_id in ids:
+        expected = python_can_matches(FILTERS, can_id, is_extended_id)
+        assert acceptance.matches(can_id, is_extended_id) == expected, hex(can_id)
+        frame = encode_frame(can_id | (0x80000000 if is_extended_id else 0), bytes(1))
+        assert acceptance.accepts(frame) == expected, hex(can_id)
+
+
+def test_extended_filter_ignores_the_bits_above_29():
+    acceptance = AcceptanceFilter([{"can_id": 0xE0000055, "can_mask": 0xFFFFFFFF, "extended": True}])
+    assert acceptance.accepts(encode_frame(0x80000055, bytes(1)))
+    assert not acceptance.accepts(encode_frame(0x80000056, bytes(1)))
+    assert not acceptance.accepts(encode_frame(0x55, bytes(1)))
+
+
+def test_bus_applies_the_filters(make_bus):
+    bus = make_bus(loopback=True)
+    bus.set_filters(FILTERS)
+    for can_id, is_extended_id in ((0x124, False), (0x123, False), (0x10000055, True), (0x55, True)):
+        bus.send(Message(arbitration_id=can_id, is_extended_id=is_extended_id, data=[1]))
+    received = [bus.recv(1.0) for _ in range(2)]
+    assert [(msg.arbitration_id, msg.is_extended_id) for msg in received] == [(0x123, False), (0x55, True)]
+    assert bus.recv(0.05) is None
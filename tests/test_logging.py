@@ -0,0 +1,50 @@
+import logging
+
+from can import Message
+
+from InnoMaker.InnoMaker import RateLimitedLog
+
+log = logging.getLogger('test.ratelimit')
+
+
+def messages(caplog):
+    return [record.getMessage() for record in caplog.records if record.name == log.name]
+
+
+def test_alternating_keys_are_limited(caplog):
+    caplog.set_level(logging.WARNING, log.name)
+    limited = RateLimitedLog(log, logging.WARNING, interval=60.0)
+    for i in range(100):
+        limited.log('error %s', i % 2, key=i % 2)
+    assert messages(caplog) == ['error 0', 'error 1']
+    limited.flush()
+    assert sorted(messages(caplog)[2:]) == ['49 similar messages suppressed, the last one: error 0',
+                                            '49 similar messages suppressed, the last one: error 1']
+    limited.flush()
+    assert len(messages(caplog)) == 4
+
+
+def test_stopped_flood_is_summarized_by_the_next_call(caplog, monkeypatch):
+    caplog.set_level(logging.WARNING, log.name)
+    now = [100.0]
+    monkeypatch.setattr('InnoMaker.InnoMaker.time.monotonic', lambda: now[0])
+    limited = RateLimitedLog(log, logging.WARNING, interval=1.0)
+    for _ in range(10):
+        limited.log('bus off', key='a')
+    now[0] += 5.0
+    limited.log('other', key='b')
+    assert messages(caplog) == ['bus off', '9 similar messages suppressed, the last one: bus off', 'other']
+    assert list(limited.keys) == ['b']
+
+
+def test_failed_sends_are_rate_limited(make_bus, caplog):
+    caplog.set_level(logging.WARNING, 'can.InnoMaker')
+    bus = make_bus()
+    bus._transmit = lambda msg: False
+    for i in range(1000):
+        bus.send(Message(arbitration_id=i, data=[1], is_extended_id=False))
+    failures = [record for record in caplog.records if 'send data failed' in record.getMessage()]
+    assert len(failures) == 1
+    bus.shutdown()
+    summaries = [record.getMessage() for record in caplog.records if 'suppressed' in record.getMessage()]
+    assert len(summaries) == 1 and summaries[0].startswith('999 similar messages suppressed')
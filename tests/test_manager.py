@@ -0,0 +1,27 @@
+from InnoMaker import InnoMaker
+from InnoMaker import InnoMakerBus, SimulatedDevice, SimulatedTransport
+
+
+def test_detect_available_configs_without_dll(monkeypatch):
+    def missing():
+        raise ModuleNotFoundError("No module named 'clr'")
+    monkeypatch.setattr(InnoMaker, '_manager', None)
+    monkeypatch.setattr(InnoMaker, 'load_library', missing)
+    assert InnoMakerBus._detect_available_configs() == []
+
+
+def test_each_bus_opens_its_own_device():
+    transport = SimulatedTransport([SimulatedDevice('a'), SimulatedDevice('b')])
+    first = InnoMakerBus(channel=0, bitrate=500000, transport=transport)
+    second = InnoMakerBus(channel=1, bitrate=500000, transport=transport)
+    busy = InnoMakerBus(channel=0, bitrate=500000, transport=transport)
+    try:
+        assert (first.Device.deviceId, second.Device.deviceId) == ('a', 'b')
+        assert busy.Device is None  # the device of channel 0 is already opened
+    finally:
+        first.shutdown()
+        second.shutdown()
+        busy.shutdown()
+    third = InnoMakerBus(channel='b', bitrate=500000, transport=transport)
+    assert third.Device.deviceId == 'b'
+    third.shutdown()
@@ -0,0 +1,52 @@
+from can import Message
+
+from InnoMaker.InnoMaker import SendEngine
+from InnoMaker.simulation import encode_frame
+
+
+def test_remote_frame_round_trip(make_bus):
+    bus = make_bus(loopback=True)
+    bus.send(Message(arbitration_id=0x123, is_remote_frame=True, dlc=4, is_extended_id=False))
+    msg = bus.recv(1.0)
+    assert msg is not None
+    assert msg.is_remote_frame and not msg.is_error_frame
+    assert msg.arbitration_id == 0x123 and not msg.is_extended_id
+    assert msg.dlc == 4 and msg.data == bytearray()
+
+
+def test_extended_data_frame_round_trip(make_bus):
+    bus = make_bus(loopback=True)
+    bus.send(Message(arbitration_id=0x1ABCDEF, data=[1, 2, 3], is_extended_id=True))
+    msg = bus.recv(1.0)
+    assert msg.arbitration_id == 0x1ABCDEF and msg.is_extended_id and not msg.is_remote_frame
+    assert msg.dlc == 3 and msg.data == bytearray([1, 2, 3])
+
+
+def test_build_message_from_offset(make_bus):
+    bus = make_bus()
+    frames = encode_frame(0x100, b'\xAA') + encode_frame(0x200, bytes(range(8)))
+    msg = bus.buildMessage(frames, 20, 1.5)
+    assert msg.arbitration_id == 0x200 and msg.timestamp == 1.5
+    assert msg.data == bytearray(range(8))
+
+
+def test_error_frame(make_bus):
+    bus = make_bus()
+    msg = bus.buildMessage(encode_frame(0x20000004, bytes([0, 0x08, 0, 0, 0, 0, 0, 0])))
+    assert msg.is_error_frame and msg.arbitration_id == 0x4
+
+
+def test_send_many_without_messages(make_bus):
+    bus = make_bus()
+    assert bus.send_many([], bulk=True) == []
+    assert bus.send_many([]) == []
+    assert bus.Device.tx_transfers == 0
+
+
+def test_send_bulk_without_frames_skips_the_dll():
+    engine = SendEngine.__new__(SendEngine)  # no buffers, as the dll is not loaded here
+
+    def send(device, buffer, size):
+        raise AssertionError('no transfer expected')
+    engine._send = send
+    assert engine.send_bulk([]) is True
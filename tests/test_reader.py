@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+
+def test_lazy_reader_uses_ring_size(make_bus):
+    bus = make_bus(ring_size=16)
+    assert bus.ring is None
+    bus.start_reader()
+    assert bus.ring.capacity == 16
+
+
+def test_recv_waits_with_reader_thread(make_bus):
+    bus = make_bus(reader_thread=True)
+    bus.Device.inject(0x123, b'\x01\x02')
+    msg = bus.recv(1.0)
+    assert msg is not None and msg.arbitration_id == 0x123 and msg.data == b'\x01\x02'
+
+
+@pytest.mark.parametrize('timeout', [0, 0.5, None])
+def test_recv_after_stop_reader(make_bus, timeout):
+    bus = make_bus(reader_thread=True)
+    bus.stop_reader()
+    bus.Device.inject(0x321, b'\x05')
+    start = time.perf_counter()
+    msg = bus.recv(timeout)
+    assert msg is not None and msg.arbitration_id == 0x321
+    assert time.perf_counter() - start < 0.5
+
+
+def test_stop_reader_discards_ring(make_bus):
+    bus = make_bus(reader_thread=True)
+    bus.Device.inject(0x100)
+    deadline = time.perf_counter() + 1.0
+    while len(bus.ring) == 0 and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    bus.stop_reader()
+    assert len(bus.ring) == 0
+    assert bus.recv(0) is None
+    bus.Device.inject(0x101)
+    assert bus.recv_batch(64, 0.5)[0].arbitration_id == 0x101
+
+
+def test_failing_capture_is_stopped(make_bus, tmp_path):
+    bus = make_bus(reader_thread=True)
+
+    def disk_full(*args):
+        raise OSError(28, 'No space left on device')
+    bus._capture_frames = disk_full
+    bus.start_capture(str(tmp_path / 'trace.cap'))
+    bus.Device.inject(0x200)
+    msg = bus.recv(1.0)
+    assert msg is not None and msg.arbitration_id == 0x200  # the frame still reaches the receiver
+    assert bus._capture is None
+    assert bus._reader.is_alive()
+
+
+def test_reader_survives_a_failing_transfer(make_bus):
+    bus = make_bus(reader_thread=True)
+    push = bus.ring.push
+    failures = []
+
+    def broken(*args):
+        if not failures:
+            failures.append(args)
+            raise RuntimeError('broken frame')
+        push(*args)
+    bus.ring.push = broken
+    bus.Device.inject(0x300)  # the transfer is lost
+    deadline = time.perf_counter() + 1.0
+    while not failures and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    bus.Device.inject(0x301)
+    msg = bus.recv(1.0)
+    assert failures and bus._reader.is_alive()
+    assert msg is not None and msg.arbitration_id == 0x301
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')  # the crash is intended
+def test_recv_after_the_reader_thread_died(make_bus):
+    bus = make_bus(reader_thread=True)
+    reader = bus._reader
+
+    def crash(*args):
+        raise SystemExit
+    bus._read_transfer = crash
+    reader.join(1.0)
+    assert not reader.is_alive() and bus._reader is None
+    del bus._read_transfer
+    bus.Device.inject(0x400)
+    msg = bus.recv(0.5)  # reads the device directly
+    assert msg is not None and msg.arbitration_id == 0x400
+    bus.start_reader()
+    assert bus._reader is not None and bus._reader.is_alive()
+
+
+def wake_up_latencies(bus, frames=20):
+    """Returns the seconds between the arrival of a frame at the simulated device and the return of recv."""
+    latencies = []
+    for _ in range(frames):
+        time.sleep(0.003)  # the reader thread is idle when the frame arrives
+        start = time.perf_counter()
+        bus.Device.inject(0x10)
+        assert bus.recv(1.0) is not None
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def test_wake_up_latency_with_idle_poll(make_bus):
+    bus = make_bus(reader_thread=True, poll_interval=0.002)
+    latencies = wake_up_latencies(bus)
+    assert sum(latencies) / len(latencies) < 0.005
+    assert max(latencies) < 0.025
+
+
+def test_wake_up_latency_with_blocking_read(make_bus):
+    bus = make_bus(reader_thread=True, poll_interval=0.01, read_timeout=0.05)  # the read waits for the frame
+    latencies = wake_up_latencies(bus)
+    assert sum(latencies) / len(latencies) < 0.002
+    assert max(latencies) < 0.02
@@ -0,0 +1,111 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from CommunicationList import CommunicationList
+from reliable import DeliveryError, ReliableSender
+
+
+def test_pop_returns_the_oldest_safe_entry():
+    messages = CommunicationList()
+    first = messages.put(0x10, 1, 1, True, datetime.now())
+    messages.put(0x10, 1, 2, True, datetime.now())
+    messages.put(0x20, 1, 3, False, datetime.now())
+    assert messages.pop(0x10) is first
+    assert messages.unacknowledged() == 1
+    assert messages.pop(0x20) is False  # only safe messages wait for an ACK
+
+
+def test_expired_and_resend():
+    messages = CommunicationList()
+    entry = messages.put(0x10, 1, 1, True, datetime.now() - timedelta(seconds=1))
+    assert messages.get() == (0x10, 1, 1)
+    assert messages.expired(0.5) == [entry]
+    assert messages.expired(0.5) == []  # taken from the heap until it is sent again
+    assert messages.resend(entry, datetime.now())
+    assert entry.count == 1
+    assert messages.get() == (0x10, 1, 1)  # queued again
+    assert messages.oldest() == entry.timestamp
+    assert messages.remove(entry)
+    assert messages.unacknowledged() == 0
+    assert not messages.resend(entry, datetime.now())
+
+
+def test_acknowledged_delivery():
+    messages = CommunicationList()
+    sender = ReliableSender(messages, retries=3, timeout=1.0)
+    try:
+        delivery = sender.send(0x10, 2, 5)
+        assert messages.get() == (0x10, 2, 5)
+        assert sender.in_flight == 1
+        assert sender.acknowledge(0x10)
+        assert delivery.result(0) == 1
+        assert sender.in_flight == 0
+        assert not sender.acknowledge(0x10)
+    finally:
+        sender.stop()
+
+
+def test_retransmission_until_failure():
+    messages = CommunicationList()
+    sender = ReliableSender(messages, retries=2, timeout=0.02)
+    try:
+        delivery = sender.send(0x10, 2, 5)
+        sent = []
+        deadline = time.monotonic() + 2.0
+        while not delivery.done() and time.monotonic() < deadline:
+            TxId, dlc, data = messages.get(block=True, timeout=0.01)
+            if TxId is not None:
+                sent.append(TxId)
+        with pytest.raises(DeliveryError):
+            delivery.result(0)
+        assert sent == [0x10] * 3  # the first attempt and two retries
+        assert (sender.retransmissions, sender.failures) == (2, 1)
+        assert messages.unacknowledged() == 0
+    finally:
+        sender.stop()
+
+
+def test_stop_cancels_pending_deliveries():
+    messages = CommunicationList()
+    sender = ReliableSender(messages, retries=3, timeout=1.0)
+    delivery = sender.send(0x10, 2, 5)
+    sender.stop()
+    assert delivery.cancelled()
+    assert messages.unacknowledged() == 0
+    assert sender.send(0x11, 2, 5).cancelled()
+
+
+def test_ack_after_cancel():
+    messages = CommunicationList()
+    sender = ReliableSender(messages, retries=3, timeout=1.0)
+    try:
+        delivery = sender.send(0x10, 2, 5)
+        assert delivery.cancel()
+        assert sender.acknowledge(0x10)  # no InvalidStateError
+        assert delivery.cancelled()
+    finally:
+        sender.stop()
+
+
+def test_receive_thread_survives_a_bad_ack():
+    can = pytest.importorskip('can')
+    from can_lib import canLib
+
+    def ack_id(msg):
+        if msg.arbitration_id == 0x1:
+            raise ValueError('malformed ACK')
+        return msg.data[0]
+    peer = can.Bus(interface='virtual', channel='reliable_test')
+    lib = canLib(ack_id=ack_id, bus=can.ThreadSafeBus(interface='virtual', channel='reliable_test'))
+    try:
+        delivery = lib.add_msg(0x10, 1, 5, save=True)
+        assert peer.recv(1.0).arbitration_id == 0x10
+        peer.send(can.Message(arbitration_id=0x1, is_extended_id=False))
+        peer.send(can.Message(arbitration_id=0x200, data=[0x10], is_extended_id=False))
+        assert delivery.result(1.0) == 1
+        assert lib.receive.is_alive()
+    finally:
+        lib.shutdown()
+        peer.shutdown()
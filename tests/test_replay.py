@@ -0,0 +1,65 @@
+import time
+
+from InnoMaker.capture import CaptureWriter
+from InnoMaker.replay import TraceReplay
+from InnoMaker.simulation import BUS_ERROR_FRAME, encode_frame
+
+GAP_NS = 10000000  # 10 ms between the recorded frames
+
+
+class RecordingBus:
+    def __init__(self):
+        self.sent = []  # (perf_counter_ns, Message)
+
+    def send(self, msg, timeout=None):
+        self.sent.append((time.perf_counter_ns(), msg))
+
+
+def write_trace(path, count=10):
+    writer = CaptureWriter(path)
+    for i in range(count):
+        writer.write(encode_frame(0x100 + i, bytes([i])), 0, i * GAP_NS)
+    writer.write(BUS_ERROR_FRAME, 0, count * GAP_NS)  # error frames are not sent
+    writer.close()
+    return writer.files
+
+
+def send_offsets(bus, start):
+    """Returns the send times in ms relative to start, which is taken before the replay takes its first deadline."""
+    return [(sent - start) / 1e6 for sent, msg in bus.sent]
+
+
+def test_replay_keeps_the_timing(tmp_path):
+    bus = RecordingBus()
+    replay = TraceReplay(bus, write_trace(str(tmp_path / 'trace.cap')))
+    start = time.perf_counter_ns()
+    replay.run()
+    assert [msg.arbitration_id for sent, msg in bus.sent] == [0x100 + i for i in range(10)]
+    for i, offset in enumerate(send_offsets(bus, start)):
+        assert i * 10 <= offset < i * 10 + 5  # never early, late by less than 5 ms on a busy machine
+    statistics = replay.statistics()
+    assert statistics['frames'] == 10 and statistics['passes'] == 1
+    assert 0 <= statistics['mean_error'] < 0.002
+
+
+def test_replay_speed_and_ids(tmp_path):
+    bus = RecordingBus()
+    replay = TraceReplay(bus, write_trace(str(tmp_path / 'trace.cap')), speed=2.0, ids=[0x100, 0x104, 0x108])
+    start = time.perf_counter_ns()
+    replay.run()
+    assert [msg.arbitration_id for sent, msg in bus.sent] == [0x100, 0x104, 0x108]
+    for expected, offset in zip((0, 20, 40), send_offsets(bus, start)):
+        assert expected <= offset < expected + 5
+
+
+def test_replay_loop_until_stopped(tmp_path):
+    bus = RecordingBus()
+    replay = TraceReplay(bus, write_trace(str(tmp_path / 'trace.cap'), count=3), loop=True)
+    start = time.perf_counter_ns()
+    replay.start()
+    time.sleep(0.1)
+    replay.stop()
+    assert replay.passes >= 2
+    for i, offset in enumerate(send_offsets(bus, start)):
+        expected = (i - i // 3) * 10  # the first frame of a pass is due with the last frame of the previous one
+        assert expected <= offset < expected + 5
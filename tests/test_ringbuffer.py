@@ -0,0 +1,37 @@
+from InnoMaker.ringbuffer import RingBuffer
+
+
+def record(value):
+    return bytes([value]) * 20
+
+
+def test_overflow_drops_new_records():
+    ring = RingBuffer(capacity=4)
+    assert all(ring.push(record(i), 0, float(i)) for i in range(4))
+    assert not ring.push(record(4), 0, 4.0)
+    assert ring.overflows == 1
+    assert len(ring) == 4
+    assert [ring.pop()[1] for _ in range(4)] == [0.0, 1.0, 2.0, 3.0]
+    assert ring.pop() is None
+
+
+def test_wrap_around_keeps_order():
+    ring = RingBuffer(capacity=3)
+    received = []
+    for i in range(10):
+        assert ring.push(record(i), 0, float(i))
+        if i % 2:
+            received.append(ring.pop())
+            received.append(ring.pop())
+    assert ring.head == 10 and ring.overflows == 0
+    assert [entry[0] for entry in received] == [record(i) for i in range(10)]
+    assert [entry[1] for entry in received] == [float(i) for i in range(10)]
+
+
+def test_push_from_offset_and_clear():
+    ring = RingBuffer(capacity=2, record_size=4)
+    ring.push(b'xxabcdyy', 2, 1.5)
+    assert ring.pop() == (b'abcd', 1.5)
+    ring.push(b'abcd')
+    ring.clear()
+    assert len(ring) == 0 and ring.pop() is None
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from can import Message
+
+from InnoMaker.scheduler import CyclicScheduler, CyclicSendTask
+
+
+def message(can_id):
+    return Message(arbitration_id=can_id, data=[0], is_extended_id=False)
+
+
+def test_failing_send_does_not_stop_other_tasks():
+    sent = []
+
+    def send(msg):
+        if msg.arbitration_id == 0x1:
+            raise RuntimeError('transfer failed')
+        sent.append(msg.arbitration_id)
+
+    scheduler = CyclicScheduler(send)
+    failing = CyclicSendTask(scheduler, [message(0x1)], 0.005)
+    working = CyclicSendTask(scheduler, [message(0x2)], 0.005)
+    time.sleep(0.2)
+    statistics = scheduler.statistics()
+    scheduler.stop()
+    assert sent.count(0x2) >= 10
+    assert failing.errors >= 10 and working.errors == 0
+    assert statistics['errors'] == failing.errors
+
+
+def test_failing_modifier_callback_is_counted():
+    sent = []
+
+    def modifier(msg):
+        raise ValueError('bad data')
+
+    scheduler = CyclicScheduler(sent.append)
+    task = CyclicSendTask(scheduler, [message(0x3)], 0.005, modifier_callback=modifier)
+    time.sleep(0.1)
+    scheduler.stop()
+    assert task.errors >= 5 and sent == []
+
+
+def test_broken_task_is_stopped_alone():
+    sent = []
+    scheduler = CyclicScheduler(sent.append)
+    broken = CyclicSendTask(scheduler, [message(0x4)], 0.005)
+    broken._transmit = None  # the scheduler cannot call the task any more
+    other = CyclicSendTask(scheduler, [message(0x5)], 0.005)
+    time.sleep(0.1)
+    scheduler.stop()
+    assert not broken.active
+    assert sent.count(other.messages[0]) >= 5
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')  # the crash is intended
+def test_scheduler_restarts_after_the_thread_died():
+    sent = []
+    scheduler = CyclicScheduler(sent.append)
+    schedule = scheduler._schedule
+
+    def crash():
+        raise RuntimeError('scheduler crashed')
+    scheduler._schedule = crash
+    CyclicSendTask(scheduler, [message(0x7)], 0.005)
+    time.sleep(0.05)
+    assert not scheduler._running and scheduler._thread is None
+    scheduler._schedule = schedule
+    CyclicSendTask(scheduler, [message(0x8)], 0.005)
+    time.sleep(0.05)
+    scheduler.stop()
+    assert len(sent) >= 5
+
+
+def test_periodic_send_on_bus(make_bus):
+    bus = make_bus(record=True)
+    bus.send_periodic(message(0x6), 0.01, duration=0.1)
+    time.sleep(0.2)
+    assert 8 <= len(bus.Device.sent) <= 12
+
+
+def test_period_accuracy_of_100_tasks(make_bus):
+    bus = make_bus(record=True)
+    periods = {can_id: 0.01 + (can_id % 5) * 0.01 for can_id in range(100)}  # 10 ms ... 50 ms
+    start = time.perf_counter()
+    for can_id, period in periods.items():
+        bus.send_periodic(message(can_id), period)
+    time.sleep(1.0)
+    statistics = bus.periodic_statistics()
+    bus.stop_all_periodic_tasks()
+    elapsed = time.perf_counter() - start
+    times = {}
+    for sent, can_id, dlc, data in bus.Device.sent:
+        times.setdefault(can_id, []).append(sent / 1e9)
+    assert sorted(times) == sorted(periods)
+    errors = []
+    for can_id, sent in times.items():
+        period = periods[can_id]
+        assert abs(len(sent) - elapsed / period) <= elapsed / period * 0.1 + 2
+        errors.append(abs((sent[-1] - sent[0]) / (len(sent) - 1) - period) / period)
+    assert sum(errors) / len(errors) < 0.01  # the deadlines are absolute, the mean period does not drift
+    assert statistics['tasks'] == 100 and statistics['errors'] == 0
+
+
+def test_shutdown_stops_the_tasks_before_closing_the_device(make_bus):
+    bus = make_bus()
+    bus.send_periodic(message(0x5), 0.001)
+    close = bus.transport.close
+    running = []
+
+    def closing(device):
+        running.append(bus._scheduler._running)
+        close(device)
+    bus.transport.close = closing
+    time.sleep(0.01)
+    bus.shutdown()
+    assert running == [False]
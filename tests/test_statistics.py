@@ -0,0 +1,53 @@
+import json
+import time
+
+from InnoMaker.simulation import encode_frame
+from InnoMaker.statistics import BusStatistics
+
+FRAME = encode_frame(0x100, bytes(8))
+
+
+def test_consumers_keep_their_own_interval():
+    statistics = BusStatistics(bitrate=500000)
+    statistics.snapshot(consumer='export')
+    statistics.snapshot()
+    for _ in range(100):
+        statistics.rx_frame(FRAME)
+    time.sleep(0.05)
+    application = statistics.snapshot()
+    export = statistics.snapshot(consumer='export')  # would see an interval of 0 s and no frames with one baseline
+    assert application['per_id'][0x100]['count'] == export['per_id'][0x100]['count'] == 100
+    assert export['per_id'][0x100]['rate'] > 0
+    assert abs(export['per_id'][0x100]['rate'] - application['per_id'][0x100]['rate']) < \
+        0.2 * application['per_id'][0x100]['rate']
+    assert export['bus_load'] > 0
+
+
+def test_export_does_not_disturb_get_statistics(make_bus, tmp_path):
+    bus = make_bus()
+    path = tmp_path / 'statistics.jsonl'
+    bus.get_statistics()
+    bus.export_statistics(str(path), 0.01)
+    for _ in range(50):
+        bus.statistics.rx_frame(FRAME)
+    time.sleep(0.1)
+    bus.statistics.stop_export()
+    snapshot = bus.get_statistics()
+    assert snapshot['per_id'][0x100]['count'] == 50
+    assert snapshot['per_id'][0x100]['rate'] > 0
+    lines = path.read_text().splitlines()
+    assert len(lines) >= 2 and json.loads(lines[0])['rx_frames'] <= 50
+
+
+def test_standard_extended_and_remote_frames_are_counted_apart():
+    statistics = BusStatistics()
+    for can_id, count in ((0x100, 1), (0x80000100, 2), (0x40000100, 3)):
+        for _ in range(count):
+            statistics.rx_frame(encode_frame(can_id, bytes(2)))
+    per_id = statistics.snapshot()['per_id']
+    assert len(per_id) == 3
+    assert per_id[0x100]['count'] == 1 and not per_id[0x100]['extended'] and not per_id[0x100]['remote']
+    assert per_id[0x80000100]['count'] == 2 and per_id[0x80000100]['extended']
+    assert per_id[0x40000100]['count'] == 3 and per_id[0x40000100]['remote']
+    assert {entry['id'] for entry in per_id.values()} == {0x100}
+    json.dumps(statistics.snapshot())  # the export writes the snapshot as JSON
@@ -0,0 +1,53 @@
+import random
+import time
+
+from InnoMaker.timestamps import DeviceClock, HostClock
+
+SKEW = 50e-6  # the device counter runs 50 ppm fast
+OFFSET_NS = 123456789
+MIN_DELAY_NS = 100000  # the shortest USB delay, no correlation can observe it
+
+
+def correlate(clock, seconds=60, seed=13):
+    """Feeds one frame per ms of a device whose microsecond counter wraps 10 s after the start, returns the errors in ns
+        after the correlation has settled. The frames reach the host after a random delay of 0.1 to 2 ms."""
+    rng = random.Random(seed)
+    errors = []
+    for k in range(seconds * 1000):
+        true_ns = k * 1000000
+        ticks = (int(true_ns * (1 + SKEW)) // 1000 + (1 << 32) - 10000000) % (1 << 32)
+        host_ns = true_ns + OFFSET_NS + MIN_DELAY_NS + int(min(rng.expovariate(1 / 300000), 1900000))
+        corrected = clock.to_host(ticks, host_ns)
+        assert corrected <= host_ns  # never later than the moment the frame was read
+        if true_ns >= 5000000000:
+            errors.append(corrected - (true_ns + OFFSET_NS))
+    return errors
+
+
+def test_device_clock_offset_and_jitter():
+    errors = correlate(DeviceClock())
+    mean = sum(errors) / len(errors)
+    assert 0 <= mean <= MIN_DELAY_NS + 20000  # the constant part is the shortest USB delay
+    assert max(errors) - min(errors) < 50000  # jitter below 50 us, the USB delay varies by 1.9 ms
+
+
+def test_device_clock_drift():
+    clock = DeviceClock()
+    correlate(clock)
+    assert clock.wraps == 1
+    assert abs(clock.drift - (1 / (1 + SKEW) - 1)) < 5e-6  # 5 ppm
+
+
+def test_device_clock_reset():
+    clock = DeviceClock()
+    correlate(clock, seconds=3)
+    clock.reset()
+    assert clock.to_host(5, 1000000) == 1000000  # the first frame after the reset is dated when it was read
+    assert clock.drift == 0.0 and clock.wraps == 0
+
+
+def test_host_clock_follows_the_system_time():
+    clock = HostClock()
+    assert abs(clock.now() - time.time()) < 0.01
+    before = time.perf_counter_ns()
+    assert clock.to_time_ns(before) / 1e9 == clock.to_time(before)